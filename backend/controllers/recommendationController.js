@@ -87,6 +87,31 @@ const buildSoilSnapshot = (location) => {
   };
 };
 
+/**
+ * Link ML predictions to their Crop documents with a single query.
+ * The trained model can recommend crops the Crop collection does not hold;
+ * those are kept without a crop reference and logged.
+ */
+const attachCrops = async (predictions) => {
+  const names = [...new Set(predictions.map((pred) => pred.cropName))];
+  const crops = names.length ? await Crop.find({ name: { $in: names } }).select('_id name') : [];
+  const cropIds = new Map(crops.map((crop) => [crop.name, crop._id]));
+
+  const missing = names.filter((name) => !cropIds.has(name));
+  if (missing.length) {
+    console.warn(`Recommended crops missing from the Crop collection: ${missing.join(', ')}`);
+  }
+
+  return predictions.map((pred) => ({
+    crop: cropIds.get(pred.cropName),
+    cropName: pred.cropName,
+    suitabilityScore: pred.suitabilityScore,
+    yieldPrediction: pred.yieldPrediction,
+    explanation: pred.explanation,
+    environmentalFactors: pred.environmentalFactors
+  }));
+};
+
 /**
  * Core recommendation pipeline used by both legacy and new routes.
  */
@@ -147,20 +172,10 @@ const runRecommendationPipeline = async ({ userId, state, district, season, useR
   }
 
   const predictions = mlResponse.data.recommendations || [];
+  // Trained-model responses give one yield range for the location instead of per crop
+  const locationYield = mlResponse.data.locationYield;
 
-  const recommendations = await Promise.all(
-    predictions.map(async (pred) => {
-      const crop = await Crop.findOne({ name: pred.cropName });
-      return {
-        crop: crop?._id,
-        cropName: pred.cropName,
-        suitabilityScore: pred.suitabilityScore,
-        yieldPrediction: pred.yieldPrediction,
-        explanation: pred.explanation,
-        environmentalFactors: pred.environmentalFactors
-      };
-    })
-  );
+  const recommendations = await attachCrops(predictions);
 
   const environmentalSnapshot = {
     soil: soilSnapshot,
@@ -172,11 +187,13 @@ const runRecommendationPipeline = async ({ userId, state, district, season, useR
     location: { state, district },
     season,
     recommendations,
+    locationYield,
     environmentalSnapshot
   });
 
   return {
     recommendations,
+    locationYield,
     environmentalSnapshot,
     recommendationId: recommendationDoc._id
   };
@@ -16,10 +16,10 @@ const recommendationSchema = new mongoose.Schema({
     required: true
   },
   recommendations: [{
+    // Unset when the ML service recommends a crop the Crop collection does not hold
     crop: {
       type: mongoose.Schema.Types.ObjectId,
-      ref: 'Crop',
-      required: true
+      ref: 'Crop'
     },
     cropName: String,
     suitabilityScore: {
@@ -42,6 +42,12 @@ const recommendationSchema = new mongoose.Schema({
       historicalYield: Number
     }
   }],
+  // Yield range for the location as a whole, when the ML service's model predicts one
+  locationYield: {
+    min: Number, // kg/hectare
+    max: Number, // kg/hectare
+    expected: Number // kg/hectare
+  },
   environmentalSnapshot: {
     soil: {
       ph: Number,
@@ -0,0 +1,65 @@
+const axios = require('axios');
+const request = require('supertest');
+const app = require('../server');
+const Crop = require('../models/Crop');
+const Location = require('../models/Location');
+const Recommendation = require('../models/Recommendation');
+const User = require('../models/User');
+const generateToken = require('../utils/generateToken');
+
+describe('Recommendation Routes', () => {
+  let token;
+
+  beforeEach(async () => {
+    await Promise.all([
+      User.deleteMany({}),
+      Crop.deleteMany({}),
+      Location.deleteMany({}),
+      Recommendation.deleteMany({})
+    ]);
+
+    const user = await User.create({
+      name: 'Test Farmer',
+      email: 'farmer@example.com',
+      password: 'password123'
+    });
+    token = generateToken(user._id);
+
+    await Location.create({ state: 'Punjab', district: 'Ludhiana' });
+    await Crop.create({ name: 'Rice', season: 'Kharif' });
+  });
+
+  afterEach(() => {
+    jest.restoreAllMocks();
+  });
+
+  describe('POST /api/recommendations', () => {
+    it('should keep recommended crops missing from the Crop collection', async () => {
+      jest.spyOn(axios, 'post').mockResolvedValue({
+        data: {
+          recommendations: [
+            { cropName: 'Rice', suitabilityScore: 82.5, explanation: 'Good match' },
+            { cropName: 'Quinoa', suitabilityScore: 61.2, explanation: 'Model confidence 61%' }
+          ],
+          locationYield: { min: 2800, max: 4100, expected: 3450 }
+        }
+      });
+      const warn = jest.spyOn(console, 'warn').mockImplementation(() => {});
+
+      const res = await request(app)
+        .post('/api/recommendations')
+        .set('Authorization', `Bearer ${token}`)
+        .send({ state: 'Punjab', district: 'Ludhiana', season: 'Kharif' });
+
+      expect(res.statusCode).toBe(200);
+      expect(res.body.recommendations.map((rec) => rec.cropName)).toEqual(['Rice', 'Quinoa']);
+      expect(res.body.recommendations[0].crop).toBeDefined();
+      expect(res.body.recommendations[1].crop).toBeUndefined();
+      expect(warn).toHaveBeenCalledWith(expect.stringContaining('Quinoa'));
+
+      const saved = await Recommendation.findById(res.body.recommendationId);
+      expect(saved.recommendations).toHaveLength(2);
+      expect(saved.recommendations[1].crop).toBeUndefined();
+    });
+  });
+});
@@ -161,7 +161,10 @@ const Dashboard = () => {
 
         {recommendations && (
           <>
-            <RecommendationResults recommendations={recommendations.recommendations} />
+            <RecommendationResults
+              recommendations={recommendations.recommendations}
+              locationYield={recommendations.locationYield}
+            />
             <EnvironmentalSnapshot snapshot={recommendations.environmentalSnapshot} />
           </>
         )}
@@ -25,15 +25,17 @@ const RecommendationCard = ({ recommendation, rank }) => {
           </div>
         </div>
 
-        <div className="yield-section">
-          <div className="yield-label">{t('yieldPrediction')}</div>
-          <div className="yield-value">
-            {yieldPrediction.min} - {yieldPrediction.max} kg/hectare
-          </div>
-          <div className="yield-expected">
-            Expected: {yieldPrediction.expected} kg/hectare
+        {yieldPrediction && (
+          <div className="yield-section">
+            <div className="yield-label">{t('yieldPrediction')}</div>
+            <div className="yield-value">
+              {yieldPrediction.min} - {yieldPrediction.max} kg/hectare
+            </div>
+            <div className="yield-expected">
+              Expected: {yieldPrediction.expected} kg/hectare
+            </div>
           </div>
-        </div>
+        )}
 
         <div className="explanation-section">
           <h4>{t('why')}</h4>
@@ -3,7 +3,7 @@ import { useTranslation } from 'react-i18next';
 import RecommendationCard from './RecommendationCard';
 import './RecommendationResults.css';
 
-const RecommendationResults = ({ recommendations }) => {
+const RecommendationResults = ({ recommendations, locationYield }) => {
   const { t } = useTranslation();
 
   if (!recommendations || recommendations.length === 0) {
@@ -13,6 +13,17 @@ const RecommendationResults = ({ recommendations }) => {
   return (
     <div className="recommendation-results">
       <h2 className="section-title">{t('recommendations')}</h2>
+      {locationYield && (
+        <div className="yield-section">
+          <div className="yield-label">{t('locationYield')}</div>
+          <div className="yield-value">
+            {locationYield.min} - {locationYield.max} kg/hectare
+          </div>
+          <div className="yield-expected">
+            Expected: {locationYield.expected} kg/hectare
+          </div>
+        </div>
+      )}
       <div className="recommendations-grid">
         {recommendations.map((rec, index) => (
           <RecommendationCard key={index} recommendation={rec} rank={index + 1} />
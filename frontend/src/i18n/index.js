@@ -16,6 +16,7 @@ const resources = {
       recommendations: 'Recommendations',
       suitabilityScore: 'Suitability Score',
       yieldPrediction: 'Yield Prediction',
+      locationYield: 'Expected Yield at This Location',
       why: 'Why',
       environmentalSnapshot: 'Environmental Snapshot',
       login: 'Login',
@@ -41,6 +42,7 @@ const resources = {
       recommendations: 'सिफारिशें',
       suitabilityScore: 'उपयुक्तता स्कोर',
       yieldPrediction: 'उपज भविष्यवाणी',
+      locationYield: 'इस स्थान पर अनुमानित उपज',
       why: 'क्यों',
       environmentalSnapshot: 'पर्यावरणीय स्नैपशॉट',
       login: 'लॉगिन',
@@ -0,0 +1,265 @@
+"""
+Allocation debug mode.
+Traces the memory a prediction request allocates with tracemalloc and
+reports, per stage, the net bytes left allocated and the peak reached,
+together with the source lines holding the most memory.
+
+ALLOC_DEBUG selects when requests are traced:
+    off      never (default); nothing is installed on the request path
+    header   requests sent with "X-Alloc-Debug: 1"
+    always   every prediction request
+
+Traced requests run one at a time and are scored on their own, outside
+micro-batching and the result cache. tracemalloc counts every allocation
+of the process, so while a traced request runs, other prediction requests
+wait for it, and it waits for those already running to finish.
+"""
+import asyncio
+import itertools
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional
+
+from app.metrics import StageTimings
+from app.profiling import short_path
+
+ALLOC_DEBUG_MODES = ('off', 'header', 'always')
+DEBUG_HEADER = b'x-alloc-debug'
+
+_IGNORED_FILES = (tracemalloc.__file__, __file__)
+
+
+class AllocationTracker(StageTimings):
+    """
+    Stage timings that also account memory. Each ``mark(stage)`` (or
+    ``add``, when CropPredictor.predict_batch reports a stage) charges the
+    allocations since the previous mark to `stage`.
+    """
+    __slots__ = ('frames', 'stages', 'peak_bytes', '_baseline', '_last', '_lock',
+                 '_snapshot', '_snapshot_size', '_started_tracing')
+
+    def __init__(self, frames: int = 1):
+        super().__init__()
+        self.frames = frames
+        self.stages: Dict[str, Dict[str, int]] = {}
+        self.peak_bytes = 0
+        self._baseline = 0
+        self._last = 0
+        self._lock = threading.Lock()
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._snapshot_size = 0
+        self._started_tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        tracemalloc.reset_peak()
+        self._baseline = self._last = tracemalloc.get_traced_memory()[0]
+
+    def add(self, stage: str, seconds: float):
+        super().add(stage, seconds)
+        self.mark(stage)
+
+    def mark(self, stage: str):
+        """Charge allocations since the previous mark to `stage`."""
+        if not tracemalloc.is_tracing():
+            return
+        with self._lock:
+            current, peak = tracemalloc.get_traced_memory()
+            entry = self.stages.setdefault(stage, {'netBytes': 0, 'peakBytes': 0, 'marks': 0})
+            entry['netBytes'] += current - self._last
+            entry['peakBytes'] = max(entry['peakBytes'], peak - self._last)
+            entry['marks'] += 1
+            self.peak_bytes = max(self.peak_bytes, peak - self._baseline)
+
+            # Keep the snapshot taken when the most memory was live, for the top sites
+            if current - self._baseline > self._snapshot_size:
+                self._snapshot = tracemalloc.take_snapshot().filter_traces(
+                    [tracemalloc.Filter(False, filename) for filename in _IGNORED_FILES]
+                )
+                self._snapshot_size = current - self._baseline
+                current = tracemalloc.get_traced_memory()[0]
+
+            tracemalloc.reset_peak()
+            self._last = current
+
+    def finish(self, top: int = 10) -> Dict:
+        """Stop tracing (if this tracker started it) and build the report."""
+        net_bytes = tracemalloc.get_traced_memory()[0] - self._baseline if tracemalloc.is_tracing() else 0
+        sites = []
+        if self._snapshot is not None:
+            for statistic in self._snapshot.statistics('lineno')[:top]:
+                frame = statistic.traceback[0]
+                sites.append({
+                    'site': f"{short_path(frame.filename)}:{frame.lineno}",
+                    'sizeBytes': statistic.size,
+                    'blocks': statistic.count
+                })
+        if self._started_tracing:
+            tracemalloc.stop()
+        return {
+            'netBytes': net_bytes,
+            'peakBytes': self.peak_bytes,
+            'stages': self.stages,
+            'topSites': sites
+        }
+
+
+class AllocationDebugger:
+    """Settings, serialization and recent reports of the allocation debug mode."""
+
+    def __init__(self, mode: Optional[str] = None, frames: Optional[int] = None,
+                 top: Optional[int] = None, history: Optional[int] = None):
+        self.mode = mode or os.getenv('ALLOC_DEBUG', 'off')
+        if self.mode not in ALLOC_DEBUG_MODES:
+            raise ValueError(f"Unknown ALLOC_DEBUG mode '{self.mode}', expected one of {ALLOC_DEBUG_MODES}")
+        self.frames = frames or int(os.getenv('ALLOC_DEBUG_FRAMES', '1'))
+        self.top = top or int(os.getenv('ALLOC_DEBUG_TOP', '10'))
+        self.reports = deque(maxlen=history or int(os.getenv('ALLOC_DEBUG_HISTORY', '20')))
+        self._ids = itertools.count(1)
+        self._condition: Optional[asyncio.Condition] = None
+        # Untraced prediction requests in flight, and whether one is traced
+        self._untraced = 0
+        self._tracing = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+
+    def wants(self, scope) -> bool:
+        if self.mode == 'always':
+            return True
+        if self.mode == 'header':
+            return any(name == DEBUG_HEADER and value.strip() not in (b'', b'0')
+                       for name, value in scope.get('headers', ()))
+        return False
+
+    def _gate(self) -> asyncio.Condition:
+        # Created on first use so it belongs to the server's event loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    @asynccontextmanager
+    async def traced(self):
+        """
+        Run a traced request alone: wait for the traced and untraced
+        prediction requests in flight, and hold new ones back until done.
+        """
+        gate = self._gate()
+        async with gate:
+            await gate.wait_for(lambda: not self._tracing)
+            # Claimed before draining, so a stream of untraced requests cannot starve it
+            self._tracing = True
+            await gate.wait_for(lambda: self._untraced == 0)
+        try:
+            yield
+        finally:
+            async with gate:
+                self._tracing = False
+                gate.notify_all()
+
+    @asynccontextmanager
+    async def untraced(self):
+        """Run an untraced prediction request, unless a traced one holds the worker."""
+        gate = self._gate()
+        async with gate:
+            await gate.wait_for(lambda: not self._tracing)
+            self._untraced += 1
+        try:
+            yield
+        finally:
+            async with gate:
+                self._untraced -= 1
+                gate.notify_all()
+
+    def record(self, path: str, report: Dict) -> Dict:
+        report = {'id': next(self._ids), 'path': path, 'timestamp': time.time(), **report}
+        self.reports.append(report)
+        return report
+
+    def find(self, report_id: Optional[int] = None) -> List[Dict]:
+        """Recent reports, newest first, or the one with `report_id`."""
+        reports = list(reversed(self.reports))
+        if report_id is not None:
+            reports = [report for report in reports if report['id'] == report_id]
+        return reports
+
+
+def summary_headers(report: Dict, top: int = 3) -> List[tuple]:
+    """Compact response headers for a report; the full report is at /debug/allocations."""
+    stages = ', '.join(
+        f"{stage}={entry['netBytes']}/{entry['peakBytes']}" for stage, entry in report['stages'].items()
+    )
+    sites = ', '.join(f"{site['site']}={site['sizeBytes']}" for site in report['topSites'][:top])
+    return [
+        (b'x-alloc-debug-id', str(report['id']).encode()),
+        (b'x-alloc-debug-bytes', f"net={report['netBytes']}, peak={report['peakBytes']}".encode()),
+        (b'x-alloc-debug-stages', stages.encode()),
+        (b'x-alloc-debug-top', sites.encode())
+    ]
+
+
+def allocation_tracker(request) -> Optional[AllocationTracker]:
+    """The tracker of a traced request, or None."""
+    return getattr(request.state, 'allocations', None)
+
+
+class AllocationDebugMiddleware:
+    """
+    ASGI middleware that traces selected prediction requests, and keeps
+    the others from running alongside them. Only installed when ALLOC_DEBUG
+    is not "off".
+
+    `authorize` receives the request's X-Admin-Token header and decides
+    whether the caller may turn tracing on.
+    """
+
+    def __init__(self, app, debugger: AllocationDebugger, authorize: Callable[[Optional[str]], bool],
+                 path_prefix: str = '/predict'):
+        self.app = app
+        self.debugger = debugger
+        self.authorize = authorize
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope.get('path', '').startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        traced = self.debugger.wants(scope)
+        if traced:
+            token = next((value.decode('latin-1') for name, value in scope.get('headers', ())
+                          if name == b'x-admin-token'), None)
+            traced = self.authorize(token)
+        if not traced:
+            async with self.debugger.untraced():
+                await self.app(scope, receive, send)
+            return
+
+        async with self.debugger.traced():
+            tracker = AllocationTracker(self.debugger.frames)
+            scope.setdefault('state', {})['allocations'] = tracker
+            tracker.start()
+            finished = False
+
+            async def send_with_report(message):
+                nonlocal finished
+                if message['type'] == 'http.response.start' and not finished:
+                    # The body is already built, so every stage has been marked
+                    finished = True
+                    report = self.debugger.record(scope['path'], tracker.finish(self.debugger.top))
+                    message = dict(message)
+                    message['headers'] = list(message.get('headers', [])) + summary_headers(report)
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_report)
+            finally:
+                if not finished:
+                    self.debugger.record(scope['path'], tracker.finish(self.debugger.top))
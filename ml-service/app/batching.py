@@ -0,0 +1,134 @@
+"""
+Micro-batching dispatcher.
+Coalesces concurrent /predict calls that arrive within a short window
+into one vectorized CropPredictor.predict_batch call.
+"""
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from app.metrics import ServiceMetrics, StageTimings
+from app.models.predictor import DEFAULT_OPTIONS, PredictOptions
+
+
+class MicroBatcher:
+    """
+    Collects predictions submitted on the event loop and scores them together.
+
+    A batch is flushed when it reaches ``max_batch_size`` items or when
+    ``window_ms`` has passed since its first item, whichever comes first.
+    A window of 0 (or a batch size of 1) scores every request on its own.
+
+    ``predict_batch`` is called as ``predict_batch(features_list, options,
+    timings)``; when ``metrics`` is enabled the stage timings of every batch
+    are recorded for ``endpoint``, once per request in the batch.
+    """
+
+    def __init__(self, predict_batch: Callable[..., Awaitable[List]],
+                 window_ms: Optional[float] = None, max_batch_size: Optional[int] = None,
+                 metrics: Optional[ServiceMetrics] = None, endpoint: str = '/predict'):
+        self.predict_batch = predict_batch
+        self.metrics = metrics
+        self.endpoint = endpoint
+        self.window_ms = window_ms if window_ms is not None else float(os.getenv('BATCH_WINDOW_MS', '2'))
+        self.max_batch_size = max_batch_size or int(os.getenv('BATCH_MAX_SIZE', '64'))
+
+        self._pending = []
+        self._timer = None
+        # Strong references to dispatch tasks so they are not garbage-collected mid-flight
+        self._tasks = set()
+
+        self.requests = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.size_flushes = 0
+        self.window_flushes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_ms > 0 and self.max_batch_size > 1
+
+    async def submit(self, features: Dict, options: PredictOptions = DEFAULT_OPTIONS) -> List[Dict]:
+        """
+        Queue one request for the next batch and wait for its prediction.
+        Raises the item's error if it could not be scored.
+        """
+        if not self.enabled:
+            result = (await self._run([features], [options]))[0]
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((features, options, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self.size_flushes += 1
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000, self._flush_on_window)
+
+        return await future
+
+    def _flush_on_window(self):
+        self._timer = None
+        self.window_flushes += 1
+        self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.ensure_future(self._dispatch(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, pending: List):
+        try:
+            results = await self._run(
+                [features for features, _, _ in pending],
+                [options for _, options, _ in pending]
+            )
+        except Exception as e:
+            results = [e] * len(pending)
+
+        for (_, _, future), result in zip(pending, results):
+            # The waiting request may have been cancelled (client disconnected)
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _run(self, features_list: List[Dict], options: Sequence[PredictOptions]) -> List:
+        self.requests += len(features_list)
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(features_list))
+
+        if self.metrics is None or not self.metrics.enabled:
+            return await self.predict_batch(features_list, options, None)
+
+        timings = StageTimings()
+        results = await self.predict_batch(features_list, options, timings)
+        self.metrics.observe_timings(self.endpoint, timings, len(features_list))
+        return results
+
+    def stats(self) -> Dict:
+        """Batching settings and counters."""
+        return {
+            'enabled': self.enabled,
+            'windowMs': self.window_ms,
+            'maxBatchSize': self.max_batch_size,
+            'requests': self.requests,
+            'batches': self.batches,
+            'averageBatchSize': round(self.requests / self.batches, 2) if self.batches else 0.0,
+            'largestBatch': self.largest_batch,
+            'sizeFlushes': self.size_flushes,
+            'windowFlushes': self.window_flushes,
+            'pending': len(self._pending)
+        }
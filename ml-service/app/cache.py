@@ -0,0 +1,126 @@
+"""
+Prediction result cache.
+Most /predict traffic repeats the stored district aggregates, so identical
+(location, season, quantized features) requests are answered from memory.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from app.models.predictor import DEFAULT_OPTIONS, PredictOptions
+
+# Numeric features that go into the cache key, rounded to the configured precision
+KEY_FEATURES = (
+    'soil_ph', 'soil_organic_carbon', 'soil_nitrogen', 'soil_phosphorus', 'soil_potassium',
+    'avg_temperature', 'avg_rainfall', 'avg_humidity'
+)
+
+
+class PredictionCache:
+    """
+    In-process LRU cache with a TTL and a size bound.
+
+    Keys carry the predictor's generation, which changes whenever the crop
+    database or model is reloaded, so stale results are never served and
+    the cache is cleared as soon as a reload is seen.
+    """
+
+    def __init__(self, generation: Callable[[], int] = lambda: 0, max_entries: Optional[int] = None,
+                 ttl_seconds: Optional[float] = None, precision: Optional[int] = None):
+        self.generation = generation
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('CACHE_MAX_ENTRIES', '10000'))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv('CACHE_TTL_SECONDS', '3600'))
+        self.precision = precision if precision is not None else int(os.getenv('CACHE_PRECISION', '2'))
+
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = generation()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def key(self, features: Dict, options: PredictOptions = DEFAULT_OPTIONS) -> Optional[Tuple]:
+        """
+        Cache key for a features dict and its options, or None if it cannot be cached.
+        """
+        if not self.enabled:
+            return None
+        try:
+            values = tuple(round(float(features[name]), self.precision) for name in KEY_FEATURES)
+        except (KeyError, TypeError, ValueError):
+            return None
+        return (self.generation(), features.get('state'), features.get('district'),
+                features.get('season'), options) + values
+
+    def get(self, key: Optional[Tuple]) -> Optional[Any]:
+        if key is None:
+            return None
+
+        with self._lock:
+            self._check_generation()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Optional[Tuple], value: Any):
+        if key is None:
+            return
+
+        with self._lock:
+            self._check_generation()
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def _check_generation(self):
+        # Called with the lock held
+        generation = self.generation()
+        if generation != self._generation:
+            self._generation = generation
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        """Cache settings and hit/miss/eviction counters."""
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'entries': len(self._entries),
+            'maxEntries': self.max_entries,
+            'ttlSeconds': self.ttl_seconds,
+            'precision': self.precision,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
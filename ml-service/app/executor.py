@@ -0,0 +1,177 @@
+"""
+Prediction executor.
+Runs CPU-bound CropPredictor.predict_batch calls on a thread or process
+pool so they never block the event loop, and rejects work quickly once
+the pool and its queue are full.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.metrics import StageTimings
+from app.models.predictor import CropPredictor, PredictOptions
+from app.profiling import ProfileCapture, Profiler
+
+EXECUTOR_KINDS = ('thread', 'process')
+
+
+class ExecutorSaturated(Exception):
+    """Raised when every worker is busy and the queue is full."""
+
+
+# Predictor owned by each process-pool worker
+_worker_predictor: Optional[CropPredictor] = None
+
+
+def _init_worker(model_path: str, mode: str, crop_db_path: str):
+    global _worker_predictor
+    _worker_predictor = CropPredictor(model_path=model_path, mode=mode, crop_db_path=crop_db_path)
+    _worker_predictor.load_model()
+    _worker_predictor.start_watching()
+
+
+def _worker_engine() -> str:
+    return 'model' if _worker_predictor.model is not None else 'rules'
+
+
+def _predict_in_worker(features_list: List[Dict], options: Sequence[PredictOptions],
+                       timings: Optional[StageTimings]) -> List:
+    return _worker_predictor.predict_batch(features_list, options, timings)
+
+
+def _timed_call(fn: Callable, features_list: List[Dict], options: Sequence[PredictOptions],
+                timings: Optional[StageTimings], capture: Optional[ProfileCapture] = None
+                ) -> Tuple[float, float, List, Optional[StageTimings]]:
+    # time.monotonic is system-wide, so start/end are comparable across processes
+    started = time.monotonic()
+    if capture is not None:
+        results = capture.profile_call(fn, features_list, options, timings)
+    else:
+        results = fn(features_list, options, timings)
+    return started, time.monotonic(), results, timings
+
+
+class PredictionExecutor:
+    """
+    Bounded pool for prediction batches.
+
+    At most ``workers`` batches run at once and at most ``max_queue`` more
+    wait for a worker; anything beyond that raises ExecutorSaturated
+    immediately instead of letting latency grow without limit.
+    """
+
+    def __init__(self, predictor: CropPredictor, kind: Optional[str] = None,
+                 workers: Optional[int] = None, max_queue: Optional[int] = None,
+                 profiler: Optional[Profiler] = None):
+        self.kind = kind or os.getenv('PREDICT_EXECUTOR', 'thread')
+        if self.kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor kind '{self.kind}', expected one of {EXECUTOR_KINDS}")
+
+        default_workers = os.cpu_count() or 1
+        if self.kind == 'thread':
+            default_workers = min(4, default_workers)
+        self.workers = workers or int(os.getenv('PREDICT_WORKERS', str(default_workers)))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv('PREDICT_MAX_QUEUE', '32'))
+
+        self.predictor = predictor
+        # Thread pools only: a capture cannot follow work into another process
+        self.profiler = profiler if self.kind == 'thread' else None
+        self._pool: Optional[Executor] = None
+
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._started = time.monotonic()
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == 'process':
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.predictor.model_path, self.predictor.mode, self.predictor.crop_db_path)
+                )
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='predict')
+        return self._pool
+
+    def load(self) -> str:
+        """
+        Load the model wherever batches are scored and return the engine in
+        use, 'model' or 'rules'. A process pool is started and its workers
+        load their own copy; the server process's predictor stays unloaded.
+        """
+        if self.kind == 'process':
+            return self._get_pool().submit(_worker_engine).result()
+        return 'model' if self.predictor.load_model() is not None else 'rules'
+
+    async def run(self, features_list: List[Dict], options: Sequence[PredictOptions],
+                  timings: Optional[StageTimings] = None) -> List:
+        """
+        Score a batch on the pool and return CropPredictor.predict_batch's results.
+        Stage timings are recorded into `timings` when given.
+        """
+        if self.in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise ExecutorSaturated(
+                f"Prediction queue is full ({self.in_flight} batches in flight)"
+            )
+
+        fn = _predict_in_worker if self.kind == 'process' else self.predictor.predict_batch
+        capture = self.profiler.active if self.profiler is not None else None
+        # Thread workers fill the caller's timings directly; process workers fill
+        # a fresh copy that comes back with the results and is merged
+        worker_timings = timings
+        if timings is not None and self.kind == 'process':
+            worker_timings = StageTimings()
+        loop = asyncio.get_running_loop()
+        submitted = time.monotonic()
+        self.in_flight += 1
+        try:
+            started, finished, results, batch_timings = await loop.run_in_executor(
+                self._get_pool(), _timed_call, fn, features_list, options, worker_timings, capture
+            )
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+        wait = max(0.0, started - submitted)
+        self.completed += 1
+        self.busy_seconds += finished - started
+        self.total_wait_seconds += wait
+        self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        if timings is not None and batch_timings is not timings:
+            timings.merge(batch_timings)
+        return results
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict:
+        """Queue depth, pool utilization and wait times."""
+        running = min(self.in_flight, self.workers)
+        uptime = time.monotonic() - self._started
+        return {
+            'kind': self.kind,
+            'workers': self.workers,
+            'maxQueue': self.max_queue,
+            'running': running,
+            'queued': self.in_flight - running,
+            'utilization': round(running / self.workers, 4),
+            'busyRatio': round(self.busy_seconds / (uptime * self.workers), 4) if uptime > 0 else 0.0,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'meanWaitMs': round(self.total_wait_seconds / self.completed * 1000, 3) if self.completed else 0.0,
+            'maxWaitMs': round(self.max_wait_seconds * 1000, 3)
+        }
@@ -1,15 +1,43 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from contextlib import asynccontextmanager
+from typing import Any, List, Literal, Optional
+import logging
 import os
+import time
 from dotenv import load_dotenv
 
-from app.models.predictor import CropPredictor
+from app.allocations import AllocationDebugger, AllocationDebugMiddleware, allocation_tracker
+from app.batching import MicroBatcher
+from app.cache import PredictionCache
+from app.executor import ExecutorSaturated, PredictionExecutor
+from app.metrics import MetricsMiddleware, ServiceMetrics, StageTimings
+from app.models.predictor import CropPredictor, InvalidFeatures, PredictOptions
+from app.profiling import MAX_CAPTURE_SECONDS, ProfilerBusy, Profiler, ProfilingMiddleware
+from app.serialization import batch_response, dump_predictions, dumps
+from app.startup import Startup, StartupFailed
+
+# Import-to-ready timing and readiness of this worker
+startup = Startup()
 
 load_dotenv()
 
-app = FastAPI(title="Agri-Advisor ML Service", version="1.0.0")
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load and warm up the trained model off the event loop; /ready reports when it is done.
+    # With the process pool the pool's workers load it and this process never does.
+    startup.begin(executor)
+    # Pick up edits to the crop database without a restart
+    predictor.start_watching(load_models=executor.kind != 'process')
+    yield
+    await startup.stop()
+    predictor.stop_watching()
+    executor.shutdown()
+
+app = FastAPI(title="Agri-Advisor ML Service", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -23,62 +51,378 @@ app.add_middleware(
 # Initialize predictor
 predictor = CropPredictor()
 
+# Per-stage latency and request counters, exported by /metrics
+metrics = ServiceMetrics()
+
+# Admin-only profiling captures, off unless ADMIN_TOKEN is set
+profiler = Profiler()
+
+# tracemalloc accounting of selected requests, off unless ALLOC_DEBUG is set
+allocation_debugger = AllocationDebugger()
+
+# Scoring runs on a bounded pool so it never blocks the event loop
+executor = PredictionExecutor(predictor, profiler=profiler)
+
+if allocation_debugger.enabled and executor.kind == 'process':
+    # Scoring allocates in the pool's processes, which tracemalloc in this one cannot see
+    raise ValueError("ALLOC_DEBUG needs PREDICT_EXECUTOR=thread, process pool workers are not traced")
+
+# Concurrent /predict calls are scored together in micro-batches
+batcher = MicroBatcher(executor.run, metrics=metrics)
+
+# Repeated requests are answered from memory until the predictor reloads.
+# Entries hold the serialized response body.
+cache = PredictionCache(generation=lambda: predictor.generation)
+
+metrics.add_callback('ml_cache_hits_total', 'Prediction cache hits.', 'counter', lambda: cache.hits)
+metrics.add_callback('ml_cache_misses_total', 'Prediction cache misses.', 'counter', lambda: cache.misses)
+metrics.add_callback('ml_executor_in_flight', 'Prediction batches running or queued.', 'gauge',
+                     lambda: executor.in_flight)
+metrics.add_callback('ml_executor_rejected_total', 'Prediction batches rejected because the queue was full.',
+                     'counter', lambda: executor.rejected)
+
+def saturated_error(e: ExecutorSaturated) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+def startup_error(e: StartupFailed) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e))
+
 @app.get("/")
 async def root():
     return {"message": "Agri-Advisor ML Service", "status": "running"}
 
 @app.get("/health")
 async def health():
+    # Liveness: the process is up, whether or not the model has loaded yet,
+    # unless loading failed and the worker can never serve
+    if startup.failed:
+        return Response(dumps({"status": "failed", "error": startup.error}), status_code=503,
+                        media_type="application/json")
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def ready():
+    # Readiness: the model (or the rule engine fallback) is loaded and warmed up
+    if startup.failed:
+        return Response(dumps({"status": "failed", "error": startup.error}), status_code=503,
+                        media_type="application/json")
+    if not startup.ready:
+        return Response(dumps({"status": "starting"}), status_code=503, media_type="application/json",
+                        headers={"Retry-After": "1"})
+    return {"status": "ready", "engine": startup.engine}
+
+@app.get("/stats")
+async def stats():
+    return {
+        "predictor": predictor.stats(),
+        "executor": executor.stats(),
+        "batching": batcher.stats(),
+        "cache": cache.stats(),
+        "startup": startup.report()
+    }
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    # Prometheus text exposition format
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 class PredictionRequest(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
     state: str
     district: str
     season: str
     soil: dict
     weather: dict
+    # Ranking and output options (camelCase or snake_case)
+    top_k: int = Field(5, ge=1, le=50, alias='topK')
+    min_score: Optional[float] = Field(None, ge=0, le=100, alias='minScore')
+    fields: Optional[List[Literal['yieldPrediction', 'locationYield', 'explanation', 'environmentalFactors']]] = None
 
+# The response models document the schema; responses are encoded from the
+# predictor's dicts by app.serialization, which produces the same JSON
 class CropRecommendation(BaseModel):
     cropName: str
     suitabilityScore: float
-    yieldPrediction: dict
-    explanation: str
-    environmentalFactors: dict
+    # Left out of the response when not requested in `fields`
+    yieldPrediction: Optional[dict] = None
+    explanation: Optional[str] = None
+    environmentalFactors: Optional[dict] = None
 
 class PredictionResponse(BaseModel):
     recommendations: List[CropRecommendation]
+    # Yield range expected at the location whatever the crop; trained model only
+    locationYield: Optional[dict] = None
+
+class BatchPredictionRequest(BaseModel):
+    # Items are validated one by one so a malformed item only fails itself
+    requests: List[Any]
+
+class BatchPredictionResult(BaseModel):
+    recommendations: Optional[List[CropRecommendation]] = None
+    locationYield: Optional[dict] = None
+    error: Optional[str] = None
+
+class BatchPredictionResponse(BaseModel):
+    results: List[BatchPredictionResult]
+
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '1000'))
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict(request: PredictionRequest):
+def build_features(request: PredictionRequest) -> dict:
+    """Prepare predictor features from a prediction request."""
+    return {
+        'state': request.state,
+        'district': request.district,
+        'season': request.season,
+        'soil_ph': request.soil.get('ph', 7.0),
+        'soil_organic_carbon': request.soil.get('organicCarbon', 0.5),
+        'soil_nitrogen': request.soil.get('nitrogen', 100),
+        'soil_phosphorus': request.soil.get('phosphorus', 20),
+        'soil_potassium': request.soil.get('potassium', 150),
+        'avg_temperature': request.weather.get('avgTemperature', 25),
+        'avg_rainfall': request.weather.get('avgRainfall', 800),
+        'avg_humidity': request.weather.get('avgHumidity', 60)
+    }
+
+def build_options(request: PredictionRequest) -> PredictOptions:
+    """Ranking and output options of a prediction request."""
+    return PredictOptions(
+        top_k=request.top_k,
+        min_score=request.min_score,
+        fields=tuple(request.fields) if request.fields is not None else None
+    )
+
+def observe_parsing(endpoint: str, http_request: Request, parsed: float, extra_seconds: float = 0.0):
+    """Record the time from the request's arrival to the endpoint being called."""
+    started = getattr(http_request.state, 'started', None)
+    if started is not None:
+        metrics.observe_stage(endpoint, 'parse', parsed - started + extra_seconds)
+
+async def predict_traced(features: dict, options: PredictOptions, tracker: StageTimings) -> dict:
+    """Score one request on its own, outside micro-batching, recording its stages."""
+    result = (await executor.run([features], [options], tracker))[0]
+    if metrics.enabled:
+        metrics.observe_timings('/predict', tracker, 1)
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+@app.post("/predict", response_model=PredictionResponse, response_model_exclude_unset=True)
+async def predict(request: PredictionRequest, http_request: Request):
     """
     Predict crop recommendations based on location and environmental data.
     
-    Returns top 3-5 suitable crops with yield predictions and explanations.
+    Returns the top `topK` (default 5) suitable crops with yield predictions
+    and explanations; `fields` limits which optional fields are built.
     """
     try:
+        # Requests that arrive while the model is still loading wait for it
+        await startup.wait_ready()
+        parsed = time.perf_counter()
+        tracker = allocation_tracker(http_request)
+        if tracker is not None:
+            tracker.mark('parse')
+
         # Prepare features for prediction
-        features = {
-            'state': request.state,
-            'district': request.district,
-            'season': request.season,
-            'soil_ph': request.soil.get('ph', 7.0),
-            'soil_organic_carbon': request.soil.get('organicCarbon', 0.5),
-            'soil_nitrogen': request.soil.get('nitrogen', 100),
-            'soil_phosphorus': request.soil.get('phosphorus', 20),
-            'soil_potassium': request.soil.get('potassium', 150),
-            'avg_temperature': request.weather.get('avgTemperature', 25),
-            'avg_rainfall': request.weather.get('avgRainfall', 800),
-            'avg_humidity': request.weather.get('avgHumidity', 60)
-        }
+        features = build_features(request)
+        options = build_options(request)
+        # Traced requests skip the cache so every stage is measured
+        cache_key = cache.key(features, options) if tracker is None else None
+        assembled = time.perf_counter()
+        if tracker is not None:
+            tracker.mark('features')
         
         # Get predictions
-        recommendations = predictor.predict(features)
-        
-        return PredictionResponse(recommendations=recommendations)
+        body = cache.get(cache_key)
+        serializing = None
+        if body is None:
+            if tracker is not None:
+                prediction = await predict_traced(features, options, tracker)
+            else:
+                prediction = await batcher.submit(features, options)
+
+            # The predictor's dicts already have the PredictionResponse shape, so
+            # they are encoded directly instead of being validated into models;
+            # the response_model stage only covers handing the result back
+            serializing = time.perf_counter()
+            if tracker is not None:
+                tracker.mark('response_model')
+            body = dump_predictions(prediction)
+            if tracker is not None:
+                tracker.mark('serialization')
+            cache.put(cache_key, body)
+
+        if metrics.enabled:
+            observe_parsing('/predict', http_request, parsed)
+            metrics.observe_stage('/predict', 'features', assembled - parsed)
+            if serializing is not None:
+                metrics.observe_stage('/predict', 'serialization', time.perf_counter() - serializing)
+        return Response(body, media_type="application/json")
+    
+    except StartupFailed as e:
+        raise startup_error(e)
+    except ExecutorSaturated as e:
+        raise saturated_error(e)
+    except InvalidFeatures as e:
+        raise HTTPException(status_code=422, detail=f"Invalid features: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+
+@app.post("/predict/batch", response_model=BatchPredictionResponse, response_model_exclude_unset=True)
+async def predict_batch(batch: BatchPredictionRequest, http_request: Request):
+    """
+    Predict crop recommendations for a list of prediction requests.
     
+    All items are scored in one pass. Results are returned in request order;
+    an item that fails carries an error message instead of recommendations.
+    """
+    # Requests that arrive while the model is still loading wait for it
+    try:
+        await startup.wait_ready()
+    except StartupFailed as e:
+        raise startup_error(e)
+    parsed = time.perf_counter()
+    tracker = allocation_tracker(http_request)
+    if tracker is not None:
+        tracker.mark('parse')
+    if len(batch.requests) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(batch.requests)} items (max {MAX_BATCH_SIZE})"
+        )
+
+    # (prediction, error) per item
+    results: List[Optional[tuple]] = [None] * len(batch.requests)
+    features_list = []
+    options = []
+    positions = []
+    # Items are validated here, so their validation counts as parsing
+    validation_seconds = 0.0
+    assembly_seconds = 0.0
+    for position, item in enumerate(batch.requests):
+        validating = time.perf_counter()
+        try:
+            request = PredictionRequest.model_validate(item)
+        except ValidationError as e:
+            first = e.errors()[0]
+            field = '.'.join(str(part) for part in first['loc']) or 'request'
+            results[position] = (None, f"Invalid request: {field}: {first['msg']}")
+            metrics.item_errors.labels('invalid').inc()
+            continue
+        assembling = time.perf_counter()
+        features_list.append(build_features(request))
+        options.append(build_options(request))
+        positions.append(position)
+        validation_seconds += assembling - validating
+        assembly_seconds += time.perf_counter() - assembling
+
+    if tracker is not None:
+        tracker.mark('features')
+
+    timings = tracker if tracker is not None else StageTimings() if metrics.enabled else None
+    try:
+        predictions = await executor.run(features_list, options, timings)
+    except ExecutorSaturated as e:
+        raise saturated_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
+    for position, prediction in zip(positions, predictions):
+        if isinstance(prediction, InvalidFeatures):
+            results[position] = (None, f"Invalid features: {str(prediction)}")
+            metrics.item_errors.labels('invalid').inc()
+        elif isinstance(prediction, Exception):
+            results[position] = (None, f"Prediction error: {str(prediction)}")
+            metrics.item_errors.labels('prediction').inc()
+        else:
+            results[position] = (prediction, None)
+
+    serializing = time.perf_counter()
+    response = batch_response(results)
+    if tracker is not None:
+        tracker.mark('response_model')
+    body = dumps(response)
+    if tracker is not None:
+        tracker.mark('serialization')
+    if metrics.enabled and timings is not None:
+        observe_parsing('/predict/batch', http_request, parsed, validation_seconds)
+        metrics.observe_stage('/predict/batch', 'features', assembly_seconds)
+        metrics.observe_timings('/predict/batch', timings, 1)
+        metrics.observe_stage('/predict/batch', 'serialization', time.perf_counter() - serializing)
+    return Response(body, media_type="application/json")
+
+class ProfileCaptureRequest(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    # Stop after this many prediction requests...
+    requests: Optional[int] = Field(None, ge=1, le=100000)
+    # ...or after this many seconds (a fixed window when `requests` is not set)
+    seconds: Optional[float] = Field(None, gt=0, le=MAX_CAPTURE_SECONDS)
+    interval_ms: float = Field(5, ge=1, le=1000, alias='intervalMs')
+    cprofile: bool = True
+    sort: Literal['cumulative', 'tottime', 'calls'] = 'cumulative'
+    limit: int = Field(50, ge=1, le=1000)
+    format: Literal['json', 'pstats', 'collapsed'] = 'json'
+
+@app.post("/admin/profile")
+async def profile_capture(capture_request: ProfileCaptureRequest,
+                          x_admin_token: Optional[str] = Header(None)):
+    """
+    Profile this worker for the next `requests` prediction requests or for
+    `seconds`, then return cProfile statistics and collapsed stacks.
+    """
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiler.authorized(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if executor.kind == 'process':
+        raise HTTPException(status_code=409,
+                            detail="Profiling needs PREDICT_EXECUTOR=thread, scoring runs in pool processes")
+
+    try:
+        capture = await profiler.capture(
+            max_requests=capture_request.requests,
+            seconds=capture_request.seconds,
+            interval_ms=capture_request.interval_ms,
+            use_cprofile=capture_request.cprofile
+        )
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    pstats_text = capture.pstats_text(capture_request.sort, capture_request.limit)
+    if capture_request.format == 'pstats':
+        return Response(pstats_text or '', media_type="text/plain; charset=utf-8")
+    if capture_request.format == 'collapsed':
+        return Response(capture.collapsed_text(), media_type="text/plain; charset=utf-8")
+    return {
+        "worker": os.getpid(),
+        **capture.summary(),
+        "pstats": pstats_text,
+        "collapsed": capture.collapsed_text()
+    }
+
+@app.get("/debug/allocations")
+async def allocation_reports(id: Optional[int] = None, x_admin_token: Optional[str] = Header(None)):
+    """Recent allocation debug reports, newest first. Admin only: needs ADMIN_TOKEN."""
+    if not allocation_debugger.enabled or not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiler.authorized(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    return {"mode": allocation_debugger.mode, "reports": allocation_debugger.find(id)}
+
+if profiler.enabled:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+if allocation_debugger.enabled:
+    # With ADMIN_TOKEN set, only admins can turn tracing on
+    app.add_middleware(
+        AllocationDebugMiddleware, debugger=allocation_debugger,
+        authorize=lambda token: not profiler.enabled or profiler.authorized(token)
+    )
+
+# Outermost, so request latency includes every other middleware
+app.add_middleware(MetricsMiddleware, metrics=metrics, endpoints=[route.path for route in app.routes])
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
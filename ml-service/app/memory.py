@@ -0,0 +1,97 @@
+"""
+Process memory helpers used for startup and sizing reports.
+"""
+import os
+import resource
+import sys
+import threading
+from typing import Dict
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_bytes() -> int:
+    """
+    Current resident set size of this process.
+    Falls back to the peak RSS where /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def format_bytes(size: float) -> str:
+    """Human-readable byte count, e.g. '12.3 MB'."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def memory_breakdown() -> Dict[str, int]:
+    """
+    RSS of this process split into pages shared with other processes (e.g.
+    copy-on-write pages inherited from a preloading parent) and private
+    ones, plus the proportional set size. Only RSS is reported where
+    /proc/self/smaps_rollup is not available.
+    """
+    fields = {'Rss': 'rssBytes', 'Pss': 'pssBytes', 'Shared_Clean': 'sharedBytes',
+              'Shared_Dirty': 'sharedBytes', 'Private_Clean': 'privateBytes', 'Private_Dirty': 'privateBytes'}
+    breakdown: Dict[str, int] = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                key = fields.get(name)
+                if key is not None:
+                    breakdown[key] = breakdown.get(key, 0) + int(value.split()[0]) * 1024
+    except (OSError, IndexError, ValueError):
+        return {'rssBytes': rss_bytes()}
+    return breakdown
+
+
+class PeakMemory:
+    """
+    Context manager that samples this process's RSS on a background thread
+    and records the highest value seen, e.g. per training stage. Unlike
+    tracemalloc it also sees memory allocated outside the Python allocator
+    (pandas' CSV parser, BLAS, Arrow).
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.start_bytes = 0
+        self.peak_bytes = 0
+        self.end_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def increase_bytes(self) -> int:
+        """Peak RSS above the RSS at entry."""
+        return max(0, self.peak_bytes - self.start_bytes)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_bytes = max(self.peak_bytes, rss_bytes())
+
+    def __enter__(self) -> 'PeakMemory':
+        self.start_bytes = self.peak_bytes = rss_bytes()
+        self._thread = threading.Thread(target=self._sample, name='peak-memory', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.end_bytes = rss_bytes()
+        self.peak_bytes = max(self.peak_bytes, self.end_bytes)
@@ -0,0 +1,308 @@
+"""
+Service metrics.
+Latency histograms and counters for the prediction path, rendered in the
+Prometheus text exposition format by GET /metrics.
+"""
+import bisect
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+CROP_COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+
+# Stages of a prediction request, in order. parse, features and serialization
+# are timed by the endpoints; the rest by CropPredictor.predict_batch.
+STAGES = ('parse', 'features', 'scoring', 'yield', 'explanation', 'serialization')
+
+
+class StageTimings:
+    """
+    Seconds spent per stage while scoring one batch, and the number of
+    crops scored for each item. Filled in by CropPredictor.predict_batch,
+    in a worker process when the pool is a process pool, so it is kept
+    small and picklable.
+    """
+    __slots__ = ('seconds', 'crops_scored')
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.crops_scored: List[int] = []
+
+    def add(self, stage: str, seconds: float):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def scored(self, crops: int):
+        self.crops_scored.append(crops)
+
+    def merge(self, other: 'StageTimings'):
+        for stage, seconds in other.seconds.items():
+            self.add(stage, seconds)
+        self.crops_scored.extend(other.crops_scored)
+
+
+class _DiscardedTimings(StageTimings):
+    """Stand-in used when nobody asked for timings."""
+    __slots__ = ()
+
+    def add(self, stage: str, seconds: float):
+        pass
+
+    def scored(self, crops: int):
+        pass
+
+
+NO_TIMINGS = _DiscardedTimings()
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+class _CounterValue:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bucket plus +Inf, not cumulative
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, count: int = 1):
+        """Record `value` `count` times."""
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += count
+            self.sum += value * count
+
+
+class _Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """The time series for one combination of label values."""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, child in sorted(self._children.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float, count: int = 1):
+        self.labels().observe(value, count)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        bucket_labels = self.labelnames + ('le',)
+        for values, child in sorted(self._children.items()):
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(bucket_labels, values + (_format_value(bound),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Single-sample metric whose value is read when the metrics are rendered."""
+
+    def __init__(self, name: str, documentation: str, metric_type: str, read: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.type = metric_type
+        self.read = read
+
+    def render(self) -> List[str]:
+        return self.header() + [f'{self.name} {_format_value(self.read())}']
+
+
+class MetricsRegistry:
+    """Ordered collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class ServiceMetrics:
+    """
+    Metrics of the prediction endpoints.
+
+    Stage histograms are per HTTP request: a /predict request scored in a
+    micro-batch records the time the whole batch spent in each stage,
+    since that is how long the request waited for it.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.getenv('METRICS_ENABLED', 'true').lower() not in ('0', 'false', 'no', 'off')
+        self.enabled = enabled
+        self.registry = MetricsRegistry()
+
+        self.requests = self.registry.register(Counter(
+            'ml_requests_total', 'HTTP requests handled.', ('endpoint', 'status')
+        ))
+        self.errors = self.registry.register(Counter(
+            'ml_request_errors_total', 'HTTP requests that ended in an error status.', ('endpoint', 'status')
+        ))
+        self.item_errors = self.registry.register(Counter(
+            'ml_batch_item_errors_total', 'Batch items that could not be validated or scored.', ('reason',)
+        ))
+        self.latency = self.registry.register(Histogram(
+            'ml_request_duration_seconds', 'End-to-end HTTP request latency.', ('endpoint',)
+        ))
+        self.stage_latency = self.registry.register(Histogram(
+            'ml_predict_stage_duration_seconds', 'Time a prediction request spent in each stage.',
+            ('endpoint', 'stage')
+        ))
+        self.crops_scored = self.registry.register(Histogram(
+            'ml_crops_scored', 'Crops scored per prediction.', (), CROP_COUNT_BUCKETS
+        ))
+
+    def add_callback(self, name: str, documentation: str, metric_type: str, read: Callable[[], float]):
+        """Export a value owned elsewhere (cache counters, queue depth)."""
+        self.registry.register(CallbackMetric(name, documentation, metric_type, read))
+
+    def observe_stage(self, endpoint: str, stage: str, seconds: float):
+        self.stage_latency.labels(endpoint, stage).observe(seconds)
+
+    def observe_timings(self, endpoint: str, timings: StageTimings, requests: int):
+        """Record a scored batch that served `requests` HTTP requests."""
+        for stage, seconds in timings.seconds.items():
+            self.stage_latency.labels(endpoint, stage).observe(seconds, requests)
+        crops_scored = self.crops_scored.labels()
+        for crops in timings.crops_scored:
+            crops_scored.observe(crops)
+
+    def observe_request(self, endpoint: str, status: int, seconds: float):
+        status_label = str(status)
+        self.requests.labels(endpoint, status_label).inc()
+        if status >= 400:
+            self.errors.labels(endpoint, status_label).inc()
+        self.latency.labels(endpoint).observe(seconds)
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that times every HTTP request, counts it by status and
+    stores its arrival time in ``request.state.started`` so endpoints can
+    time request parsing.
+
+    Paths that are not in ``endpoints`` are reported as "other" to keep
+    label cardinality bounded.
+    """
+
+    def __init__(self, app, metrics: ServiceMetrics, endpoints: Iterable[str]):
+        self.app = app
+        self.metrics = metrics
+        self.endpoints = frozenset(endpoints)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        scope.setdefault('state', {})['started'] = started
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            path = scope.get('path', '')
+            endpoint = path if path in self.endpoints else 'other'
+            self.metrics.observe_request(endpoint, status, time.perf_counter() - started)
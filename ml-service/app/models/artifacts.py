@@ -0,0 +1,447 @@
+"""
+Memory-mapped forest artifacts.
+Stores the trees of a fitted RandomForest or HistGradientBoosting model as
+flat, uncompressed NumPy arrays
+(one .npy file per array) next to a manifest.json with the format version,
+feature schema and checksums. The arrays are loaded with mmap_mode='r', so
+loading is close to free and every process on a node that maps the same
+files shares their pages through the page cache.
+
+Files are written under temporary names and renamed into place, with the
+manifest last, so a process that still maps the previous files keeps
+reading them unchanged.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+FORMAT = 'agri-advisor-forest'
+# Version 2 added the boosting engine; version 1 artifacts (forests only) still load
+FORMAT_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+MANIFEST_FILE = 'manifest.json'
+
+# How thoroughly artifacts are checked before they are served
+VERIFY_MODES = ('checksum', 'size')
+
+# children_left / children_right value of a leaf (sklearn's TREE_LEAF)
+LEAF = -1
+
+_ARRAYS = ('roots', 'children_left', 'children_right', 'feature', 'threshold', 'value')
+
+
+class ArtifactError(Exception):
+    """Raised when artifacts are missing, corrupt or in an unsupported format."""
+
+
+class CompiledForest:
+    """
+    A RandomForestClassifier or RandomForestRegressor flattened into arrays.
+    The nodes of all trees are concatenated; `roots` holds each tree's
+    first node and child indices point into the concatenated arrays.
+
+    Predictions match the sklearn estimator's: inputs are compared as
+    float32 against float64 thresholds and tree outputs are summed in tree
+    order, as sklearn does.
+    """
+
+    engine = 'forest'
+
+    def __init__(self, kind: str, roots: np.ndarray, children_left: np.ndarray, children_right: np.ndarray,
+                 feature: np.ndarray, threshold: np.ndarray, value: np.ndarray,
+                 classes: Optional[Sequence] = None):
+        self.kind = kind
+        self.roots = roots
+        self.children_left = children_left
+        self.children_right = children_right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        if classes is not None:
+            self.classes_ = np.asarray(classes)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.threshold)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in _ARRAYS)
+
+    @classmethod
+    def from_estimator(cls, estimator) -> 'CompiledForest':
+        """Flatten a fitted sklearn forest."""
+        is_classifier = hasattr(estimator, 'classes_')
+        if getattr(estimator, 'n_outputs_', 1) != 1:
+            raise ArtifactError("Only single-output forests are supported")
+
+        roots, left, right, feature, threshold, value = [], [], [], [], [], []
+        offset = 0
+        for tree in (estimator_.tree_ for estimator_ in estimator.estimators_):
+            roots.append(offset)
+            for children, out in ((tree.children_left, left), (tree.children_right, right)):
+                out.append(np.where(children == LEAF, LEAF, children + offset))
+            feature.append(tree.feature)
+            threshold.append(tree.threshold)
+            if is_classifier:
+                # What DecisionTreeClassifier.predict_proba returns for a leaf
+                counts = tree.value[:, 0, :len(estimator.classes_)]
+                normalizer = counts.sum(axis=1, keepdims=True)
+                normalizer[normalizer == 0.0] = 1.0
+                value.append(counts / normalizer)
+            else:
+                value.append(tree.value[:, 0, 0])
+            offset += tree.node_count
+
+        index_dtype = np.int32 if offset < 2**31 else np.int64
+        return cls(
+            'classifier' if is_classifier else 'regressor',
+            roots=np.asarray(roots, dtype=index_dtype),
+            children_left=np.concatenate(left).astype(index_dtype),
+            children_right=np.concatenate(right).astype(index_dtype),
+            feature=np.concatenate(feature).astype(np.int32),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            value=np.concatenate(value).astype(np.float64),
+            classes=[str(c) for c in estimator.classes_] if is_classifier else None
+        )
+
+    def replace(self, **arrays) -> 'CompiledForest':
+        """A copy with some of the node arrays replaced, e.g. compacted ones."""
+        return type(self)(self.kind, classes=getattr(self, 'classes_', None), **self._extra(),
+                          **{name: arrays.get(name, getattr(self, name)) for name in _ARRAYS})
+
+    def _extra(self) -> Dict:
+        """Constructor arguments besides kind, classes and the arrays."""
+        return {}
+
+    def manifest_entry(self) -> Dict:
+        """What the manifest records about this model besides its arrays."""
+        return {'engine': self.engine}
+
+    def combine(self, other: 'CompiledForest') -> 'CompiledForest':
+        """
+        A forest with the trees of both, predicting the mean over all of
+        them (what a warm-started sklearn forest does). Classifier classes
+        are the union, this forest's first; trees give probability 0 to
+        classes they were not trained on.
+        """
+        if other.kind != self.kind:
+            raise ArtifactError(f"Cannot combine a {self.kind} with a {other.kind}")
+        offset = self.n_nodes
+        value, other_value, classes = self.value, other.value, None
+        if self.kind == 'classifier':
+            known = set(self.classes_)
+            classes = list(self.classes_) + [c for c in other.classes_ if c not in known]
+            column = {name: index for index, name in enumerate(classes)}
+            value = np.zeros((self.n_nodes, len(classes)))
+            value[:, :self.value.shape[1]] = self.value
+            other_value = np.zeros((other.n_nodes, len(classes)))
+            other_value[:, [column[name] for name in other.classes_]] = other.value
+
+        index_dtype = np.int32 if offset + other.n_nodes < 2**31 else np.int64
+
+        def children(mine, theirs):
+            return np.concatenate([mine, np.where(theirs == LEAF, LEAF, theirs + offset)]).astype(index_dtype)
+
+        return CompiledForest(
+            self.kind,
+            roots=np.concatenate([self.roots, other.roots + offset]).astype(index_dtype),
+            children_left=children(self.children_left, other.children_left),
+            children_right=children(self.children_right, other.children_right),
+            feature=np.concatenate([self.feature, other.feature]),
+            threshold=np.concatenate([self.threshold, other.threshold]),
+            value=np.concatenate([value, other_value]),
+            classes=classes
+        )
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """(rows x trees) leaf node reached by each row in each tree."""
+        X = np.asarray(X, dtype=np.float32)
+        rows = X.shape[0]
+        nodes = np.tile(self.roots.astype(np.int64), rows)
+        row_of = np.repeat(np.arange(rows), self.n_trees)
+
+        # Walk all (row, tree) pairs down one level per step, dropping those at a leaf
+        active = np.arange(nodes.size)
+        while active.size:
+            current = nodes[active]
+            left = self.children_left[current]
+            internal = left != LEAF
+            if not internal.all():
+                active, current, left = active[internal], current[internal], left[internal]
+                if not active.size:
+                    break
+            go_left = X[row_of[active], self.feature[current]] <= self.threshold[current]
+            nodes[active] = np.where(go_left, left, self.children_right[current])
+        return nodes.reshape(rows, self.n_trees)
+
+    def _mean_over_trees(self, X: np.ndarray) -> np.ndarray:
+        leaves = self.apply(X)
+        total = np.zeros((leaves.shape[0],) + self.value.shape[1:], dtype=np.float64)
+        for tree in range(self.n_trees):
+            total += self.value[leaves[:, tree]]
+        total /= self.n_trees
+        return total
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """(rows x classes) probabilities, columns in classes_ order."""
+        return self._mean_over_trees(X)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Mean prediction per row (regressor)."""
+        return self._mean_over_trees(X)
+
+    def tree_predictions(self, X: np.ndarray) -> np.ndarray:
+        """(rows x trees) prediction of every tree for every row (regressor), in one leaf-value lookup."""
+        return self.value[self.apply(X)]
+
+    def predict_interval(self, X: np.ndarray, quantiles: Tuple[float, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Mean prediction per row, equal to predict's, and a (rows x 2) array
+        with the low and high `quantiles` of the trees' predictions for the
+        row (regressor). Bounds are widened to include the mean.
+        """
+        per_tree = self.tree_predictions(X)
+        # Summed in tree order like _mean_over_trees, so the mean is the same
+        mean = np.add.accumulate(per_tree, axis=1, dtype=np.float64)[:, -1] / self.n_trees
+        bounds = np.quantile(per_tree, quantiles, axis=1).T.astype(np.float64)
+        np.minimum(bounds[:, 0], mean, out=bounds[:, 0])
+        np.maximum(bounds[:, 1], mean, out=bounds[:, 1])
+        return mean, bounds
+
+
+# Inverse link per sklearn link class, applied to boosting's raw predictions
+_LINKS = {'IdentityLink': 'identity', 'LogLink': 'exp', 'LogitLink': 'logistic', 'MultinomialLogit': 'softmax'}
+
+
+class CompiledBoosting(CompiledForest):
+    """
+    A HistGradientBoostingClassifier or HistGradientBoostingRegressor in the
+    same arrays. Trees are stored iteration by iteration, with
+    `trees_per_iteration` trees per iteration (one per class for a
+    multiclass classifier). The raw prediction is the baseline plus the sum of
+    the trees' leaf values. The inverse link turns it into probabilities or a
+    prediction.
+
+    As in sklearn, the baseline is added first and the trees are summed in
+    order, so predictions match the estimator's.
+    """
+
+    engine = 'boosting'
+
+    def __init__(self, kind: str, roots: np.ndarray, children_left: np.ndarray, children_right: np.ndarray,
+                 feature: np.ndarray, threshold: np.ndarray, value: np.ndarray,
+                 classes: Optional[Sequence] = None, baseline: Sequence[float] = (0.0,),
+                 link: str = 'identity', trees_per_iteration: int = 1):
+        super().__init__(kind, roots, children_left, children_right, feature, threshold, value, classes)
+        self.baseline = np.asarray(baseline, dtype=np.float64)
+        self.link = link
+        self.trees_per_iteration = trees_per_iteration
+
+    @classmethod
+    def from_estimator(cls, estimator) -> 'CompiledBoosting':
+        """Flatten a fitted sklearn HistGradientBoosting model."""
+        link = _LINKS.get(type(estimator._loss.link).__name__)
+        if link is None:
+            raise ArtifactError(f"Unsupported loss {type(estimator._loss).__name__}")
+
+        roots, left, right, feature, threshold, value = [], [], [], [], [], []
+        offset = 0
+        for predictors in estimator._predictors:
+            for predictor in predictors:
+                nodes = predictor.nodes
+                if nodes['is_categorical'].any():
+                    raise ArtifactError("Categorical splits are not supported")
+                leaf = nodes['is_leaf'].astype(bool)
+                roots.append(offset)
+                left.append(np.where(leaf, LEAF, nodes['left'].astype(np.int64) + offset))
+                right.append(np.where(leaf, LEAF, nodes['right'].astype(np.int64) + offset))
+                feature.append(nodes['feature_idx'])
+                threshold.append(nodes['num_threshold'])
+                value.append(nodes['value'])
+                offset += len(nodes)
+
+        index_dtype = np.int32 if offset < 2**31 else np.int64
+        is_classifier = hasattr(estimator, 'classes_')
+        return cls(
+            'classifier' if is_classifier else 'regressor',
+            roots=np.asarray(roots, dtype=index_dtype),
+            children_left=np.concatenate(left).astype(index_dtype),
+            children_right=np.concatenate(right).astype(index_dtype),
+            feature=np.concatenate(feature).astype(np.int32),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            value=np.concatenate(value).astype(np.float64),
+            classes=[str(c) for c in estimator.classes_] if is_classifier else None,
+            baseline=np.asarray(estimator._baseline_prediction, dtype=np.float64).ravel().tolist(),
+            link=link,
+            trees_per_iteration=estimator.n_trees_per_iteration_
+        )
+
+    def _extra(self) -> Dict:
+        return {'baseline': self.baseline.tolist(), 'link': self.link, 'trees_per_iteration': self.trees_per_iteration}
+
+    def manifest_entry(self) -> Dict:
+        return {'engine': self.engine, 'baseline': self.baseline.tolist(), 'link': self.link,
+                'treesPerIteration': self.trees_per_iteration}
+
+    def combine(self, other: 'CompiledForest') -> 'CompiledForest':
+        raise ArtifactError("Boosted models cannot be extended with more trees; retrain instead")
+
+    def raw_predict(self, X: np.ndarray) -> np.ndarray:
+        """(rows x trees_per_iteration) sum of the baseline and every tree's leaf value."""
+        leaves = self.apply(X)
+        per_iteration = self.trees_per_iteration
+        total = np.zeros((leaves.shape[0], per_iteration), dtype=np.float64)
+        total += self.baseline
+        for start in range(0, self.n_trees, per_iteration):
+            total += self.value[leaves[:, start:start + per_iteration]]
+        return total
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        raw = self.raw_predict(X)
+        if self.link == 'logistic':
+            positive = 1.0 / (1.0 + np.exp(-raw[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+        exp = np.exp(raw - raw.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        raw = self.raw_predict(X)[:, 0]
+        return np.exp(raw) if self.link == 'exp' else raw
+
+    def tree_predictions(self, X: np.ndarray) -> np.ndarray:
+        # Boosting trees fit residuals; one tree's output is not a prediction
+        raise ArtifactError("Boosted models have no per-tree predictions")
+
+    def predict_interval(self, X: np.ndarray, quantiles: Tuple[float, float]) -> Tuple[np.ndarray, np.ndarray]:
+        raise ArtifactError("Boosted models have no per-tree predictions")
+
+
+def compile_estimator(estimator) -> CompiledForest:
+    """Flatten a fitted sklearn forest or HistGradientBoosting model."""
+    if hasattr(estimator, '_predictors'):
+        return CompiledBoosting.from_estimator(estimator)
+    return CompiledForest.from_estimator(estimator)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: str, write):
+    temporary = f"{path}.tmp-{os.getpid()}"
+    with open(temporary, 'wb') as f:
+        write(f)
+    os.replace(temporary, path)
+
+
+def save_forests(model_dir: str, forests: Dict[str, CompiledForest], metadata: Dict) -> Dict:
+    """
+    Write `forests` to model_dir with a manifest carrying `metadata`
+    (e.g. the feature schema). Returns the manifest.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    files: Dict[str, Dict] = {}
+    models: Dict[str, Dict] = {}
+    for name, forest in forests.items():
+        arrays = {}
+        for array_name in _ARRAYS:
+            array = np.ascontiguousarray(getattr(forest, array_name))
+            filename = f"{name}.{array_name}.npy"
+            _write_atomic(os.path.join(model_dir, filename), lambda f: np.save(f, array, allow_pickle=False))
+            path = os.path.join(model_dir, filename)
+            files[filename] = {'bytes': os.path.getsize(path), 'sha256': file_sha256(path)}
+            arrays[array_name] = {'file': filename, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        models[name] = {
+            **forest.manifest_entry(),
+            'kind': forest.kind,
+            'trees': forest.n_trees,
+            'nodes': forest.n_nodes,
+            'classes': [str(c) for c in forest.classes_] if forest.kind == 'classifier' else None,
+            'arrays': arrays
+        }
+
+    manifest = {
+        'format': FORMAT,
+        'version': FORMAT_VERSION,
+        'createdAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        **metadata,
+        'models': models,
+        'files': files
+    }
+    _write_atomic(os.path.join(model_dir, MANIFEST_FILE),
+                  lambda f: f.write(json.dumps(manifest, indent=2).encode('utf-8')))
+    return manifest
+
+
+def read_manifest(model_dir: str) -> Dict:
+    path = os.path.join(model_dir, MANIFEST_FILE)
+    try:
+        with open(path, 'rb') as f:
+            manifest = json.loads(f.read())
+    except (OSError, ValueError) as e:
+        raise ArtifactError(f"Cannot read {path}: {e}") from e
+    if manifest.get('format') != FORMAT:
+        raise ArtifactError(f"{path} is not a {FORMAT} manifest")
+    if manifest.get('version') not in SUPPORTED_VERSIONS:
+        raise ArtifactError(f"Unsupported artifact format version {manifest.get('version')} in {path}, "
+                            f"expected one of {SUPPORTED_VERSIONS}")
+    return manifest
+
+
+def verify_files(model_dir: str, manifest: Dict, verify: str = 'checksum'):
+    """
+    Check every file listed in the manifest: its size, and with
+    verify='checksum' its SHA-256 as well.
+    """
+    if verify not in VERIFY_MODES:
+        raise ValueError(f"Unknown verify mode '{verify}', expected one of {VERIFY_MODES}")
+    for filename, expected in manifest['files'].items():
+        path = os.path.join(model_dir, filename)
+        try:
+            size = os.path.getsize(path)
+        except OSError as e:
+            raise ArtifactError(f"Missing artifact file {path}") from e
+        if size != expected['bytes']:
+            raise ArtifactError(f"{path} is {size} bytes, the manifest expects {expected['bytes']}")
+        if verify == 'checksum' and file_sha256(path) != expected['sha256']:
+            raise ArtifactError(f"Checksum mismatch for {path}")
+
+
+def load_forests(model_dir: str, verify: str = 'checksum') -> Tuple[Dict[str, CompiledForest], Dict]:
+    """
+    Verify and memory-map the forests in model_dir.
+    Returns (forests by name, manifest).
+    """
+    manifest = read_manifest(model_dir)
+    verify_files(model_dir, manifest, verify)
+
+    forests = {}
+    for name, entry in manifest['models'].items():
+        arrays = {}
+        for array_name in _ARRAYS:
+            spec = entry['arrays'][array_name]
+            array = np.load(os.path.join(model_dir, spec['file']), mmap_mode='r', allow_pickle=False)
+            if array.dtype.str != spec['dtype'] or list(array.shape) != spec['shape']:
+                raise ArtifactError(f"{spec['file']} does not match the manifest "
+                                    f"({array.dtype.str} {list(array.shape)})")
+            arrays[array_name] = array
+        if entry.get('engine', 'forest') == 'boosting':
+            forests[name] = CompiledBoosting(entry['kind'], classes=entry.get('classes'), baseline=entry['baseline'],
+                                             link=entry['link'], trees_per_iteration=entry['treesPerIteration'],
+                                             **arrays)
+        else:
+            forests[name] = CompiledForest(entry['kind'], classes=entry.get('classes'), **arrays)
+    return forests, manifest
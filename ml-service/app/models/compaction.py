@@ -0,0 +1,360 @@
+"""
+Model compaction for serving.
+Fully grown forests are large and slow to score for an interactive
+service. Compaction rewrites a registered version's forests:
+
+    max depth   subtrees below the depth cap are replaced by a leaf holding
+                the node's training distribution (classifier) or mean (regressor)
+    trees       keep the N trees that contribute most, picked by greedy
+                forward selection on held-out rows
+    float32     thresholds and leaf values stored as float32, feature
+                indices as int16
+
+Boosted models (--engine boosting) only support float32.
+
+Each setting is saved, loaded back and scored as the service would, and
+reported with its artifact size, RSS, per-request latency and accuracy
+loss against the original. With --register the smallest setting within
+--max-loss is registered as a new version; the service loads it like any
+other.
+
+Usage (from ml-service/):
+    python -m app.models.compaction models/ --data data/training_data.csv --max-depth none,16,12 --trees all,50
+    python -m app.models.compaction models/ --data data/training_data.csv --register
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sklearn.metrics import r2_score
+from sklearn.model_selection import train_test_split
+
+from app.memory import format_bytes, rss_bytes
+from app.models.artifacts import LEAF, CompiledForest, compile_estimator
+from app.models.incremental import PROFILE_FILE
+from app.models.registry import ModelRegistry, RegistryError, env_pinned_version
+from app.models.trained_model import TrainedModel, save_forest_artifacts
+from app.models.tuning import measure_latency
+
+# Default settings compared by the CLI
+DEFAULT_MAX_DEPTHS = [None, 16, 12]
+DEFAULT_TREES = [None, 50]
+
+# Rows used for tree selection and for scoring each setting
+MAX_SELECTION_ROWS = 2000
+
+
+def _reachable(roots: np.ndarray, children_left: np.ndarray, children_right: np.ndarray,
+               max_depth: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Nodes reachable from `roots`, walking one level at a time. With
+    `max_depth`, nodes at that depth become leaves. Returns the reachable
+    mask and the (possibly cut) child arrays.
+    """
+    left, right = np.array(children_left), np.array(children_right)
+    reachable = np.zeros(len(left), dtype=bool)
+    frontier = np.asarray(roots, dtype=np.int64)
+    depth = 0
+    while frontier.size:
+        reachable[frontier] = True
+        if depth == max_depth:
+            left[frontier] = LEAF
+            right[frontier] = LEAF
+            break
+        internal = frontier[left[frontier] != LEAF]
+        frontier = np.concatenate([left[internal], right[internal]]).astype(np.int64)
+        depth += 1
+    return reachable, left, right
+
+
+def subset(forest: CompiledForest, trees: Optional[Sequence[int]] = None,
+           max_depth: Optional[int] = None) -> CompiledForest:
+    """The forest restricted to `trees` (indices, in forest order) and cut at `max_depth`."""
+    roots = forest.roots if trees is None else forest.roots[np.sort(np.asarray(trees))]
+    reachable, left, right = _reachable(roots, forest.children_left, forest.children_right, max_depth)
+    new_index = np.cumsum(reachable) - 1
+
+    def remap(children):
+        kept = children[reachable]
+        return np.where(kept == LEAF, LEAF, new_index[kept]).astype(forest.children_left.dtype)
+
+    return forest.replace(
+        roots=new_index[roots].astype(forest.roots.dtype),
+        children_left=remap(left),
+        children_right=remap(right),
+        feature=np.asarray(forest.feature)[reachable],
+        threshold=np.asarray(forest.threshold)[reachable],
+        value=np.asarray(forest.value)[reachable]
+    )
+
+
+def to_float32(forest: CompiledForest) -> CompiledForest:
+    """
+    Store thresholds and leaf values as float32 and feature indices as
+    int16. Each threshold is rounded down to the nearest float32, so every
+    split sends the (float32) inputs the same way as before; only the leaf
+    values lose precision.
+    """
+    threshold = np.asarray(forest.threshold, dtype=np.float64)
+    compact = threshold.astype(np.float32)
+    over = compact.astype(np.float64) > threshold
+    compact[over] = np.nextafter(compact[over], np.float32(-np.inf))
+    feature = np.asarray(forest.feature)
+    return forest.replace(
+        feature=feature.astype(np.int16) if feature.max(initial=0) < 2**15 else feature,
+        threshold=compact,
+        value=np.asarray(forest.value, dtype=np.float32)
+    )
+
+
+def select_trees(forest: CompiledForest, keep: int, X: np.ndarray, y: np.ndarray) -> List[int]:
+    """
+    Greedy forward selection: repeatedly add the tree whose addition best
+    improves the ensemble on (X, y), the mean probability of the true crop
+    for a classifier and the squared error for a regressor. Returns the
+    indices of `keep` trees.
+    """
+    if keep >= forest.n_trees:
+        return list(range(forest.n_trees))
+    leaves = forest.apply(X)
+    # (trees x rows [x classes]) output of every tree
+    outputs = np.stack([np.asarray(forest.value)[leaves[:, tree]] for tree in range(forest.n_trees)])
+    if forest.kind == 'classifier':
+        column = {name: index for index, name in enumerate(forest.classes_)}
+        truth = np.array([column.get(str(label), -1) for label in y])
+        known = truth >= 0
+        outputs = outputs[:, known, truth[known]]
+        target = np.ones(outputs.shape[1])
+    else:
+        target = np.asarray(y, dtype=np.float64)
+
+    selected: List[int] = []
+    remaining = np.ones(forest.n_trees, dtype=bool)
+    total = np.zeros(outputs.shape[1])
+    for size in range(1, keep + 1):
+        candidates = np.flatnonzero(remaining)
+        # Both objectives are a squared error: 1 - p(true crop), or the yield error
+        errors = (((total + outputs[candidates]) / size - target) ** 2).mean(axis=1)
+        best = candidates[int(np.argmin(errors))]
+        selected.append(int(best))
+        remaining[best] = False
+        total += outputs[best]
+    return sorted(selected)
+
+
+def compact(forest: CompiledForest, max_depth: Optional[int] = None, trees: Optional[int] = None,
+            float32: bool = False, X: Optional[np.ndarray] = None, y: Optional[np.ndarray] = None) -> CompiledForest:
+    """
+    Apply a compaction setting. Trees are selected after the depth cut, on
+    (X, y), which must be rows the forest was not trained on. Boosted models
+    only support float32: their trees are not averaged, and their inner
+    nodes hold no usable prediction.
+    """
+    if forest.engine == 'boosting' and (max_depth is not None or trees is not None):
+        raise ValueError("Boosted models can only be compacted to float32")
+    if max_depth is not None:
+        forest = subset(forest, max_depth=max_depth)
+    if trees is not None and trees < forest.n_trees:
+        if X is None or y is None:
+            raise ValueError("Selecting trees needs held-out rows")
+        forest = subset(forest, select_trees(forest, trees, X, y))
+    if float32:
+        forest = to_float32(forest)
+    return forest
+
+
+def setting_name(setting: Dict) -> str:
+    return (f"depth={setting['maxDepth'] or 'none'} trees={setting['trees'] or 'all'} "
+            f"{'float32' if setting['float32'] else 'float64'}")
+
+
+def _load_and_score(model_dir: str, X: np.ndarray, y_crop: np.ndarray, y_yield: np.ndarray) -> Dict:
+    """Load saved artifacts as the service does and measure them."""
+    gc.collect()
+    before = rss_bytes()
+    model = TrainedModel.load(model_dir, verify='size')
+    model.warm_up()
+    crops = np.asarray(model.crops)
+    metrics = {
+        'cropAccuracy': float(np.mean(crops[model.predict_proba(X).argmax(axis=1)] == np.asarray(y_crop, dtype=str))),
+        'yieldR2': float(r2_score(y_yield, model.predict_yield(X)))
+    }
+    # Scoring the rows above has paged in most of the arrays, as serving would
+    rss = rss_bytes() - before
+    latency = measure_latency(lambda rows: (model.predict_proba(rows), model.predict_yield_interval(rows)), X)
+    del model
+    return {'metrics': metrics, 'rssBytes': rss, 'latency': latency}
+
+
+def evaluate_settings(model: TrainedModel, settings: List[Dict], X: np.ndarray, y_crop: np.ndarray,
+                      y_yield: np.ndarray, metadata: Optional[Dict] = None) -> List[Dict]:
+    """
+    Compact the model's forests with every setting, save each to a
+    temporary directory, then load and score it on half of (X, y); the
+    other half selects trees. Returns one result per setting, the first
+    being the original model.
+    """
+    X_select, X_eval, y_crop_select, y_crop_eval, y_yield_select, y_yield_eval = train_test_split(
+        X, y_crop, y_yield, test_size=0.5, random_state=42
+    )
+    rows = slice(MAX_SELECTION_ROWS)
+    X_select, y_crop_select, y_yield_select = X_select[rows], y_crop_select[rows], y_yield_select[rows]
+    X_eval, y_crop_eval, y_yield_eval = X_eval[rows], y_crop_eval[rows], y_yield_eval[rows]
+
+    crop_forest, yield_forest = model.crop_classifier, model.yield_regressor
+    if not isinstance(crop_forest, CompiledForest):
+        # Loaded from pickles
+        crop_forest, yield_forest = compile_estimator(crop_forest), compile_estimator(yield_forest)
+
+    original = {'maxDepth': None, 'trees': None, 'float32': False}
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for index, setting in enumerate([original] + [s for s in settings if s != original]):
+            started = time.perf_counter()
+            crop = compact(crop_forest, setting['maxDepth'], setting['trees'], setting['float32'],
+                           X_select, y_crop_select)
+            regressor = compact(yield_forest, setting['maxDepth'], setting['trees'], setting['float32'],
+                                X_select, y_yield_select)
+            compact_seconds = time.perf_counter() - started
+            setting_dir = os.path.join(scratch, str(index))
+            manifest = save_forest_artifacts(crop, regressor, model.features, setting_dir,
+                                             {**(metadata or {}), 'compaction': setting})
+            results.append({
+                'setting': setting,
+                'compactSeconds': round(compact_seconds, 3),
+                'sizeBytes': sum(entry['bytes'] for entry in manifest['files'].values()),
+                'nodes': crop.n_nodes + regressor.n_nodes,
+                **_load_and_score(setting_dir, X_eval, y_crop_eval, y_yield_eval),
+                'forests': (crop, regressor)
+            })
+
+    base = results[0]['metrics']
+    for result in results:
+        result['loss'] = {
+            'cropAccuracy': round(base['cropAccuracy'] - result['metrics']['cropAccuracy'], 6),
+            'yieldR2': round(base['yieldR2'] - result['metrics']['yieldR2'], 6)
+        }
+    return results
+
+
+def choose(results: List[Dict], max_loss: float, max_latency_ms: Optional[float] = None) -> Dict:
+    """The smallest setting losing at most `max_loss` accuracy and R² (and within the latency budget)."""
+    eligible = [result for result in results
+                if max(result['loss'].values()) <= max_loss
+                and (max_latency_ms is None or result['latency']['p50Ms'] <= max_latency_ms)]
+    return min(eligible or results[:1], key=lambda result: result['sizeBytes'])
+
+
+def print_results(results: List[Dict], chosen: Optional[Dict] = None):
+    print(f"\n{'setting':<36} {'size':>9} {'RSS':>9} {'p50 ms':>7} {'p95 ms':>7} {'ms/row@64':>9} "
+          f"{'accuracy':>8} {'loss':>7} {'R²':>7} {'loss':>7}")
+    for result in results:
+        print(f"{setting_name(result['setting']):<36} {format_bytes(result['sizeBytes']):>9} "
+              f"{format_bytes(result['rssBytes']):>9} {result['latency']['p50Ms']:>7.3f} "
+              f"{result['latency']['p95Ms']:>7.3f} {result['latency']['batchMsPerRow']:>9.4f} "
+              f"{result['metrics']['cropAccuracy']:>8.4f} {result['loss']['cropAccuracy']:>7.4f} "
+              f"{result['metrics']['yieldR2']:>7.4f} {result['loss']['yieldR2']:>7.4f}"
+              f"{'  <- selected' if result is chosen else ''}")
+
+
+def _parse(text: Optional[str], default: list, none_word: str) -> list:
+    if not text:
+        return default
+    return [None if value.strip().lower() == none_word else int(value) for value in text.split(',')]
+
+
+def main():
+    # Imported here: train_model uses this module for incremental updates of compacted versions
+    from app.models.train_model import DEFAULT_CHUNK_ROWS, load_training_data, prepare_features
+
+    parser = argparse.ArgumentParser(description="Compact a registered model for serving")
+    parser.add_argument('model_dir', help='Model registry (MODEL_PATH)')
+    parser.add_argument('--data', default='./data/training_data.csv',
+                        help='Data to hold out rows from for tree selection and scoring (.csv or .parquet)')
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help='Rows read per chunk')
+    parser.add_argument('--version', type=int, help='Version to compact (default: the one served)')
+    parser.add_argument('--max-depth', help="Depth caps to compare, e.g. none,16,12")
+    parser.add_argument('--trees', help='Trees to keep per forest, e.g. all,50,25')
+    parser.add_argument('--precision', default='float32', help='float64, float32 or both (comma-separated)')
+    parser.add_argument('--max-loss', type=float, default=0.01,
+                        help='Largest accuracy and R² loss a setting may have to be selected')
+    parser.add_argument('--max-latency-ms', type=float, help='Single-request p50 budget for the selected setting')
+    parser.add_argument('--register', action='store_true', help='Register the selected setting as a new version')
+    parser.add_argument('--report', help='Report path (default: compaction_report.json in the version)')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.model_dir)
+    try:
+        base_version = args.version or registry.active_version(env_pinned_version())
+        base_entry = registry.get(base_version)
+    except RegistryError as e:
+        parser.error(str(e))
+    base_dir = registry.version_dir(base_version)
+    model = TrainedModel.load(base_dir)
+
+    df = load_training_data(args.data, args.chunk_rows)
+    if df is None:
+        return
+    X, y_crop, y_yield, _ = prepare_features(df, model.features)
+    # The rows train_model held out when it fitted on this data
+    _, X_test, _, y_crop_test, _, y_yield_test = train_test_split(X, y_crop, y_yield, test_size=0.2,
+                                                                  random_state=42)
+
+    settings = [
+        {'maxDepth': depth, 'trees': trees, 'float32': precision == 'float32'}
+        for depth, trees, precision in itertools.product(
+            _parse(args.max_depth, DEFAULT_MAX_DEPTHS, 'none'), _parse(args.trees, DEFAULT_TREES, 'all'),
+            [value.strip() for value in args.precision.split(',')]
+        )
+    ]
+    if model.engine == 'boosting':
+        settings = [setting for setting in settings if setting['maxDepth'] is None and setting['trees'] is None]
+        print(f"Version {base_version} is a boosted model, only its precision can be compacted")
+    print(f"Compacting version {base_version} with {len(settings)} settings on {len(X_test)} held-out rows...")
+    results = evaluate_settings(model, settings, X_test, y_crop_test, y_yield_test)
+    chosen = choose(results, args.max_loss, args.max_latency_ms)
+    print_results(results, chosen)
+
+    report = {
+        'version': base_version,
+        'maxLoss': args.max_loss,
+        'maxLatencyMs': args.max_latency_ms,
+        'results': [{key: value for key, value in result.items() if key != 'forests'} for result in results],
+        'selected': chosen['setting']
+    }
+    if args.register:
+        if chosen is results[0]:
+            print("No setting is smaller within the loss budget, nothing registered")
+        else:
+            crop, regressor = chosen['forests']
+            version, version_dir = registry.allocate()
+            save_forest_artifacts(crop, regressor, model.features, version_dir,
+                                  {'modelVersion': version, 'compaction': chosen['setting']})
+            if os.path.exists(os.path.join(base_dir, PROFILE_FILE)):
+                shutil.copy(os.path.join(base_dir, PROFILE_FILE), version_dir)
+            registry.register(version, {
+                'method': 'compacted',
+                'parent': base_version,
+                'data': base_entry.get('data', {}),
+                'metrics': chosen['metrics'],
+                'trees': {'crop': crop.n_trees, 'yield': regressor.n_trees},
+                'compaction': chosen['setting']
+            })
+            report['registered'] = version
+            print(f"Registered {setting_name(chosen['setting'])} as version {version} in {version_dir}")
+
+    report_path = args.report or os.path.join(base_dir, 'compaction_report.json')
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report saved to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Crop Catalog
+Loads and validates the crop knowledge base (ideal ranges, seasons and base
+yield per crop or variety) from a JSON, CSV or Parquet file.
+
+JSON files hold a list of crop objects:
+    {"crops": [{"name": "Rice", "season": ["Kharif"], "ph_range": [5.5, 7.0], ...}]}
+
+CSV and Parquet files hold one crop per row with the columns
+    name, season, ph_min, ph_max, temp_min, temp_max, rainfall_min, rainfall_max,
+    nitrogen_min, nitrogen_max, phosphorus_min, phosphorus_max,
+    potassium_min, potassium_max, base_yield
+where ``season`` lists the seasons separated by ``;``.
+"""
+import csv
+import json
+import math
+import numbers
+import os
+from typing import Dict, Iterable, List
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(__file__), 'crops.json')
+
+RANGE_KEYS = (
+    'ph_range', 'temp_range', 'rainfall_range',
+    'nitrogen_range', 'phosphorus_range', 'potassium_range'
+)
+# Ranges the scoring divides by, which must not be empty
+STRICT_RANGE_KEYS = ('ph_range', 'temp_range', 'rainfall_range')
+
+SEASON_SEPARATOR = ';'
+
+
+def _range_columns(key: str) -> tuple:
+    prefix = key[:-len('_range')]
+    return f'{prefix}_min', f'{prefix}_max'
+
+
+def _from_rows(rows: Iterable[Dict]) -> List[Dict]:
+    """Convert flat CSV/Parquet rows to crop entries."""
+    entries = []
+    for row in rows:
+        entry = {
+            'name': row.get('name'),
+            'season': [season.strip() for season in str(row.get('season') or '').split(SEASON_SEPARATOR)
+                       if season.strip()],
+            'base_yield': row.get('base_yield')
+        }
+        for key in RANGE_KEYS:
+            low, high = _range_columns(key)
+            entry[key] = [row.get(low), row.get(high)]
+        entries.append(entry)
+    return entries
+
+
+def _to_number(value):
+    if isinstance(value, str):
+        value = float(value)
+    if isinstance(value, bool) or not isinstance(value, numbers.Real) or not math.isfinite(value):
+        raise ValueError(f"not a finite number: {value!r}")
+    return value
+
+
+def validate_crops(entries: List[Dict]) -> Dict[str, Dict]:
+    """
+    Validate crop entries and return them as the predictor's crop database
+    (name -> {'season': [...], '<feature>_range': (min, max), 'base_yield': ...}).
+
+    Raises ValueError listing every problem found.
+    """
+    crops = {}
+    errors = []
+
+    for position, entry in enumerate(entries):
+        name = entry.get('name') if isinstance(entry, dict) else None
+        label = f"crop #{position + 1}" + (f" ({name})" if name else "")
+        if not isinstance(name, str) or not name.strip():
+            errors.append(f"{label}: missing name")
+            continue
+        name = name.strip()
+        if name in crops:
+            errors.append(f"{label}: duplicate name")
+            continue
+
+        crop_data = {}
+        seasons = entry.get('season')
+        if isinstance(seasons, str):
+            seasons = [seasons]
+        if not seasons or not all(isinstance(season, str) and season for season in seasons):
+            errors.append(f"{label}: 'season' must be a non-empty list of season names")
+        else:
+            crop_data['season'] = list(seasons)
+
+        for key in RANGE_KEYS:
+            value = entry.get(key)
+            try:
+                if not isinstance(value, (list, tuple)) or len(value) != 2:
+                    raise ValueError("expected [min, max]")
+                low, high = _to_number(value[0]), _to_number(value[1])
+                if low > high or (key in STRICT_RANGE_KEYS and low == high):
+                    raise ValueError(f"min {low} must be below max {high}")
+            except ValueError as e:
+                errors.append(f"{label}: invalid '{key}': {e}")
+            else:
+                crop_data[key] = (low, high)
+
+        try:
+            crop_data['base_yield'] = _to_number(entry.get('base_yield'))
+            if crop_data['base_yield'] < 0:
+                raise ValueError("must not be negative")
+        except ValueError as e:
+            errors.append(f"{label}: invalid 'base_yield': {e}")
+
+        crops[name] = crop_data
+
+    if not errors and not crops:
+        errors.append("catalog contains no crops")
+    if errors:
+        shown = errors[:20]
+        if len(errors) > len(shown):
+            shown.append(f"... and {len(errors) - len(shown)} more")
+        raise ValueError("Invalid crop catalog:\n  " + "\n  ".join(shown))
+
+    return crops
+
+
+def load_crop_catalog(path: str = None) -> Dict[str, Dict]:
+    """
+    Load and validate a crop catalog file.
+    The format is chosen by extension: .json, .csv or .parquet.
+    """
+    path = path or DEFAULT_CATALOG_PATH
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == '.json':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        entries = data.get('crops') if isinstance(data, dict) else data
+        if not isinstance(entries, list):
+            raise ValueError("Invalid crop catalog: expected a list of crops under 'crops'")
+    elif extension == '.csv':
+        with open(path, newline='', encoding='utf-8') as f:
+            entries = _from_rows(csv.DictReader(f))
+    elif extension == '.parquet':
+        # Parquet support needs pandas with pyarrow or fastparquet
+        import pandas as pd
+        entries = _from_rows(pd.read_parquet(path).to_dict('records'))
+    else:
+        raise ValueError(f"Unsupported crop catalog format '{extension}' (use .json, .csv or .parquet)")
+
+    return validate_crops(entries)
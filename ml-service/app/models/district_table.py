@@ -0,0 +1,320 @@
+"""
+Precomputed district x season recommendation table.
+The backend's getRecommendations (stored aggregates, no real-time weather)
+sends the ML service features that depend only on the district's stored
+record and the season. This job scores every district of the aggregated
+district data for every season ahead of time and stores what the model
+returns for each: the crop probabilities, the expected yield and, for
+forests, the yield bounds.
+
+With PREDICTOR_MODE=table the service looks requests up by (state,
+district, season) and compares their encoded features with the stored
+snapshot. Exact matches are answered from the table; anything else
+(edited district data, real-time weather, an unknown district) is scored
+live. Ranking, options and explanations are applied as for live scores,
+so answers are identical either way.
+
+A table belongs to one model version. It records the SHA-256 of the
+version's manifest and is ignored when the model served is another one.
+Layout, by default in the version directory:
+
+    <version>/district_table/table.json  X.npy  probabilities.npy  yields.npy  [yield_bounds.npy]
+
+Usage (from ml-service/):
+    python -m app.models.district_table models/ \
+        --districts ../data-scripts/data/processed/district_data_aggregated.json
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.memory import format_bytes
+from app.models.artifacts import MANIFEST_FILE, ArtifactError, file_sha256
+from app.models.registry import ModelRegistry, RegistryError, env_pinned_version, is_registry
+from app.models.trained_model import TrainedModel
+
+TABLE_FORMAT = 'agri-advisor-district-table'
+# Version 2 added the yield bounds
+TABLE_FORMAT_VERSION = 2
+TABLE_DIR = 'district_table'
+TABLE_FILE = 'table.json'
+
+_ARRAYS = ('X', 'probabilities', 'yields')
+# Only for models with yield intervals (see TrainedModel.yield_intervals)
+_BOUNDS = 'yield_bounds'
+
+# Values the backend sends when a stored aggregate is missing
+# (buildSoilSnapshot and the stored-weather branch of runRecommendationPipeline)
+SOIL_DEFAULTS = (
+    ('soil_ph', 'ph', 6.5),
+    ('soil_organic_carbon', 'organicCarbon', 0.8),
+    ('soil_nitrogen', 'nitrogen', 120),
+    ('soil_phosphorus', 'phosphorus', 25),
+    ('soil_potassium', 'potassium', 180),
+)
+WEATHER_DEFAULTS = (
+    ('avg_temperature', 'avgTemperature', 25),
+    ('avg_rainfall', 'avgRainfall', 800),
+    ('avg_humidity', 'avgHumidity', 60),
+)
+
+# Rows scored per worker task
+CHUNK_ROWS = 2048
+
+
+def default_table_dir(model_dir: str) -> str:
+    return os.path.join(model_dir, TABLE_DIR)
+
+
+def model_signature(model_dir: str) -> Optional[str]:
+    """SHA-256 of a version's manifest, or None for pickled artifacts."""
+    manifest = os.path.join(model_dir, MANIFEST_FILE)
+    return file_sha256(manifest) if os.path.exists(manifest) else None
+
+
+def district_features(record: Dict, season: str) -> Dict:
+    """
+    Predictor features the backend builds for a stored district record,
+    with the same defaults for missing aggregates.
+    """
+    features = {'state': record['state'], 'district': record['district'], 'season': season}
+    for groups, key in ((SOIL_DEFAULTS, 'soilData'), (WEATHER_DEFAULTS, 'weatherData')):
+        stored = record.get(key) or {}
+        for feature, name, default in groups:
+            mean = (stored.get(name) or {}).get('mean')
+            features[feature] = default if mean is None else mean
+    return features
+
+
+class DistrictTable:
+    """Model outputs per (state, district, season), with the features they were scored from."""
+
+    def __init__(self, keys: Sequence[Tuple[str, str, str]], X: np.ndarray, probabilities: np.ndarray,
+                 yields: np.ndarray, yield_bounds: Optional[np.ndarray], meta: Dict):
+        self.keys = [tuple(key) for key in keys]
+        self.X = X
+        self.probabilities = probabilities
+        self.yields = yields
+        self.yield_bounds = yield_bounds
+        self.meta = meta
+        self.index = {key: row for row, key in enumerate(self.keys)}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self._arrays().values())
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {name: getattr(self, name) for name in _ARRAYS}
+        if self.yield_bounds is not None:
+            arrays[_BOUNDS] = self.yield_bounds
+        return arrays
+
+    @classmethod
+    def load(cls, table_dir: str) -> Optional['DistrictTable']:
+        """
+        Memory-map the table in table_dir, or return None if there is none.
+        Raises ArtifactError when it is incomplete or in another format.
+        """
+        path = os.path.join(table_dir, TABLE_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                meta = json.load(f)
+            if meta.get('format') != TABLE_FORMAT or meta.get('version') != TABLE_FORMAT_VERSION:
+                raise ArtifactError(f"{path} is not a version {TABLE_FORMAT_VERSION} district table")
+            names = _ARRAYS + ((_BOUNDS,) if meta.get('yieldBounds') else ())
+            arrays = {name: np.load(os.path.join(table_dir, f"{name}.npy"), mmap_mode='r', allow_pickle=False)
+                      for name in names}
+        except (OSError, ValueError) as e:
+            raise ArtifactError(f"Cannot load district table from {table_dir}: {e}") from e
+        keys = meta.pop('keys')
+        if any(len(array) != len(keys) for array in arrays.values()):
+            raise ArtifactError(f"District table arrays in {table_dir} do not match its {len(keys)} keys")
+        return cls(keys, arrays['X'], arrays['probabilities'], arrays['yields'], arrays.get(_BOUNDS), meta)
+
+    def save(self, table_dir: str):
+        """
+        Write the table. The files go to a temporary directory that is
+        renamed into place, so a service reading the old table never sees
+        a partial one.
+        """
+        parent = os.path.dirname(os.path.abspath(table_dir))
+        os.makedirs(parent, exist_ok=True)
+        temporary = f"{table_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        for name, array in self._arrays().items():
+            np.save(os.path.join(temporary, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+        with open(os.path.join(temporary, TABLE_FILE), 'w') as f:
+            json.dump({**self.meta, 'yieldBounds': self.yield_bounds is not None,
+                       'keys': [list(key) for key in self.keys]}, f)
+        previous = f"{table_dir}.old-{os.getpid()}"
+        if os.path.exists(table_dir):
+            os.rename(table_dir, previous)
+        os.rename(temporary, table_dir)
+        shutil.rmtree(previous, ignore_errors=True)
+
+    def matches(self, model: TrainedModel) -> bool:
+        """Whether the table was built from `model`'s artifacts."""
+        return (self.meta.get('modelSignature') == model_signature(model.model_dir)
+                and self.meta.get('crops') == model.crops
+                and (self.yield_bounds is not None) == model.yield_intervals)
+
+    def find(self, features_list: List[Dict], X: np.ndarray) -> np.ndarray:
+        """
+        Table row of each request, or -1 when its key is not in the table or
+        its encoded features (X, one row per request) differ from the
+        stored snapshot.
+        """
+        index = self.index
+        rows = np.array([index.get((features['state'], features['district'], features['season']), -1)
+                         for features in features_list], dtype=np.intp)
+        found = np.flatnonzero(rows >= 0)
+        if len(found):
+            same = (self.X[rows[found]] == X[found]).all(axis=1)
+            rows[found[~same]] = -1
+        return rows
+
+
+# Model owned by each scoring worker
+_worker_model: Optional[TrainedModel] = None
+
+
+def _init_worker(model_dir: str):
+    global _worker_model
+    # The parent already verified the files; workers map the same ones
+    _worker_model = TrainedModel.load(model_dir, verify='size')
+
+
+def _score(model: TrainedModel, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    return (model.predict_proba(X),) + model.predict_yield_interval(X)
+
+
+def _score_chunk(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    return _score(_worker_model, X)
+
+
+def score_rows(model: TrainedModel, X: np.ndarray,
+               n_jobs: int) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """
+    Probabilities, expected yields and yield bounds (None without
+    yield_intervals) of X, in chunks over n_jobs processes (-1: all cores).
+    """
+    workers = (os.cpu_count() or 1) if n_jobs == -1 else max(1, n_jobs)
+    chunks = [X[start:start + CHUNK_ROWS] for start in range(0, len(X), CHUNK_ROWS)]
+    workers = min(workers, len(chunks))
+    if workers <= 1:
+        results = [_score(model, chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model.model_dir,)) as pool:
+            results = list(pool.map(_score_chunk, chunks))
+    if not results:
+        return np.empty((0, len(model.crops))), np.empty(0), np.empty((0, 2)) if model.yield_intervals else None
+    probabilities, yields, bounds = (
+        np.concatenate(parts) if parts[0] is not None else None for parts in zip(*results)
+    )
+    return probabilities, yields, bounds
+
+
+def build_table(model: TrainedModel, records: List[Dict], seasons: Sequence[str], n_jobs: int = -1,
+                report: Optional[Dict] = None) -> DistrictTable:
+    """
+    Score every district record for every season. Per-stage seconds go
+    into `report` when given.
+    """
+    stages = report.setdefault('stages', {}) if report is not None else {}
+    started = time.perf_counter()
+    keys, features_list = [], []
+    for record in records:
+        for season in seasons:
+            keys.append((record['state'], record['district'], season))
+            features_list.append(district_features(record, season))
+    X = model.encode(features_list)
+    encoded = time.perf_counter()
+    stages['encode'] = round(encoded - started, 3)
+
+    probabilities, yields, yield_bounds = score_rows(model, X, n_jobs)
+    stages['score'] = round(time.perf_counter() - encoded, 3)
+
+    return DistrictTable(keys, X, probabilities, yields, yield_bounds, {
+        'format': TABLE_FORMAT,
+        'version': TABLE_FORMAT_VERSION,
+        'createdAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'modelDir': os.path.abspath(model.model_dir),
+        'modelVersion': model.model_version,
+        'modelSignature': model_signature(model.model_dir),
+        'crops': model.crops,
+        'seasons': list(seasons),
+        'districts': len(records)
+    })
+
+
+def load_districts(path: str) -> List[Dict]:
+    """District records from the aggregated district data (data-scripts/aggregate_district_data.py)."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute model recommendations for every district and season")
+    parser.add_argument('model_dir', help='Model registry or artifact directory')
+    parser.add_argument('--districts', required=True,
+                        help='Aggregated district data (district_data_aggregated.json from data-scripts)')
+    parser.add_argument('--version', type=int, help='Registered version to build for (default: the one served)')
+    parser.add_argument('--seasons', help="Comma-separated seasons (default: every season the model was trained on)")
+    parser.add_argument('--output', help=f'Table directory (default: {TABLE_DIR}/ in the version)')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='Scoring processes (-1: all cores)')
+    args = parser.parse_args()
+
+    model_dir = args.model_dir
+    if is_registry(model_dir):
+        registry = ModelRegistry(model_dir)
+        try:
+            model_dir = registry.version_dir(args.version or registry.active_version(env_pinned_version()))
+        except RegistryError as e:
+            parser.error(str(e))
+    model = TrainedModel.load(model_dir)
+    if model is None:
+        parser.error(f"No model artifacts in {model_dir}")
+    if model_signature(model_dir) is None:
+        parser.error(f"{model_dir} holds pickled artifacts; convert them with app.models.trained_model first")
+
+    started = time.perf_counter()
+    records = load_districts(args.districts)
+    seasons = ([season.strip() for season in args.seasons.split(',')] if args.seasons
+               else model.features.category_classes['season'])
+    loaded = time.perf_counter()
+    workers = (os.cpu_count() or 1) if args.n_jobs == -1 else args.n_jobs
+    print(f"Scoring {len(records)} districts x {len(seasons)} seasons with version {model.model_version} "
+          f"({model_dir}) on {workers} processes...")
+
+    report = {'stages': {'load': round(loaded - started, 3)}}
+    table = build_table(model, records, seasons, args.n_jobs, report)
+    saving = time.perf_counter()
+    table_dir = args.output or default_table_dir(model_dir)
+    table.meta['buildSeconds'] = round(saving - started, 3)
+    table.save(table_dir)
+    report['stages']['save'] = round(time.perf_counter() - saving, 3)
+    total = time.perf_counter() - started
+
+    print(f"\n{'stage':<10} {'seconds':>9}")
+    for stage, seconds in report['stages'].items():
+        print(f"{stage:<10} {seconds:>9.3f}")
+    print(f"{'total':<10} {total:>9.3f}")
+    print(f"\n{len(table)} rows ({len(table) / max(report['stages']['score'], 1e-9):,.0f} rows/s scored), "
+          f"{format_bytes(table.nbytes)} written to {table_dir}")
+
+
+if __name__ == "__main__":
+    main()
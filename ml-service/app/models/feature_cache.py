@@ -0,0 +1,125 @@
+"""
+On-disk cache of encoded training data.
+Reading and encoding the training table is most of the time of a run that
+only changes model settings. The first run with a data file stores what
+training needs from it: the float32 feature matrix, the targets, the
+feature pipeline, and the data profile and summary the registry keeps.
+These go in an entry named after the SHA-256 of the file's contents and
+the pipeline version. Later runs memory-map the entry instead of
+reading and encoding again. Changing the data, the encoding or the loader
+dtypes changes the key, so stale entries are never read.
+
+Layout, one directory per entry:
+
+    <cache>/<key>/X.npy  y_crop.npy  y_yield.npy  meta.json
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+
+from app.models.artifacts import file_sha256
+from app.models.features import PIPELINE_VERSION, FeaturePipeline
+
+# Bumped whenever what an entry holds changes
+CACHE_FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+
+# Entries kept; the least recently used beyond this are removed
+DEFAULT_MAX_ENTRIES = 4
+
+_ARRAYS = ('X', 'y_crop', 'y_yield')
+
+
+class CachedFeatures(NamedTuple):
+    X: np.ndarray
+    y_crop: np.ndarray
+    y_yield: np.ndarray
+    pipeline: FeaturePipeline
+    profile: Dict
+    summary: Dict
+
+
+def default_cache_dir(data_path: str) -> str:
+    return os.path.join(os.path.dirname(data_path) or '.', '.feature_cache')
+
+
+class FeatureCache:
+    """Encoded training data by content hash, under one directory."""
+
+    def __init__(self, root: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.root = root
+        self.max_entries = max_entries
+
+    def key(self, data_path: str, loader: Dict) -> str:
+        """
+        Entry key of a data file: its content hash, the pipeline and cache
+        format versions, and `loader` (settings that change what is read,
+        e.g. the column dtypes).
+        """
+        settings = json.dumps({'pipeline': PIPELINE_VERSION, 'format': CACHE_FORMAT_VERSION, 'loader': loader},
+                              sort_keys=True)
+        return f"{file_sha256(data_path)[:32]}-{hashlib.sha256(settings.encode('utf-8')).hexdigest()[:12]}"
+
+    def load(self, key: str) -> Optional[CachedFeatures]:
+        """Memory-map the entry for `key`, or return None when there is none."""
+        entry = os.path.join(self.root, key)
+        try:
+            with open(os.path.join(entry, META_FILE)) as f:
+                meta = json.load(f)
+            arrays = {name: np.load(os.path.join(entry, f"{name}.npy"), mmap_mode='r', allow_pickle=False)
+                      for name in _ARRAYS}
+        except (OSError, ValueError):
+            return None
+        # Marks the entry as recently used
+        os.utime(os.path.join(entry, META_FILE))
+        return CachedFeatures(
+            arrays['X'], arrays['y_crop'], arrays['y_yield'],
+            FeaturePipeline.from_schema(meta['features']), meta['profile'], meta['summary']
+        )
+
+    def save(self, key: str, features: CachedFeatures):
+        """
+        Write an entry. It is assembled under a temporary name and renamed
+        into place, so a concurrent run never sees a partial entry.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        entry = os.path.join(self.root, key)
+        temporary = f"{entry}.tmp-{os.getpid()}"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        for name in _ARRAYS:
+            array = getattr(features, name)
+            if array.dtype == object:
+                # Crop names; fixed-width strings need no pickling
+                array = array.astype(str)
+            np.save(os.path.join(temporary, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+        with open(os.path.join(temporary, META_FILE), 'w') as f:
+            json.dump({
+                'createdAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'features': features.pipeline.to_schema(),
+                'profile': features.profile,
+                'summary': features.summary
+            }, f)
+        try:
+            os.rename(temporary, entry)
+        except OSError:
+            # Another run stored the same entry first
+            shutil.rmtree(temporary, ignore_errors=True)
+        self.prune()
+
+    def prune(self):
+        """Remove the least recently used entries beyond max_entries."""
+        entries = []
+        for name in os.listdir(self.root):
+            if '.tmp-' in name:
+                continue
+            meta = os.path.join(self.root, name, META_FILE)
+            if os.path.exists(meta):
+                entries.append((os.path.getmtime(meta), name))
+        for _, name in sorted(entries, reverse=True)[self.max_entries:]:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
@@ -0,0 +1,143 @@
+"""
+Feature pipeline shared by training and serving.
+One FeaturePipeline turns training frames (train_model) and predictor
+feature dicts (the service) into the same float32 model inputs:
+
+    columns 0-7   the NUMERIC_FEATURES, in order
+    columns 8-10  codes of the CATEGORICAL_FEATURES: the value's index in
+                  the classes seen in training, UNKNOWN_CATEGORY otherwise
+
+It is saved in the model manifest ('features', with PIPELINE_VERSION), so a
+model is always served with the encoding it was trained with.
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from app.models.artifacts import ArtifactError
+
+# Bumped whenever the encoding changes; models built with another version are not loaded
+PIPELINE_VERSION = 1
+
+# Training columns and the predictor feature each one is read from, in model input order
+NUMERIC_FEATURES = (
+    ('soil_ph', 'soil_ph'),
+    ('soil_oc', 'soil_organic_carbon'),
+    ('soil_n', 'soil_nitrogen'),
+    ('soil_p', 'soil_phosphorus'),
+    ('soil_k', 'soil_potassium'),
+    ('avg_temp', 'avg_temperature'),
+    ('avg_rainfall', 'avg_rainfall'),
+    ('avg_humidity', 'avg_humidity'),
+)
+# (model input column, training column and predictor feature, pickled LabelEncoder name)
+CATEGORICAL_FEATURES = (
+    ('state_encoded', 'state', 'state_encoder'),
+    ('district_encoded', 'district', 'district_encoder'),
+    ('season_encoded', 'season', 'season_encoder'),
+)
+
+# Code of categories not seen in training. It sorts before every known code,
+# so the trees send it down the low side of every category split.
+UNKNOWN_CATEGORY = -1
+
+N_FEATURES = len(NUMERIC_FEATURES) + len(CATEGORICAL_FEATURES)
+
+
+class FeaturePipeline:
+    """The model input encoding: column order plus the category classes."""
+
+    def __init__(self, category_classes: Dict[str, Sequence]):
+        self.category_classes = {
+            feature: [str(value) for value in category_classes[feature]] for _, feature, _ in CATEGORICAL_FEATURES
+        }
+        self.category_codes = {
+            feature: {value: code for code, value in enumerate(classes)}
+            for feature, classes in self.category_classes.items()
+        }
+        self._numeric_keys = [feature for _, feature in NUMERIC_FEATURES]
+        self._category_lookups = [self.category_codes[feature] for _, feature, _ in CATEGORICAL_FEATURES]
+        self._category_keys = [feature for _, feature, _ in CATEGORICAL_FEATURES]
+
+    @classmethod
+    def fit(cls, df: pd.DataFrame, base: Optional['FeaturePipeline'] = None) -> 'FeaturePipeline':
+        """
+        Classes from a training frame, sorted as LabelEncoder sorts them.
+        With `base` (an existing model's pipeline) known values keep their
+        codes and unseen ones are appended after them.
+        """
+        classes = {}
+        for _, feature, _ in CATEGORICAL_FEATURES:
+            values = df[feature]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # Only the categories present, without a pass over the rows' strings
+                seen = [str(value) for value in values.cat.remove_unused_categories().cat.categories]
+            else:
+                seen = [str(value) for value in values.unique()]
+            if base is None:
+                classes[feature] = sorted(seen)
+            else:
+                known = base.category_classes[feature]
+                classes[feature] = known + sorted(set(seen) - set(known))
+        return cls(classes)
+
+    @classmethod
+    def from_encoders(cls, encoders: Dict) -> 'FeaturePipeline':
+        """Pipeline of pickled artifacts, from their fitted LabelEncoders."""
+        return cls({feature: list(encoders[encoder].classes_) for _, feature, encoder in CATEGORICAL_FEATURES})
+
+    @classmethod
+    def from_schema(cls, schema: Dict) -> 'FeaturePipeline':
+        """
+        Pipeline described by a manifest's 'features'. Raises ArtifactError
+        unless it is the encoding this service builds. Manifests written
+        before the pipeline was versioned use version 1.
+        """
+        version = schema.get('version', 1)
+        if version != PIPELINE_VERSION:
+            raise ArtifactError(f"Unsupported feature pipeline version {version}, expected {PIPELINE_VERSION}")
+        columns = [(entry['column'], entry['feature']) for entry in schema.get('categorical', ())]
+        if (schema.get('numeric') != [column for column, _ in NUMERIC_FEATURES]
+                or columns != [(column, feature) for column, feature, _ in CATEGORICAL_FEATURES]
+                or schema.get('unknownCode', UNKNOWN_CATEGORY) != UNKNOWN_CATEGORY):
+            raise ArtifactError(f"Artifact feature schema {schema} does not match the service's features")
+        return cls({entry['feature']: entry['classes'] for entry in schema['categorical']})
+
+    def to_schema(self) -> Dict:
+        """Manifest description of the pipeline."""
+        return {
+            'version': PIPELINE_VERSION,
+            'numeric': [column for column, _ in NUMERIC_FEATURES],
+            'categorical': [
+                {'column': column, 'feature': feature, 'classes': self.category_classes[feature]}
+                for column, feature, _ in CATEGORICAL_FEATURES
+            ],
+            'unknownCode': UNKNOWN_CATEGORY
+        }
+
+    def transform(self, features_list: List[Dict]) -> np.ndarray:
+        """(rows x N_FEATURES) float32 matrix of predictor feature dicts."""
+        numeric_keys, category_keys, lookups = self._numeric_keys, self._category_keys, self._category_lookups
+        rows = [
+            [features[key] for key in numeric_keys]
+            + [lookup.get(features[key], UNKNOWN_CATEGORY) for key, lookup in zip(category_keys, lookups)]
+            for features in features_list
+        ]
+        return np.array(rows, dtype=np.float32).reshape(len(features_list), N_FEATURES)
+
+    def transform_frame(self, df: pd.DataFrame) -> np.ndarray:
+        """(rows x N_FEATURES) float32 matrix of a training frame, encoded like transform."""
+        X = np.empty((len(df), N_FEATURES), dtype=np.float32)
+        for i, (column, _) in enumerate(NUMERIC_FEATURES):
+            X[:, i] = df[column].to_numpy()
+        for i, (_, feature, _) in enumerate(CATEGORICAL_FEATURES, start=len(NUMERIC_FEATURES)):
+            values, codes = df[feature], self.category_codes[feature]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # One lookup per category rather than per row
+                lookup = np.array([codes.get(str(value), UNKNOWN_CATEGORY) for value in values.cat.categories]
+                                  + [UNKNOWN_CATEGORY], dtype=np.float32)
+                X[:, i] = lookup[values.cat.codes.to_numpy()]
+            else:
+                X[:, i] = values.astype(str).map(codes).fillna(UNKNOWN_CATEGORY).to_numpy(dtype=np.float32)
+        return X
@@ -0,0 +1,198 @@
+"""
+Incremental retraining.
+Each registered version keeps a profile of the data it was trained on
+(profile.json: per season, decile bins of the numeric features and
+category counts).
+New data is compared against it with the population stability index (PSI).
+Below the drift threshold the model is warm-started: trees fitted on the new
+data are added to the existing forests. Above it, a full retrain is due.
+"""
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.metrics import r2_score
+from sklearn.model_selection import train_test_split
+
+from app.models.artifacts import CompiledForest, compile_estimator
+from app.models.features import NUMERIC_FEATURES
+from app.models.trained_model import TrainedModel
+
+PROFILE_FILE = 'profile.json'
+PROFILE_CATEGORIES = ('state', 'district', 'crop')
+
+# Common reading of the PSI: < 0.1 stable, 0.1-0.2 moderate shift, > 0.2 significant
+DEFAULT_DRIFT_THRESHOLD = 0.2
+
+_QUANTILES = np.linspace(0.1, 0.9, 9)
+_EPSILON = 1e-4
+
+
+def data_profile(df: pd.DataFrame) -> Dict:
+    """
+    Per season: histograms of every numeric feature over shared decile bins,
+    and counts of every state, district and crop. Drift is measured season
+    by season, so an update holding a single season is compared with that
+    season's history only.
+    """
+    edges = {
+        column: np.unique(np.quantile(df[column].to_numpy(dtype=np.float64), _QUANTILES)).tolist()
+        for column, _ in NUMERIC_FEATURES
+    }
+    return merge_profile({'rows': 0, 'edges': edges, 'seasons': {}}, df)
+
+
+def _bin_counts(values: np.ndarray, edges: Sequence[float]) -> np.ndarray:
+    return np.bincount(np.searchsorted(edges, values, side='right'), minlength=len(edges) + 1)
+
+
+def _value_counts(values: pd.Series) -> Dict[str, int]:
+    return {str(value): int(count) for value, count in values.value_counts().items() if count}
+
+
+def _season_profile(df: pd.DataFrame, edges: Dict[str, List[float]]) -> Dict:
+    return {
+        'rows': len(df),
+        'numeric': {column: _bin_counts(df[column].to_numpy(dtype=np.float64), column_edges).tolist()
+                    for column, column_edges in edges.items()},
+        'categorical': {column: _value_counts(df[column]) for column in PROFILE_CATEGORIES}
+    }
+
+
+def merge_profile(profile: Dict, df: pd.DataFrame) -> Dict:
+    """The profile of the base data plus df, binned on the base edges."""
+    seasons = {season: entry for season, entry in profile['seasons'].items()}
+    for season, rows in df.groupby(df['season'].astype(str), observed=True):
+        added = _season_profile(rows, profile['edges'])
+        base = seasons.get(season)
+        if base is not None:
+            added['rows'] += base['rows']
+            for column, counts in base['numeric'].items():
+                added['numeric'][column] = (np.asarray(counts) + added['numeric'][column]).tolist()
+            for column, counts in base['categorical'].items():
+                combined = dict(counts)
+                for value, count in added['categorical'][column].items():
+                    combined[value] = combined.get(value, 0) + count
+                added['categorical'][column] = combined
+        seasons[season] = added
+    return {'rows': profile['rows'] + len(df), 'edges': profile['edges'], 'seasons': seasons}
+
+
+def population_stability(expected: Sequence[float], actual: Sequence[float]) -> float:
+    """PSI between two histograms over the same bins."""
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    p = np.maximum(expected / max(expected.sum(), 1), _EPSILON)
+    q = np.maximum(actual / max(actual.sum(), 1), _EPSILON)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def measure_drift(profile: Dict, df: pd.DataFrame) -> Dict:
+    """
+    PSI of every numeric feature and of the state and district mix of df
+    against the profile, per season and weighted by the rows of df in
+    each. The largest is compared with the drift threshold. A season
+    missing from the profile has no comparable history: 'max' is None and
+    the update should retrain.
+    """
+    new = merge_profile({'rows': 0, 'edges': profile['edges'], 'seasons': {}}, df)
+    unseen = sorted(set(new['seasons']) - set(profile['seasons']))
+    features: Dict[str, float] = {}
+    label_shift = 0.0
+    for season, entry in new['seasons'].items():
+        base = profile['seasons'].get(season)
+        if base is None:
+            continue
+        weight = entry['rows'] / len(df)
+        psi = {column: population_stability(base['numeric'][column], counts)
+               for column, counts in entry['numeric'].items()}
+        for column, counts in entry['categorical'].items():
+            values = sorted(set(base['categorical'][column]) | set(counts))
+            psi[column] = population_stability([base['categorical'][column].get(v, 0) for v in values],
+                                               [counts.get(v, 0) for v in values])
+        # The crop mix is the label, not an input: reported but not gating
+        label_shift += weight * psi.pop('crop')
+        for column, value in psi.items():
+            features[column] = features.get(column, 0.0) + weight * value
+
+    if unseen:
+        return {'features': {column: round(v, 4) for column, v in features.items()}, 'unseenSeasons': unseen,
+                'labelShift': round(label_shift, 4), 'max': None, 'feature': 'season'}
+    feature = max(features, key=features.get)
+    return {
+        'features': {column: round(value, 4) for column, value in features.items()},
+        'unseenSeasons': [],
+        'labelShift': round(label_shift, 4),
+        'max': round(features[feature], 4),
+        'feature': feature
+    }
+
+
+def write_profile(model_dir: str, profile: Dict):
+    with open(os.path.join(model_dir, PROFILE_FILE), 'w') as f:
+        json.dump(profile, f)
+
+
+def read_profile(model_dir: str) -> Optional[Dict]:
+    path = os.path.join(model_dir, PROFILE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def data_summary(df: pd.DataFrame, sources: List[str]) -> Dict:
+    """What a version was trained on, for the registry."""
+    return {
+        'sources': sources,
+        'rows': len(df),
+        'seasons': sorted(str(value) for value in df['season'].unique()),
+        'states': sorted(str(value) for value in df['state'].unique()),
+        'districts': int(df['district'].nunique()),
+        'crops': sorted(str(value) for value in df['crop'].unique())
+    }
+
+
+def _accuracy(forest: CompiledForest, X: np.ndarray, y: np.ndarray) -> float:
+    predicted = np.asarray(forest.classes_)[forest.predict_proba(X).argmax(axis=1)]
+    return float(np.mean(predicted == np.asarray(y, dtype=str)))
+
+
+def _compiled(forest) -> CompiledForest:
+    # Models loaded from pickles hold sklearn forests
+    return forest if isinstance(forest, CompiledForest) else compile_estimator(forest)
+
+
+def warm_start(model: TrainedModel, X: np.ndarray, y_crop: np.ndarray, y_yield: np.ndarray, new_trees: int,
+               n_jobs: int = -1, random_state: int = 42,
+               max_depth: Optional[int] = None) -> Tuple[CompiledForest, CompiledForest, Dict]:
+    """
+    Fit `new_trees` trees per forest on the new data and add them to the
+    model's forests. X must be encoded with the model's category codes
+    (see train_model.prepare_features). New trees are grown to `max_depth`
+    at most, e.g. the depth a compacted model was cut at. Returns the
+    combined forests and the scores of the old and new model on a holdout
+    of the new data.
+    """
+    X_train, X_test, y_crop_train, y_crop_test, y_yield_train, y_yield_test = train_test_split(
+        X, y_crop, y_yield, test_size=0.2, random_state=random_state
+    )
+    classifier = RandomForestClassifier(n_estimators=new_trees, max_depth=max_depth, random_state=random_state,
+                                        n_jobs=n_jobs)
+    regressor = RandomForestRegressor(n_estimators=new_trees, max_depth=max_depth, random_state=random_state,
+                                      n_jobs=n_jobs)
+    base_crop, base_yield = _compiled(model.crop_classifier), _compiled(model.yield_regressor)
+    crop_forest = base_crop.combine(CompiledForest.from_estimator(classifier.fit(X_train, y_crop_train)))
+    yield_forest = base_yield.combine(CompiledForest.from_estimator(regressor.fit(X_train, y_yield_train)))
+
+    metrics = {
+        'cropAccuracy': _accuracy(crop_forest, X_test, y_crop_test),
+        'yieldR2': float(r2_score(y_yield_test, yield_forest.predict(X_test))),
+        'baseCropAccuracy': _accuracy(base_crop, X_test, y_crop_test),
+        'baseYieldR2': float(r2_score(y_yield_test, base_yield.predict(X_test)))
+    }
+    return crop_forest, yield_forest, metrics
+
@@ -1,114 +1,665 @@
 """
 Crop Prediction Model
 This module contains the ML model for crop recommendations.
-In production, this would load a trained model from disk.
-For now, it provides a rule-based prediction system as a placeholder.
+When trained artifacts exist under MODEL_PATH they are used to rank crops
+and predict yield; otherwise a rule-based prediction system is used.
 """
+import logging
+import math
+import numbers
+import threading
+import time
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, NamedTuple, Optional, Sequence, Tuple, Union
 import os
 
+from app.memory import rss_bytes
+from app.metrics import NO_TIMINGS, StageTimings
+from app.models.crop_catalog import DEFAULT_CATALOG_PATH, RANGE_KEYS, load_crop_catalog
+from app.models.district_table import TABLE_FILE, DistrictTable, default_table_dir
+from app.models.features import CATEGORICAL_FEATURES, NUMERIC_FEATURES
+from app.models.registry import REGISTRY_FILE, RegistryError
+from app.models.trained_model import TrainedModel, resolve_model_dir
+
+logger = logging.getLogger(__name__)
+
+# Features scored by the rule engine, paired column-by-column with the crop ranges.
+SCORED_FEATURES = (
+    'soil_ph', 'avg_temperature', 'avg_rainfall',
+    'soil_nitrogen', 'soil_phosphorus', 'soil_potassium'
+)
+
+# Scoring weights for the pH, temperature and rainfall columns
+OUT_OF_RANGE_PENALTIES = (20, 25, 20)
+DEVIATION_WEIGHTS = (10, 15, 10)
+# Bonus for each soil nutrient (N, P, K) within range
+NUTRIENT_BONUS = 5
+
+MIN_SUITABILITY_SCORE = 30
+
+# Relative half-width of the yield range when there are no per-tree bounds
+# (the rule engine, boosted and pickled models)
+YIELD_BAND = 0.2
+
+# Fields a caller may leave out; cropName and suitabilityScore are always returned.
+# yieldPrediction is per crop (rule engine); locationYield is per request (trained
+# model, whose regressor predicts the location's yield without knowing the crop).
+OPTIONAL_FIELDS = ('yieldPrediction', 'locationYield', 'explanation', 'environmentalFactors')
+
+
+class PredictOptions(NamedTuple):
+    """Per-request ranking and output options."""
+    top_k: int = 5
+    # Minimum suitability score; None uses the engine default
+    # (MIN_SUITABILITY_SCORE for the rules, any non-zero probability for the model)
+    min_score: Optional[float] = None
+    # Optional fields to include; None includes all of OPTIONAL_FIELDS
+    fields: Optional[Tuple[str, ...]] = None
+
+
+DEFAULT_OPTIONS = PredictOptions()
+
+
+# Extra inputs the trained model needs on top of the rule engine's
+MODEL_NUMERIC_FEATURES = tuple(feature for _, feature in NUMERIC_FEATURES if feature not in SCORED_FEATURES)
+MODEL_CATEGORICAL_FEATURES = tuple(feature for _, feature, _ in CATEGORICAL_FEATURES if feature != 'season')
+
+# 'table' is model mode with precomputed district x season answers (see app.models.district_table)
+PREDICTOR_MODES = ('model', 'rules', 'table')
+
+
+class InvalidFeatures(ValueError):
+    """A features dict that cannot be scored; the caller's input is at fault."""
+
+
+def check_features(features: Dict, numeric_keys: Tuple[str, ...] = SCORED_FEATURES,
+                   text_keys: Tuple[str, ...] = ('season',)) -> None:
+    """
+    Raise InvalidFeatures if a features dict cannot be scored. Numeric
+    features must be finite: NaN would not reach the leaf sklearn sends it to.
+    """
+    for key in text_keys:
+        if not isinstance(features.get(key), str):
+            raise InvalidFeatures(f"Missing or invalid feature '{key}'")
+    for key in numeric_keys:
+        value = features.get(key)
+        if isinstance(value, bool) or not isinstance(value, numbers.Real) or not math.isfinite(value):
+            raise InvalidFeatures(f"Missing or invalid feature '{key}': {value!r}")
+
+
+def select_top(scores: np.ndarray, candidates: np.ndarray, top_k: int) -> List[int]:
+    """
+    Indices of the top_k candidates, ranked by score rounded to one decimal
+    (as returned to callers) with ties kept in candidate order.
+
+    A partial selection first narrows the candidates to those within 0.1 of
+    the k-th best raw score, which keeps every crop that can tie with it
+    after rounding, so only a handful of scores are rounded and sorted.
+    """
+    if len(candidates) > top_k:
+        candidate_scores = scores[candidates]
+        kth = np.partition(candidate_scores, len(candidates) - top_k)[len(candidates) - top_k]
+        candidates = candidates[candidate_scores >= kth - 0.1]
+    ranked = sorted(candidates, key=lambda index: -round(float(scores[index]), 1))
+    return ranked[:top_k]
+
+
+# Columns with an out-of-range penalty (pH, temperature, rainfall) and the
+# most the nutrient bonuses can add back
+HARD_COLUMNS = (0, 1, 2)
+MAX_NUTRIENT_BONUS = NUTRIENT_BONUS * (len(SCORED_FEATURES) - len(HARD_COLUMNS))
+
+# Catalogs smaller than this are scored whole: grouping and pruning cost more
+# than they save (see benchmarks.bench_pruning)
+PRUNE_MIN_CROPS = 128
+
+
+class ScoringColumns:
+    """
+    Contiguous range arrays for a set of crops, ready for vectorized scoring.
+    ``crop_ids[i]`` is the crop-table row described by row i of each array.
+    """
+
+    def __init__(self, crop_ids: np.ndarray, low: np.ndarray, high: np.ndarray):
+        self.crop_ids = crop_ids
+        self.low = np.ascontiguousarray(low)
+        self.high = np.ascontiguousarray(high)
+        self.midpoint = (self.low + self.high) / 2
+        self.span = self.high - self.low
+
+    def __len__(self) -> int:
+        return len(self.crop_ids)
+
+    def take(self, positions: np.ndarray) -> 'ScoringColumns':
+        """Subset of these columns, in the given order."""
+        return ScoringColumns(self.crop_ids[positions], self.low[positions], self.high[positions])
+
+    def score(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score every request against every crop in these columns, ignoring season.
+
+        Applies the same rules, in the same order, as
+        CropPredictor._calculate_suitability_score so the scores are identical.
+
+        Returns:
+            (scores, in_range): a (requests x crops) score matrix and a
+            (requests x crops x SCORED_FEATURES) range-match mask
+        """
+        x = values[:, np.newaxis, :]
+        in_range = (x >= self.low) & (x <= self.high)
+
+        # pH, temperature and rainfall: penalty outside the range, deviation from the optimum inside
+        deviation = np.abs(x[..., :3] - self.midpoint[:, :3]) / self.span[:, :3]
+        penalty = np.where(in_range[..., :3], deviation * DEVIATION_WEIGHTS, OUT_OF_RANGE_PENALTIES)
+
+        scores = 100.0 - penalty[..., 0]
+        scores -= penalty[..., 1]
+        scores -= penalty[..., 2]
+
+        # Soil nutrients
+        for column in range(3, len(SCORED_FEATURES)):
+            scores += NUTRIENT_BONUS * in_range[..., column]
+
+        np.clip(scores, 0, 100, out=scores)
+        return scores, in_range
+
+
+class IntervalIndex:
+    """
+    One range column's interval endpoints, sorted for stabbing queries.
+    """
+
+    def __init__(self, low: np.ndarray, high: np.ndarray):
+        self.low_sorted = np.sort(low)
+        self.high_sorted = np.sort(high)
+        # Rank of each interval's endpoints in the sorted arrays
+        self.low_rank = np.argsort(np.argsort(low, kind='stable'), kind='stable')
+        self.high_rank = np.argsort(np.argsort(high, kind='stable'), kind='stable')
+
+    def outside(self, xs: np.ndarray) -> np.ndarray:
+        """
+        (len(xs) x intervals) mask of the intervals that do not contain each
+        x: those starting above it or ending below it. One searchsorted per
+        endpoint array finds the cut for every x at once.
+        """
+        starts_above = np.searchsorted(self.low_sorted, xs, side='right')
+        ends_below = np.searchsorted(self.high_sorted, xs, side='left')
+        return ((self.low_rank >= starts_above[:, np.newaxis])
+                | (self.high_rank < ends_below[:, np.newaxis]))
+
+
+class SeasonIndex:
+    """
+    The crops of one season with interval indexes on their hard ranges.
+    """
+
+    def __init__(self, columns: ScoringColumns):
+        self.columns = columns
+        self.intervals = [IntervalIndex(columns.low[:, column], columns.high[:, column])
+                          for column in HARD_COLUMNS]
+
+    def prune(self, values: np.ndarray, min_scores: np.ndarray) -> ScoringColumns:
+        """
+        Drop crops that cannot reach min_score for any of the requests.
+
+        A crop's score can never exceed 100 + MAX_NUTRIENT_BONUS minus the
+        penalties of the hard ranges the request falls outside, so a crop
+        whose out-of-range penalties exceed that budget is pruned. This
+        never removes a crop that scoring would have kept.
+        """
+        budgets = 100 + MAX_NUTRIENT_BONUS - min_scores
+        if budgets.min() >= sum(OUT_OF_RANGE_PENALTIES):
+            # Even a crop outside every hard range can reach the threshold
+            return self.columns
+
+        penalty = np.zeros((len(values), len(self.columns)))
+        for column, interval in zip(HARD_COLUMNS, self.intervals):
+            penalty += OUT_OF_RANGE_PENALTIES[column] * interval.outside(values[:, column])
+        keep = (penalty <= budgets[:, np.newaxis]).any(axis=0)
+
+        if keep.all():
+            return self.columns
+        return self.columns.take(np.flatnonzero(keep))
+
+
+class CropTable:
+    """
+    Crop database compiled into contiguous arrays for vectorized scoring.
+    Row i of every array describes the crop ``names[i]``.
+
+    A season index (season -> its crops, with interval indexes on the hard
+    ranges) lets scoring skip crops that cannot qualify.
+    """
+
+    def __init__(self, crops: Dict):
+        self.names = list(crops)
+        self.profiles = [crops[name] for name in self.names]
+
+        # Each season gets one bit; a crop's mask has the bits of all its seasons
+        self.season_bits = {}
+        for crop_data in self.profiles:
+            for season in crop_data['season']:
+                self.season_bits.setdefault(season, 1 << len(self.season_bits))
+
+        ranges = np.array(
+            [[crop_data[key] for key in RANGE_KEYS] for crop_data in self.profiles],
+            dtype=np.float64
+        ).reshape(len(self.names), len(RANGE_KEYS), 2)
+        self.columns = ScoringColumns(np.arange(len(self.names)), ranges[:, :, 0], ranges[:, :, 1])
+        self.low = self.columns.low
+        self.high = self.columns.high
+        self.base_yield = np.array(
+            [crop_data['base_yield'] for crop_data in self.profiles], dtype=np.float64
+        )
+        self.index = {name: position for position, name in enumerate(self.names)}
+        self.season_mask = np.array(
+            [sum(self.season_bits[season] for season in crop_data['season'])
+             for crop_data in self.profiles],
+            dtype=np.int64
+        )
+
+        self.season_index = {
+            bit: SeasonIndex(self.columns.take(np.flatnonzero(self.season_mask & bit)))
+            for bit in self.season_bits.values()
+        }
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def encode(self, features_list: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Build the (requests x SCORED_FEATURES) value matrix and season bit vector.
+        Unknown seasons get no bits, so they match no crop.
+        """
+        values = np.array(
+            [[features[key] for key in SCORED_FEATURES] for features in features_list],
+            dtype=np.float64
+        ).reshape(len(features_list), len(SCORED_FEATURES))
+        seasons = np.array(
+            [self.season_bits.get(features['season'], 0) for features in features_list],
+            dtype=np.int64
+        )
+        return values, seasons
+
+    def match(self, values: np.ndarray, crop_id: int) -> np.ndarray:
+        """Range-match mask of one request against one crop."""
+        return (values >= self.low[crop_id]) & (values <= self.high[crop_id])
+
+    def score(self, values: np.ndarray, seasons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score every request against every crop in one pass.
+
+        Returns:
+            (scores, in_range): a (requests x crops) score matrix and a
+            (requests x crops x SCORED_FEATURES) range-match mask
+        """
+        scores, in_range = self.columns.score(values)
+
+        # Season match (critical)
+        scores[(seasons[:, np.newaxis] & self.season_mask) == 0] = 0.0
+
+        return scores, in_range
+
+    def score_candidates(self, values: np.ndarray, seasons: np.ndarray,
+                         min_scores: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Score requests only against the crops that can reach their min_score.
+
+        Requests are grouped by season and scored against that season's
+        crops, after pruning the ones whose hard ranges rule them out.
+        Every crop left out would have scored below min_score, so the
+        recommendations are the same as scoring the whole table. Catalogs
+        under PRUNE_MIN_CROPS are scored whole, as a single group.
+
+        Returns:
+            A list of (rows, crop_ids, scores, in_range) groups: the request
+            rows in the group, the crop-table rows scored for them (ascending)
+            and their (rows x crop_ids) scores and range-match mask
+        """
+        if len(self) < PRUNE_MIN_CROPS:
+            scores, in_range = self.score(values, seasons)
+            return [(np.arange(len(values)), self.columns.crop_ids, scores, in_range)]
+
+        groups = []
+
+        # Without a positive threshold even out-of-season crops (score 0) qualify
+        unpruned = np.flatnonzero(min_scores <= 0)
+        if len(unpruned):
+            scores, in_range = self.score(values[unpruned], seasons[unpruned])
+            groups.append((unpruned, self.columns.crop_ids, scores, in_range))
+
+        pruned = np.flatnonzero(min_scores > 0)
+        for season in np.unique(seasons[pruned]):
+            rows = pruned[seasons[pruned] == season]
+            index = self.season_index.get(int(season))
+            if index is None:
+                # Unknown season: no crop can score above 0
+                groups.append((rows, np.empty(0, dtype=np.intp), np.empty((len(rows), 0)),
+                               np.empty((len(rows), 0, len(SCORED_FEATURES)), dtype=bool)))
+                continue
+
+            columns = index.prune(values[rows], min_scores[rows])
+            scores, in_range = columns.score(values[rows])
+            groups.append((rows, columns.crop_ids, scores, in_range))
+
+        return groups
+
+
+class ServingState(NamedTuple):
+    """
+    Everything a prediction reads, swapped as one immutable snapshot so a
+    batch never mixes a new model with an old table or generation.
+    """
+    table: CropTable
+    model: Optional[TrainedModel] = None
+    district_table: Optional[DistrictTable] = None
+    # Bumped whenever the crop table or model changes; result caches key on it
+    generation: int = 0
+
+
 class CropPredictor:
     """
     Crop recommendation predictor.
-    Uses rule-based logic as a placeholder for actual ML model.
+    Ranks crops with the trained classifier when its artifacts are available
+    (PREDICTOR_MODE=model, the default) and with the rule engine otherwise.
+    PREDICTOR_MODE=table also answers requests that match the model's
+    precomputed district table from it.
     """
     
-    def __init__(self, model_path: str = None):
+    def __init__(self, model_path: str = None, mode: str = None, crop_db_path: str = None):
         self.model_path = model_path or os.getenv('MODEL_PATH', './models/crop_model.pkl')
-        self.crops = self._load_crop_database()
-        
-    def _load_crop_database(self) -> Dict:
+        self.mode = mode or os.getenv('PREDICTOR_MODE', 'model')
+        if self.mode not in PREDICTOR_MODES:
+            raise ValueError(f"Unknown predictor mode '{self.mode}', expected one of {PREDICTOR_MODES}")
+        self.crop_db_path = crop_db_path or os.getenv('CROP_DB_PATH', DEFAULT_CATALOG_PATH)
+
+        # Serializes swaps of `state`; readers take one reference to it and never lock
+        self._reload_lock = threading.Lock()
+
+        self.state = ServingState(self._load_crop_database())
+        self._catalog_signature_seen = self._catalog_signature()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+
+        self.model_rss_bytes = 0
+        self._model_loaded = False
+        self._registry_signature_seen = self._registry_signature()
+        # False when pool workers load the model and this instance only follows their reloads
+        self._loads_models = True
+        self._artifact_signature_seen: Optional[Tuple] = None
+
+        self._table_signature_seen = None
+        # Model-scored requests answered from the district table, and scored live
+        self._table_counts = {'hits': 0, 'misses': 0}
+
+        # Per-mode latency counters: [calls, items, seconds]
+        self._latency = {'rules': [0, 0, 0.0], 'model': [0, 0, 0.0]}
+        # Guards _latency and _table_counts, updated from every executor thread
+        self._stats_lock = threading.Lock()
+
+    @property
+    def table(self) -> CropTable:
+        return self.state.table
+
+    @property
+    def model(self) -> Optional[TrainedModel]:
+        return self.state.model
+
+    @property
+    def district_table(self) -> Optional[DistrictTable]:
+        return self.state.district_table
+
+    @property
+    def generation(self) -> int:
+        return self.state.generation
+
+    @property
+    def crops(self) -> Dict:
+        """Crop database (name -> ideal conditions) behind the current table."""
+        table = self.table
+        return dict(zip(table.names, table.profiles))
+
+    def _load_crop_database(self) -> CropTable:
         """
-        Load crop database with ideal conditions.
-        In production, this would come from a database or config file.
+        Load, validate and compile the crop database from CROP_DB_PATH.
         """
-        return {
-            'Rice': {
-                'season': ['Kharif'],
-                'ph_range': (5.5, 7.0),
-                'temp_range': (20, 35),
-                'rainfall_range': (1000, 2500),
-                'nitrogen_range': (80, 150),
-                'phosphorus_range': (15, 30),
-                'potassium_range': (100, 200),
-                'base_yield': 3000
-            },
-            'Wheat': {
-                'season': ['Rabi'],
-                'ph_range': (6.0, 7.5),
-                'temp_range': (15, 25),
-                'rainfall_range': (400, 800),
-                'nitrogen_range': (100, 180),
-                'phosphorus_range': (20, 40),
-                'potassium_range': (120, 220),
-                'base_yield': 3500
-            },
-            'Maize': {
-                'season': ['Kharif', 'Rabi'],
-                'ph_range': (5.5, 7.5),
-                'temp_range': (18, 30),
-                'rainfall_range': (600, 1200),
-                'nitrogen_range': (120, 200),
-                'phosphorus_range': (25, 45),
-                'potassium_range': (150, 250),
-                'base_yield': 4000
-            },
-            'Cotton': {
-                'season': ['Kharif'],
-                'ph_range': (5.5, 8.0),
-                'temp_range': (21, 30),
-                'rainfall_range': (500, 1000),
-                'nitrogen_range': (80, 150),
-                'phosphorus_range': (15, 35),
-                'potassium_range': (100, 200),
-                'base_yield': 500
-            },
-            'Sugarcane': {
-                'season': ['Kharif', 'Rabi'],
-                'ph_range': (6.0, 7.5),
-                'temp_range': (20, 32),
-                'rainfall_range': (1200, 2000),
-                'nitrogen_range': (150, 250),
-                'phosphorus_range': (30, 60),
-                'potassium_range': (200, 350),
-                'base_yield': 70000
-            },
-            'Soybean': {
-                'season': ['Kharif'],
-                'ph_range': (6.0, 7.0),
-                'temp_range': (20, 30),
-                'rainfall_range': (600, 1000),
-                'nitrogen_range': (50, 100),
-                'phosphorus_range': (20, 40),
-                'potassium_range': (100, 200),
-                'base_yield': 2000
-            },
-            'Groundnut': {
-                'season': ['Kharif', 'Rabi'],
-                'ph_range': (5.5, 7.0),
-                'temp_range': (24, 33),
-                'rainfall_range': (500, 900),
-                'nitrogen_range': (40, 80),
-                'phosphorus_range': (15, 30),
-                'potassium_range': (80, 150),
-                'base_yield': 2500
-            },
-            'Potato': {
-                'season': ['Rabi'],
-                'ph_range': (5.0, 6.5),
-                'temp_range': (15, 20),
-                'rainfall_range': (300, 600),
-                'nitrogen_range': (100, 200),
-                'phosphorus_range': (30, 60),
-                'potassium_range': (150, 300),
-                'base_yield': 25000
-            }
-        }
-    
+        started = time.perf_counter()
+        table = CropTable(load_crop_catalog(self.crop_db_path))
+        logger.info(
+            "Loaded crop database from %s: %d crops, %d seasons in %.1f ms",
+            self.crop_db_path, len(table), len(table.season_bits), (time.perf_counter() - started) * 1000
+        )
+        return table
+
+    def _catalog_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.crop_db_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload_crop_database(self) -> bool:
+        """
+        Reload the crop database and swap the new table in atomically.
+        Requests already running keep the table they started with. If the
+        file is invalid the current table stays in place.
+        """
+        signature = self._catalog_signature()
+        try:
+            table = self._load_crop_database()
+        except Exception:
+            logger.exception("Reloading crop database from %s failed, keeping the current table",
+                             self.crop_db_path)
+            self._catalog_signature_seen = signature
+            return False
+
+        with self._reload_lock:
+            state = self.state
+            self.state = state._replace(table=table, generation=state.generation + 1)
+            self._catalog_signature_seen = signature
+        return True
+
+    def _registry_signature(self) -> Optional[Tuple[int, int]]:
+        model_dir = self.model_path if os.path.isdir(self.model_path) else (os.path.dirname(self.model_path) or '.')
+        try:
+            stat = os.stat(os.path.join(model_dir, REGISTRY_FILE))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _check_registry(self):
+        """Load the version the model registry now points at, if it changed."""
+        signature = self._registry_signature()
+        if signature is None or signature == self._registry_signature_seen:
+            return
+        self._registry_signature_seen = signature
+        try:
+            model_dir = resolve_model_dir(self.model_path)
+        except Exception:
+            logger.exception("Cannot resolve the model version in %s, keeping the current model", self.model_path)
+            return
+        model = self.model
+        if model is not None and os.path.abspath(model.model_dir) == os.path.abspath(model_dir):
+            return
+        logger.info("Model registry changed, loading %s", model_dir)
+        self.reload_model()
+
+    def start_watching(self, interval: float = None, load_models: bool = True):
+        """
+        Poll the crop database file, and the model registry when MODEL_PATH
+        is one, every `interval` seconds (CROP_DB_RELOAD_INTERVAL, default 5;
+        0 disables) and reload what changed.
+
+        With `load_models=False` (the server process of a process pool, whose
+        workers load the model themselves) a registry or district table change
+        only bumps `generation`, so result caches still follow the workers.
+        """
+        self._loads_models = load_models
+        if not load_models:
+            self._artifact_signature_seen = self._artifact_signature()
+        if interval is None:
+            interval = float(os.getenv('CROP_DB_RELOAD_INTERVAL', '5'))
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval,), name='crop-db-watcher', daemon=True
+        )
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._stop_watching.set()
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self, interval: float):
+        while not self._stop_watching.wait(interval):
+            signature = self._catalog_signature()
+            if signature is not None and signature != self._catalog_signature_seen:
+                self.reload_crop_database()
+            if self.mode != 'rules' and self._model_loaded:
+                self._check_registry()
+            elif self.mode != 'rules' and not self._loads_models:
+                self._follow_artifacts()
+            if self.mode == 'table' and self.model is not None:
+                if self._table_signature() != self._table_signature_seen:
+                    self.reload_district_table()
+
+    def _artifact_signature(self) -> Tuple:
+        """Registry and district table file signatures, found without loading the model."""
+        table_signature = None
+        if self.mode == 'table':
+            try:
+                table_dir = os.getenv('DISTRICT_TABLE_PATH') or default_table_dir(resolve_model_dir(self.model_path))
+                stat = os.stat(os.path.join(table_dir, TABLE_FILE))
+                table_signature = (stat.st_mtime_ns, stat.st_size)
+            except (OSError, RegistryError):
+                pass
+        return self._registry_signature(), table_signature
+
+    def _follow_artifacts(self):
+        """Bump generation when the registry or the district table changed."""
+        signature = self._artifact_signature()
+        if signature != self._artifact_signature_seen:
+            with self._reload_lock:
+                self._artifact_signature_seen = signature
+                self.state = self.state._replace(generation=self.state.generation + 1)
+
+    def load_model(self) -> Optional[TrainedModel]:
+        """
+        Load and warm up the trained model on first use.
+        Returns None when the rule engine is in use.
+        """
+        if not self._model_loaded:
+            with self._reload_lock:
+                if not self._model_loaded:
+                    self._swap_model(self._load_model())
+        return self.model
+
+    def reload_model(self) -> Optional[TrainedModel]:
+        """
+        Reload the artifacts from MODEL_PATH (e.g. after retraining) and swap them in.
+        """
+        with self._reload_lock:
+            self._swap_model(self._load_model())
+        return self.model
+
+    def _swap_model(self, model: Optional[TrainedModel]):
+        # Called with _reload_lock held
+        state = self.state
+        self.state = state._replace(model=model, district_table=self._load_district_table(model),
+                                    generation=state.generation + 1)
+        self._model_loaded = True
+
+    def _table_dir(self, model: TrainedModel) -> str:
+        return os.getenv('DISTRICT_TABLE_PATH') or default_table_dir(model.model_dir)
+
+    def _table_signature(self) -> Optional[Tuple[int, int]]:
+        model = self.model
+        if model is None:
+            return None
+        try:
+            stat = os.stat(os.path.join(self._table_dir(model), TABLE_FILE))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_district_table(self, model: Optional[TrainedModel]) -> Optional[DistrictTable]:
+        """
+        The district table of `model` in table mode. Without a usable table
+        every request is scored live.
+        """
+        if self.mode != 'table' or model is None:
+            return None
+        table_dir = self._table_dir(model)
+        self._table_signature_seen = self._table_signature()
+        try:
+            table = DistrictTable.load(table_dir)
+        except Exception:
+            logger.exception("Failed to load the district table from %s, scoring every request live", table_dir)
+            return None
+        if table is None:
+            logger.info("No district table in %s, scoring every request live", table_dir)
+            return None
+        if not table.matches(model):
+            logger.warning("District table in %s was built for another model (%s), scoring every request live",
+                           table_dir, table.meta.get('modelDir'))
+            return None
+        logger.info("Loaded district table from %s: %d districts x %d seasons, %.1f MB",
+                    table_dir, table.meta.get('districts', 0), len(table.meta.get('seasons', ())),
+                    table.nbytes / 2**20)
+        return table
+
+    def reload_district_table(self) -> Optional[DistrictTable]:
+        """
+        Reload the current model's district table (e.g. after it was rebuilt).
+        Table answers equal live ones, so cached results stay valid.
+        """
+        model = self.model
+        table = self._load_district_table(model)
+        with self._reload_lock:
+            # A model swapped in meanwhile brought its own table
+            if self.state.model is model:
+                self.state = self.state._replace(district_table=table)
+        return table
+
+    def _load_model(self) -> Optional[TrainedModel]:
+        if self.mode == 'rules':
+            logger.info("Predictor mode 'rules': using the rule engine")
+            return None
+
+        try:
+            model_dir = resolve_model_dir(self.model_path)
+        except RegistryError as e:
+            logger.error("Cannot resolve the model version in %s (%s), falling back to the rule engine",
+                         self.model_path, e)
+            return None
+        rss_before = rss_bytes()
+        try:
+            model = TrainedModel.load(model_dir)
+        except Exception:
+            logger.exception("Failed to load model artifacts from %s, falling back to the rule engine", model_dir)
+            return None
+
+        if model is None:
+            logger.info("No model artifacts in %s, falling back to the rule engine", model_dir)
+            return None
+
+        model.warm_up()
+        self.model_rss_bytes = rss_bytes() - rss_before
+        logger.info(
+            "Loaded %s model from %s: %d crops, load %.3fs, warm-up %.3fs, +%.1f MB RSS",
+            model.artifact_format, model_dir, len(model.crops), model.load_seconds, model.warmup_seconds,
+            self.model_rss_bytes / 2**20
+        )
+        return model
+        
     def _calculate_suitability_score(self, crop_data: Dict, features: Dict) -> float:
         """
         Calculate suitability score (0-100) based on how well conditions match crop requirements.
+        Scalar reference for the vectorized CropTable.score.
         """
         score = 100.0
         
@@ -173,10 +724,18 @@ class CropPredictor:
         # Adjust yield based on suitability score
         yield_multiplier = suitability_score / 100
         
-        # Add some variation
-        expected = base_yield * yield_multiplier
-        min_yield = expected * 0.8
-        max_yield = expected * 1.2
+        return self._yield_range(base_yield * yield_multiplier)
+    
+    def _yield_range(self, expected: float, bounds: Optional[np.ndarray] = None) -> Dict:
+        """
+        Yield range around an expected yield: the model's bounds when it has
+        them (the spread of the regressor's trees), a fixed band otherwise.
+        """
+        if bounds is None:
+            min_yield = expected * (1 - YIELD_BAND)
+            max_yield = expected * (1 + YIELD_BAND)
+        else:
+            min_yield, max_yield = float(bounds[0]), float(bounds[1])
         
         return {
             'min': round(min_yield, 2),
@@ -221,43 +780,18 @@ class CropPredictor:
         
         return " ".join(explanations)
     
-    def _calculate_environmental_factors(self, crop_data: Dict, features: Dict) -> Dict:
+    def _calculate_environmental_factors(self, in_range: np.ndarray) -> Dict:
         """
-        Calculate individual environmental factor matches.
+        Calculate individual environmental factor matches from a crop's
+        range-match row (in SCORED_FEATURES order).
         """
+        ph, temp, rainfall, n, p, k = (bool(match) for match in in_range)
+
         # Soil match
-        soil_score = 0
-        ph = features['soil_ph']
-        ph_min, ph_max = crop_data['ph_range']
-        if ph_min <= ph <= ph_max:
-            soil_score += 50
-        
-        n = features['soil_nitrogen']
-        n_min, n_max = crop_data['nitrogen_range']
-        if n_min <= n <= n_max:
-            soil_score += 20
-        
-        p = features['soil_phosphorus']
-        p_min, p_max = crop_data['phosphorus_range']
-        if p_min <= p <= p_max:
-            soil_score += 15
-        
-        k = features['soil_potassium']
-        k_min, k_max = crop_data['potassium_range']
-        if k_min <= k <= k_max:
-            soil_score += 15
+        soil_score = 50 * ph + 20 * n + 15 * p + 15 * k
         
         # Weather match
-        weather_score = 0
-        temp = features['avg_temperature']
-        temp_min, temp_max = crop_data['temp_range']
-        if temp_min <= temp <= temp_max:
-            weather_score += 50
-        
-        rainfall = features['avg_rainfall']
-        rainfall_min, rainfall_max = crop_data['rainfall_range']
-        if rainfall_min <= rainfall <= rainfall_max:
-            weather_score += 50
+        weather_score = 50 * temp + 50 * rainfall
         
         # Historical yield (placeholder - would use actual historical data)
         historical_yield = 70  # Placeholder
@@ -268,47 +802,296 @@ class CropPredictor:
             'historicalYield': historical_yield
         }
     
-    def predict(self, features: Dict) -> List[Dict]:
+    def _build_recommendations(self, table: CropTable, features: Dict, crop_ids: np.ndarray,
+                               scores: np.ndarray, in_range: np.ndarray,
+                               options: PredictOptions, timings: StageTimings = NO_TIMINGS) -> List[Dict]:
         """
-        Predict top crop recommendations for given features.
-        
-        Args:
-            features: Dictionary containing location and environmental data
-            
-        Returns:
-            List of crop recommendations with scores and yield predictions
+        Turn one request's scores for the crops `crop_ids` into the top recommendations.
+        Ranking uses the scores alone; yield, explanation and factors are
+        only built for the crops that make the cut.
         """
+        clock = time.perf_counter
+        started = clock()
+        min_score = MIN_SUITABILITY_SCORE if options.min_score is None else options.min_score
+        fields = OPTIONAL_FIELDS if options.fields is None else options.fields
         recommendations = []
         
-        for crop_name, crop_data in self.crops.items():
-            # Calculate suitability score
-            score = self._calculate_suitability_score(crop_data, features)
-            
-            # Skip crops with very low suitability
-            if score < 30:
-                continue
+        # Skip crops with very low suitability
+        candidates = np.flatnonzero(scores >= min_score)
+        top = select_top(scores, candidates, options.top_k)
+        timings.add('scoring', clock() - started)
+        for index in top:
+            crop_name = table.names[crop_ids[index]]
+            crop_data = table.profiles[crop_ids[index]]
+            score = float(scores[index])
+            recommendation = {
+                'cropName': crop_name,
+                'suitabilityScore': round(score, 1)
+            }
             
             # Predict yield
-            yield_pred = self._predict_yield(crop_data, features, score)
+            if 'yieldPrediction' in fields:
+                started = clock()
+                recommendation['yieldPrediction'] = self._predict_yield(crop_data, features, score)
+                timings.add('yield', clock() - started)
             
+            started = clock()
             # Generate explanation
-            explanation = self._generate_explanation(crop_name, crop_data, features, score)
+            if 'explanation' in fields:
+                recommendation['explanation'] = self._generate_explanation(crop_name, crop_data, features, score)
             
             # Calculate environmental factors
-            env_factors = self._calculate_environmental_factors(crop_data, features)
+            if 'environmentalFactors' in fields:
+                recommendation['environmentalFactors'] = self._calculate_environmental_factors(in_range[index])
+            timings.add('explanation', clock() - started)
             
-            recommendations.append({
-                'cropName': crop_name,
-                'suitabilityScore': round(score, 1),
-                'yieldPrediction': yield_pred,
-                'explanation': explanation,
-                'environmentalFactors': env_factors
-            })
-        
-        # Sort by suitability score (descending)
-        recommendations.sort(key=lambda x: x['suitabilityScore'], reverse=True)
+            recommendations.append(recommendation)
         
-        # Return top 5 recommendations
-        return recommendations[:5]
+        return recommendations
+
+    def _build_model_recommendations(self, model: TrainedModel, table: CropTable, features: Dict,
+                                     values: np.ndarray, probabilities: np.ndarray, options: PredictOptions,
+                                     timings: StageTimings = NO_TIMINGS) -> List[Dict]:
+        """
+        Turn one request's crop probabilities into the top recommendations.
+        Crops known to the rule table also get its explanation and factor matches.
+        They carry no yieldPrediction: the regressor's yield is the location's,
+        not any one crop's, and is returned once as locationYield.
+        """
+        clock = time.perf_counter
+        started = clock()
+        scores = probabilities * 100
+        fields = OPTIONAL_FIELDS if options.fields is None else options.fields
+        recommendations = []
+
+        if options.min_score is None:
+            candidates = np.flatnonzero(scores > 0)
+        else:
+            candidates = np.flatnonzero(scores >= options.min_score)
+
+        top = select_top(scores, candidates, options.top_k)
+        timings.add('scoring', clock() - started)
+        for class_index in top:
+            crop_name = model.crops[class_index]
+            score = float(scores[class_index])
+            table_index = table.index.get(crop_name)
+            recommendation = {
+                'cropName': crop_name,
+                'suitabilityScore': round(score, 1)
+            }
+
+            started = clock()
+            if 'explanation' in fields:
+                if table_index is not None:
+                    recommendation['explanation'] = self._generate_explanation(
+                        crop_name, table.profiles[table_index], features, score
+                    )
+                else:
+                    recommendation['explanation'] = (f"{crop_name} is commonly grown in conditions like yours "
+                                                     f"({score:.0f}% model confidence).")
+
+            if 'environmentalFactors' in fields:
+                recommendation['environmentalFactors'] = (
+                    self._calculate_environmental_factors(table.match(values, table_index))
+                    if table_index is not None else {}
+                )
+            timings.add('explanation', clock() - started)
+
+            recommendations.append(recommendation)
+
+        return recommendations
+
+    def predict_batch(self, features_list: List[Dict],
+                      options: Union[PredictOptions, Sequence[PredictOptions]] = DEFAULT_OPTIONS,
+                      timings: Optional[StageTimings] = None) -> List[Union[Dict, ValueError]]:
+        """
+        Predict crop recommendations for many feature dicts at once.
+
+        All valid requests are scored in a single vectorized pass. Results
+        come back in input order, each in the PredictionResponse shape:
+        'recommendations', plus 'locationYield' from the trained model.
+        An item whose features cannot be scored
+        gets its ValueError in place of a result, so one bad item never
+        fails the rest of the batch.
+
+        Args:
+            features_list: Feature dicts, one per request
+            options: PredictOptions for every item, or one per item
+            timings: Receives seconds per stage (scoring, yield, explanation)
+                and the number of crops scored per item
+        """
+        started = time.perf_counter()
+        if timings is None:
+            timings = NO_TIMINGS
+        if isinstance(options, PredictOptions):
+            options = [options] * len(features_list)
+        self.load_model()
+        # One snapshot for the whole batch, however reloads interleave
+        state = self.state
+        model, table = state.model, state.table
+        results: List[Union[Dict, ValueError]] = [None] * len(features_list)
+
+        numeric_keys, text_keys = SCORED_FEATURES, ('season',)
+        if model is not None:
+            numeric_keys = SCORED_FEATURES + MODEL_NUMERIC_FEATURES
+            text_keys = ('season',) + MODEL_CATEGORICAL_FEATURES
+
+        valid = []
+        for position, features in enumerate(features_list):
+            try:
+                check_features(features, numeric_keys, text_keys)
+            except ValueError as e:
+                results[position] = e
+            else:
+                valid.append(position)
+
+        if valid:
+            scoring_started = time.perf_counter()
+            valid_features = [features_list[position] for position in valid]
+            values, seasons = table.encode(valid_features)
 
+            if model is None:
+                min_scores = np.array([
+                    MIN_SUITABILITY_SCORE if options[position].min_score is None else options[position].min_score
+                    for position in valid
+                ], dtype=np.float64)
+                groups = table.score_candidates(values, seasons, min_scores)
+                timings.add('scoring', time.perf_counter() - scoring_started)
+                for rows, crop_ids, scores, in_range in groups:
+                    for group_row, row in enumerate(rows):
+                        position = valid[row]
+                        timings.scored(len(crop_ids))
+                        results[position] = {'recommendations': self._build_recommendations(
+                            table, features_list[position], crop_ids,
+                            scores[group_row], in_range[group_row], options[position], timings
+                        )}
+            else:
+                X = model.encode(valid_features)
+                district_table = state.district_table
+                if district_table is None:
+                    probabilities = model.predict_proba(X)
+                    scored = time.perf_counter()
+                    timings.add('scoring', scored - scoring_started)
+                    expected_yields, yield_bounds = model.predict_yield_interval(X)
+                    timings.add('yield', time.perf_counter() - scored)
+                else:
+                    probabilities, expected_yields, yield_bounds = self._lookup_or_score(
+                        model, district_table, valid_features, X, timings, scoring_started
+                    )
+                for row, position in enumerate(valid):
+                    timings.scored(len(model.crops))
+                    result = {'recommendations': self._build_model_recommendations(
+                        model, table, features_list[position], values[row], probabilities[row],
+                        options[position], timings
+                    )}
+                    fields = options[position].fields
+                    if fields is None or 'locationYield' in fields:
+                        started_yield = time.perf_counter()
+                        result['locationYield'] = self._yield_range(
+                            float(expected_yields[row]), yield_bounds[row] if yield_bounds is not None else None
+                        )
+                        timings.add('yield', time.perf_counter() - started_yield)
+                    results[position] = result
 
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            latency = self._latency['rules' if model is None else 'model']
+            latency[0] += 1
+            latency[1] += len(features_list)
+            latency[2] += elapsed
+
+        return results
+
+    def _lookup_or_score(self, model: TrainedModel, district_table: DistrictTable, features_list: List[Dict],
+                         X: np.ndarray, timings: StageTimings, started: float
+                         ) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """
+        Crop probabilities, expected yields and yield bounds of X: from the
+        district table for rows that match it, scored by the model for the rest.
+        """
+        rows = district_table.find(features_list, X)
+        hits = rows >= 0
+        probabilities = np.empty((len(X), len(model.crops)))
+        expected_yields = np.empty(len(X))
+        yield_bounds = np.empty((len(X), 2)) if district_table.yield_bounds is not None else None
+        probabilities[hits] = district_table.probabilities[rows[hits]]
+        expected_yields[hits] = district_table.yields[rows[hits]]
+        if yield_bounds is not None:
+            yield_bounds[hits] = district_table.yield_bounds[rows[hits]]
+        misses = np.flatnonzero(~hits)
+        if len(misses):
+            probabilities[misses] = model.predict_proba(X[misses])
+        scored = time.perf_counter()
+        timings.add('scoring', scored - started)
+        if len(misses):
+            expected_yields[misses], bounds = model.predict_yield_interval(X[misses])
+            if yield_bounds is not None:
+                yield_bounds[misses] = bounds
+        timings.add('yield', time.perf_counter() - scored)
+        with self._stats_lock:
+            self._table_counts['hits'] += len(X) - len(misses)
+            self._table_counts['misses'] += len(misses)
+        return probabilities, expected_yields, yield_bounds
+
+    def stats(self) -> Dict:
+        """Inference mode, model load figures and per-mode latency."""
+        state = self.state
+        model = state.model
+        with self._stats_lock:
+            counters = {mode: tuple(counts) for mode, counts in self._latency.items()}
+            table_counts = dict(self._table_counts)
+        latency = {
+            mode: {
+                'calls': calls,
+                'items': items,
+                'meanCallMs': round(seconds / calls * 1000, 3) if calls else 0.0,
+                'meanItemMs': round(seconds / items * 1000, 3) if items else 0.0
+            }
+            for mode, (calls, items, seconds) in counters.items()
+        }
+        return {
+            'mode': self.mode,
+            'generation': state.generation,
+            'activeEngine': 'model' if model is not None else 'rules',
+            'modelDir': model.model_dir if model is not None else None,
+            'modelFormat': model.artifact_format if model is not None else None,
+            'modelVersion': model.model_version if model is not None else None,
+            'modelEngine': model.engine if model is not None else None,
+            'modelLoadSeconds': round(model.load_seconds, 4) if model is not None else None,
+            'modelWarmupSeconds': round(model.warmup_seconds, 4) if model is not None else None,
+            'modelRssBytes': self.model_rss_bytes,
+            'rssBytes': rss_bytes(),
+            'cropDbPath': self.crop_db_path,
+            'ruleCrops': len(state.table),
+            'modelCrops': len(model.crops) if model is not None else 0,
+            'districtTable': self._district_table_stats(state.district_table, table_counts),
+            'latency': latency
+        }
+
+    def _district_table_stats(self, table: Optional[DistrictTable], table_counts: Dict) -> Optional[Dict]:
+        if self.mode != 'table':
+            return None
+        return {
+            'loaded': table is not None,
+            'rows': len(table) if table is not None else 0,
+            'modelVersion': table.meta.get('modelVersion') if table is not None else None,
+            'createdAt': table.meta.get('createdAt') if table is not None else None,
+            **table_counts
+        }
+
+    def predict(self, features: Dict, options: PredictOptions = DEFAULT_OPTIONS) -> Dict:
+        """
+        Predict top crop recommendations for given features.
+        
+        Args:
+            features: Dictionary containing location and environmental data
+            options: Ranking and output options
+            
+        Returns:
+            {'recommendations': [...]} with the crops' scores, plus the
+            location's 'locationYield' when the trained model is in use
+        """
+        result = self.predict_batch([features], options)[0]
+        if isinstance(result, ValueError):
+            raise result
+        return result
@@ -0,0 +1,194 @@
+"""
+Versioned model registry.
+Each training run is stored as a numbered version under
+<root>/versions/vNNNN and recorded in <root>/registry.json with its
+metadata (how it was trained, from which data, its metrics). The service
+serves, in order of precedence:
+
+    MODEL_VERSION        version pinned through the environment
+    registry "pinned"    version pinned with `pin` / `rollback`
+    registry "current"   the latest registered version
+
+so rolling back or pinning is a registry edit, not a retrain. Running
+services pick the change up through the model watcher.
+
+Usage (from ml-service/):
+    python -m app.models.registry list models/
+    python -m app.models.registry pin models/ 3
+    python -m app.models.registry rollback models/
+    python -m app.models.registry unpin models/
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.models.artifacts import MANIFEST_FILE, ArtifactError, read_manifest, verify_files
+
+REGISTRY_FILE = 'registry.json'
+VERSIONS_DIR = 'versions'
+
+
+class RegistryError(Exception):
+    """Raised for unknown versions, an empty registry or corrupt version artifacts."""
+
+
+def is_registry(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, REGISTRY_FILE))
+
+
+class ModelRegistry:
+    """Numbered model versions under one root directory."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.path = os.path.join(root, REGISTRY_FILE)
+
+    def load(self) -> Dict:
+        if not os.path.exists(self.path):
+            return {'current': None, 'pinned': None, 'versions': []}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def _save(self, registry: Dict):
+        os.makedirs(self.root, exist_ok=True)
+        temporary = f"{self.path}.tmp-{os.getpid()}"
+        with open(temporary, 'w') as f:
+            json.dump(registry, f, indent=2)
+        os.replace(temporary, self.path)
+
+    def version_dir(self, version: int) -> str:
+        return os.path.join(self.root, VERSIONS_DIR, f"v{version:04d}")
+
+    def versions(self) -> List[Dict]:
+        return self.load()['versions']
+
+    def get(self, version: int) -> Dict:
+        for entry in self.versions():
+            if entry['version'] == version:
+                return entry
+        raise RegistryError(f"Version {version} is not registered in {self.path}")
+
+    def allocate(self) -> Tuple[int, str]:
+        """Next version number and its (new, empty) directory."""
+        versions_root = os.path.join(self.root, VERSIONS_DIR)
+        existing = [entry['version'] for entry in self.versions()]
+        if os.path.isdir(versions_root):
+            # Directories of runs that failed before registering are skipped, not reused
+            existing += [int(name[1:]) for name in os.listdir(versions_root)
+                         if name.startswith('v') and name[1:].isdigit()]
+        version = max(existing, default=0) + 1
+        os.makedirs(self.version_dir(version))
+        return version, self.version_dir(version)
+
+    def verify(self, version: int):
+        """
+        Check a version's memory-mapped artifacts against the size and
+        SHA-256 in its manifest. Serving only checks sizes (MODEL_VERIFY),
+        so a version is checksummed here, before it can become the one served.
+        """
+        version_dir = self.version_dir(version)
+        if not os.path.exists(os.path.join(version_dir, MANIFEST_FILE)):
+            return
+        try:
+            verify_files(version_dir, read_manifest(version_dir), 'checksum')
+        except ArtifactError as e:
+            raise RegistryError(f"Version {version} failed verification: {e}") from e
+
+    def register(self, version: int, metadata: Dict) -> Dict:
+        """Record a trained version and make it current, once its artifacts verify."""
+        self.verify(version)
+        registry = self.load()
+        entry = {
+            'version': version,
+            'path': os.path.relpath(self.version_dir(version), self.root),
+            'createdAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            **metadata
+        }
+        registry['versions'] = [v for v in registry['versions'] if v['version'] != version] + [entry]
+        registry['current'] = version
+        self._save(registry)
+        return entry
+
+    def active_version(self, pinned: Optional[int] = None) -> int:
+        """The version served: `pinned` (e.g. MODEL_VERSION), else the registry's pin, else current."""
+        registry = self.load()
+        version = pinned if pinned is not None else registry.get('pinned')
+        if version is None:
+            version = registry.get('current')
+        if version is None:
+            raise RegistryError(f"No model versions registered in {self.path}")
+        if version not in {entry['version'] for entry in registry['versions']}:
+            raise RegistryError(f"Version {version} is not registered in {self.path}")
+        return version
+
+    def resolve(self, pinned: Optional[int] = None) -> str:
+        """Directory of the version served."""
+        return self.version_dir(self.active_version(pinned))
+
+    def pin(self, version: Optional[int]):
+        """Serve `version` regardless of newer registrations; None unpins."""
+        registry = self.load()
+        if version is not None and version not in {entry['version'] for entry in registry['versions']}:
+            raise RegistryError(f"Version {version} is not registered in {self.path}")
+        if version is not None:
+            self.verify(version)
+        registry['pinned'] = version
+        self._save(registry)
+
+    def rollback(self) -> int:
+        """Pin the version registered before the one currently served."""
+        active = self.active_version()
+        older = [entry['version'] for entry in self.versions() if entry['version'] < active]
+        if not older:
+            raise RegistryError(f"No version older than {active} to roll back to")
+        self.pin(max(older))
+        return max(older)
+
+
+def env_pinned_version() -> Optional[int]:
+    """MODEL_VERSION as a version number ('3' or 'v3'); raises RegistryError when it is not one."""
+    value = os.getenv('MODEL_VERSION', '').strip()
+    if not value:
+        return None
+    number = value[1:] if value[:1] in ('v', 'V') else value
+    if not number.isdigit():
+        raise RegistryError(f"MODEL_VERSION must be a version number such as 3 or v3, got {value!r}")
+    return int(number)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and pin registered model versions")
+    parser.add_argument('command', choices=('list', 'pin', 'unpin', 'rollback'))
+    parser.add_argument('root', help='Registry directory (MODEL_PATH)')
+    parser.add_argument('version', nargs='?', type=int, help='Version to pin')
+    args = parser.parse_args()
+    registry = ModelRegistry(args.root)
+
+    if args.command == 'pin':
+        if args.version is None:
+            parser.error("pin needs a version")
+        registry.pin(args.version)
+    elif args.command == 'unpin':
+        registry.pin(None)
+    elif args.command == 'rollback':
+        print(f"Pinned version {registry.rollback()}")
+
+    state = registry.load()
+    active = None
+    if state['versions']:
+        try:
+            active = registry.active_version(env_pinned_version())
+        except RegistryError as e:
+            print(f"Cannot tell the version served: {e}")
+    for entry in state['versions']:
+        marks = [mark for mark, version in (('current', state['current']), ('pinned', state['pinned']),
+                                            ('serving', active)) if version == entry['version']]
+        metrics = ', '.join(f"{name}={value:.4f}" for name, value in entry.get('metrics', {}).items())
+        print(f"v{entry['version']:04d}  {entry['createdAt']}  {entry.get('method', '-'):<10} "
+              f"rows={entry.get('data', {}).get('rows', '-')}  {metrics}  {' '.join(marks)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,94 @@ This is a placeholder for actual model training implementation.
 """
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from pandas.api.types import union_categoricals
+from sklearn.ensemble import (
+    HistGradientBoostingClassifier, HistGradientBoostingRegressor, RandomForestClassifier, RandomForestRegressor
+)
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
-import pickle
+import argparse
 import os
+import time
+from typing import Dict, Iterator, List, Optional
 
-def load_training_data(data_path: str = './data/training_data.csv') -> pd.DataFrame:
+from app.memory import PeakMemory, format_bytes
+from app.models.compaction import to_float32
+from app.models.feature_cache import CachedFeatures, FeatureCache, default_cache_dir
+from app.models.features import NUMERIC_FEATURES, FeaturePipeline
+from app.models.incremental import (
+    DEFAULT_DRIFT_THRESHOLD, data_profile, data_summary, measure_drift, merge_profile, read_profile,
+    warm_start, write_profile
+)
+from app.models.registry import ModelRegistry, RegistryError, env_pinned_version
+from app.models.trained_model import TrainedModel, save_artifacts, save_forest_artifacts
+from app.models.tuning import (
+    DEFAULT_GRIDS, TrainingReport, evaluate, grid_size, make_estimator, parse_grid, search_forest
+)
+
+# Columns read from the training data and their in-memory dtypes. Numeric
+# features are float32, which is what the forests train on anyway; the
+# yield target keeps full precision.
+TRAINING_DTYPES = {
+    **{column: 'category' for column in ('state', 'district', 'season', 'crop')},
+    **{column: 'float32' for column, _ in NUMERIC_FEATURES},
+    'yield': 'float64'
+}
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+# Crop classifier and yield regressor of each training engine, and the
+# settings used without --search
+ENGINES = {
+    'forest': (RandomForestClassifier, RandomForestRegressor, {'n_estimators': 100}),
+    'boosting': (HistGradientBoostingClassifier, HistGradientBoostingRegressor, {'max_iter': 100}),
+}
+
+def _read_chunks(data_path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Read only the training columns, chunk_rows rows at a time."""
+    columns = list(TRAINING_DTYPES)
+    if os.path.splitext(data_path)[1].lower() == '.parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            # Other Parquet engines (fastparquet) still prune columns but read the file at once
+            yield pd.read_parquet(data_path, columns=columns)
+            return
+        for batch in pq.ParquetFile(data_path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(data_path, usecols=columns, dtype=TRAINING_DTYPES, chunksize=chunk_rows)
+
+def _concat_chunks(chunks: Iterator[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Join chunks column by column, keeping only compact per-column parts
+    while reading; categories are merged and sorted.
+    """
+    parts = {column: [] for column in TRAINING_DTYPES}
+    for chunk in chunks:
+        for column, dtype in TRAINING_DTYPES.items():
+            values = chunk[column]
+            parts[column].append(values.astype('category').array if dtype == 'category'
+                                 else values.to_numpy(dtype=dtype))
+        del chunk
+    
+    columns = {}
+    for column, dtype in TRAINING_DTYPES.items():
+        column_parts = parts.pop(column)
+        if dtype == 'category':
+            columns[column] = union_categoricals(column_parts, sort_categories=True)
+        else:
+            columns[column] = np.concatenate(column_parts)
+        del column_parts
+    return pd.DataFrame(columns, copy=False)
+
+def load_training_data(data_path: str = './data/training_data.csv',
+                       chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Optional[pd.DataFrame]:
     """
-    Load training data from CSV.
+    Load training data from CSV or Parquet, in chunks and with compact
+    dtypes (categories for state/district/season/crop, float32 features).
+    Reports rows per second and the peak memory used while loading.
     
-    Expected columns:
+    Expected columns (others are not read):
     state, district, season, soil_ph, soil_oc, soil_n, soil_p, soil_k,
     avg_temp, avg_rainfall, avg_humidity, crop, yield
     """
@@ -24,44 +101,82 @@ def load_training_data(data_path: str = './data/training_data.csv') -> pd.DataFr
         print("Please prepare training data first.")
         return None
     
-    return pd.read_csv(data_path)
+    started = time.perf_counter()
+    with PeakMemory() as memory:
+        df = _concat_chunks(_read_chunks(data_path, chunk_rows))
+    elapsed = time.perf_counter() - started
+    if df.empty:
+        print(f"No training rows in {data_path}")
+        return None
+    
+    print(f"Read {len(df)} rows in {elapsed:.2f}s ({len(df) / elapsed:,.0f} rows/s): "
+          f"{format_bytes(df.memory_usage(deep=True).sum())} in memory, "
+          f"peak RSS +{format_bytes(memory.increase_bytes)} while loading")
+    return df
 
-def prepare_features(df: pd.DataFrame) -> tuple:
+def prepare_features(df: pd.DataFrame, base: Optional[FeaturePipeline] = None) -> tuple:
     """
     Prepare features and target for model training.
-    """
-    # Feature columns
-    feature_cols = [
-        'soil_ph', 'soil_oc', 'soil_n', 'soil_p', 'soil_k',
-        'avg_temp', 'avg_rainfall', 'avg_humidity'
-    ]
-    
-    # Encode categorical variables
-    le_state = LabelEncoder()
-    le_district = LabelEncoder()
-    le_season = LabelEncoder()
+    The float32 feature matrix is built by the same FeaturePipeline the
+    service encodes requests with, and the pipeline is returned to be saved
+    with the model.
     
-    df['state_encoded'] = le_state.fit_transform(df['state'])
-    df['district_encoded'] = le_district.fit_transform(df['district'])
-    df['season_encoded'] = le_season.fit_transform(df['season'])
+    With `base` (an existing model's pipeline) values keep that model's
+    codes, and values it never saw get new codes after them.
+    """
+    pipeline = FeaturePipeline.fit(df, base)
+    X = pipeline.transform_frame(df)
     
-    feature_cols.extend(['state_encoded', 'district_encoded', 'season_encoded'])
+    y_crop = np.asarray(df['crop'])
+    y_yield = df['yield'].to_numpy()
     
-    X = df[feature_cols].values
-    y_crop = df['crop'].values
-    y_yield = df['yield'].values
+    return X, y_crop, y_yield, pipeline
+
+def _train_estimator(name: str, engine: str, estimator_class, X_train, y_train, X_test, y_test,
+                     report: TrainingReport, n_jobs: int, grid: Optional[Dict[str, List]], cv: int,
+                     max_latency_ms: Optional[float]):
+    if grid is None:
+        with report.stage(f'{name} fit'):
+            model = make_estimator(estimator_class, n_jobs, random_state=42, **ENGINES[engine][2])
+            model.fit(X_train, y_train)
+        with report.stage(f'{name} evaluate'):
+            report.candidates[name] = [{
+                'params': {key: model.get_params()[key] for key in DEFAULT_GRIDS[engine]},
+                'cvScore': None,
+                'cvStd': None,
+                'fitSeconds': report.stages[-1]['seconds'],
+                **evaluate(model, X_test, y_test),
+                'selected': True
+            }]
+        return model
     
-    return X, y_crop, y_yield, {
-        'state_encoder': le_state,
-        'district_encoder': le_district,
-        'season_encoder': le_season
-    }
+    print(f"Searching {grid_size(grid)} {name} candidates with {cv}-fold cross-validation...")
+    return search_forest(name, estimator_class, grid, X_train, y_train, X_test, y_test, report,
+                         cv=cv, n_jobs=n_jobs, max_latency_ms=max_latency_ms)
+
+def tree_count(model) -> int:
+    """Trees in a fitted forest or boosting model."""
+    if hasattr(model, 'estimators_'):
+        return len(model.estimators_)
+    return model.n_iter_ * model.n_trees_per_iteration_
 
-def train_models(X, y_crop, y_yield):
+def train_models(X, y_crop, y_yield, n_jobs: int = -1, grid: Optional[Dict[str, List]] = None, cv: int = 3,
+                 max_latency_ms: Optional[float] = None, report: Optional[TrainingReport] = None,
+                 engine: str = 'forest'):
     """
     Train classification model for crop recommendation
     and regression model for yield prediction.
+    
+    `engine` is 'forest' (RandomForest) or 'boosting' (HistGradientBoosting).
+    Trees are fitted on `n_jobs` cores (-1: all; boosting always uses all
+    cores). With a `grid`, each model is picked by cross-validated
+    hyperparameter search (see app.models.tuning.search_forest); otherwise
+    the ENGINES settings are used with sklearn's defaults. Stage timings
+    and candidates go to `report`.
     """
+    classifier_class, regressor_class, _ = ENGINES[engine]
+    report = report or TrainingReport()
+    
     # Split data
     X_train, X_test, y_crop_train, y_crop_test, y_yield_train, y_yield_test = train_test_split(
         X, y_crop, y_yield, test_size=0.2, random_state=42
@@ -69,61 +184,224 @@ def train_models(X, y_crop, y_yield):
     
     # Train crop classifier
     print("Training crop classifier...")
-    crop_classifier = RandomForestClassifier(n_estimators=100, random_state=42)
-    crop_classifier.fit(X_train, y_crop_train)
+    crop_classifier = _train_estimator('crop classifier', engine, classifier_class, X_train, y_crop_train,
+                                       X_test, y_crop_test, report, n_jobs, grid, cv, max_latency_ms)
     
     crop_accuracy = crop_classifier.score(X_test, y_crop_test)
+    report.metrics['cropAccuracy'] = crop_accuracy
     print(f"Crop classifier accuracy: {crop_accuracy:.2f}")
     
     # Train yield regressor
     print("Training yield regressor...")
-    yield_regressor = RandomForestRegressor(n_estimators=100, random_state=42)
-    yield_regressor.fit(X_train, y_yield_train)
+    yield_regressor = _train_estimator('yield regressor', engine, regressor_class, X_train, y_yield_train,
+                                       X_test, y_yield_test, report, n_jobs, grid, cv, max_latency_ms)
     
     yield_r2 = yield_regressor.score(X_test, y_yield_test)
+    report.metrics['yieldR2'] = yield_r2
     print(f"Yield regressor R² score: {yield_r2:.2f}")
     
     return crop_classifier, yield_regressor
 
-def save_models(crop_model, yield_model, encoders, model_dir: str = './models'):
-    """Save trained models and encoders."""
-    os.makedirs(model_dir, exist_ok=True)
-    
-    # Save models
-    with open(os.path.join(model_dir, 'crop_classifier.pkl'), 'wb') as f:
-        pickle.dump(crop_model, f)
-    
-    with open(os.path.join(model_dir, 'yield_regressor.pkl'), 'wb') as f:
-        pickle.dump(yield_model, f)
-    
-    # Save encoders
-    with open(os.path.join(model_dir, 'encoders.pkl'), 'wb') as f:
-        pickle.dump(encoders, f)
+def save_models(crop_model, yield_model, pipeline: FeaturePipeline, model_dir: str = './models',
+                metadata: Optional[Dict] = None):
+    """
+    Save trained models and their feature pipeline as memory-mapped arrays with a
+    manifest (see app.models.artifacts), which the service maps instead
+    of unpickling.
+    """
+    manifest = save_artifacts(crop_model, yield_model, pipeline, model_dir, metadata)
     
-    print(f"Models saved to {model_dir}")
+    size = sum(entry['bytes'] for entry in manifest['files'].values())
+    print(f"Models saved to {model_dir} ({len(manifest['files'])} arrays, {size / 2**20:.1f} MB)")
 
-def main():
-    """Main training function."""
+def _finish(report: TrainingReport, report_path: str, version: int, version_dir: str):
+    report.print()
+    report.save(report_path or os.path.join(version_dir, 'training_report.json'))
+    print(f"Registered version {version} in {version_dir}")
+
+def load_features(data_path: str, chunk_rows: int, cache_dir: Optional[str],
+                  report: TrainingReport) -> Optional[CachedFeatures]:
+    """
+    Encoded training data, its data profile and summary: from the feature
+    cache in `cache_dir` when it holds this data, else read, encoded and
+    stored there (cache_dir None: not cached).
+    """
+    # A missing file is reported by load_training_data
+    cache = FeatureCache(cache_dir) if cache_dir and os.path.exists(data_path) else None
+    if cache is not None:
+        with report.stage('hash data'):
+            key = cache.key(data_path, {'dtypes': TRAINING_DTYPES})
+        with report.stage('load cached features'):
+            cached = cache.load(key)
+        if cached is not None:
+            print(f"Loaded {len(cached.X)} encoded training samples from {os.path.join(cache_dir, key)}")
+            return cached._replace(summary={**cached.summary, 'sources': [data_path]})
+    
     print("Loading training data...")
-    df = load_training_data()
+    with report.stage('load'):
+        df = load_training_data(data_path, chunk_rows)
     
     if df is None:
-        return
+        return None
     
     print(f"Loaded {len(df)} training samples")
     
     print("Preparing features...")
-    X, y_crop, y_yield, encoders = prepare_features(df)
+    with report.stage('prepare features'):
+        X, y_crop, y_yield, pipeline = prepare_features(df)
+        features = CachedFeatures(X, y_crop, y_yield, pipeline, data_profile(df), data_summary(df, [data_path]))
+    
+    if cache is not None:
+        with report.stage('cache features'):
+            cache.save(key, features)
+    return features
+
+def train_full(args, registry: ModelRegistry, report: TrainingReport, registration: Optional[Dict] = None,
+               engine: Optional[str] = None):
+    """
+    Train on the full data set and register the result as a new version.
+    `engine` overrides args.engine, e.g. to retrain with a base version's engine.
+    """
+    engine = engine or args.engine
+    grid = parse_grid(args.trees, args.depth, args.min_leaf, engine, args.learning_rate) if args.search else None
+    
+    cache_dir = None if args.no_feature_cache else (args.feature_cache or default_cache_dir(args.data))
+    features = load_features(args.data, args.chunk_rows, cache_dir, report)
+    if features is None:
+        return
+    X, y_crop, y_yield, pipeline = features.X, features.y_crop, features.y_yield, features.pipeline
     
     print("Training models...")
-    crop_model, yield_model = train_models(X, y_crop, y_yield)
+    crop_model, yield_model = train_models(X, y_crop, y_yield, n_jobs=args.n_jobs, grid=grid, cv=args.cv,
+                                           max_latency_ms=args.max_latency_ms, report=report, engine=engine)
     
     print("Saving models...")
-    save_models(crop_model, yield_model, encoders)
+    with report.stage('save'):
+        version, version_dir = registry.allocate()
+        save_models(crop_model, yield_model, pipeline, version_dir, {'modelVersion': version})
+        write_profile(version_dir, features.profile)
+        registry.register(version, {
+            'method': 'full',
+            'parent': None,
+            'engine': engine,
+            'data': features.summary,
+            'metrics': report.metrics,
+            'trees': {'crop': tree_count(crop_model), 'yield': tree_count(yield_model)},
+            **(registration or {})
+        })
+    _finish(report, args.report, version, version_dir)
+
+def train_incremental(args, registry: ModelRegistry, report: TrainingReport):
+    """
+    Update the served version with the new data in args.incremental: add
+    trees fitted on it (warm start), or retrain on args.data in full when the
+    new data drifts beyond args.drift_threshold.
+    """
+    base_version = registry.active_version(env_pinned_version())
+    base_dir = registry.version_dir(base_version)
+    base_entry = registry.get(base_version)
+    model = TrainedModel.load(base_dir)
+    
+    print(f"Loading new data for version {base_version}...")
+    with report.stage('load new data'):
+        df = load_training_data(args.incremental, args.chunk_rows)
+    if df is None:
+        return
+    
+    profile = read_profile(base_dir)
+    drift = None
+    if profile is None:
+        print(f"Version {base_version} has no data profile, skipping the drift check")
+    else:
+        drift = measure_drift(profile, df)
+        if drift['max'] is None:
+            print(f"Seasons {', '.join(drift['unseenSeasons'])} are new to version {base_version}")
+        else:
+            print(f"Drift (PSI) {drift['max']:.3f} on {drift['feature']}, threshold {args.drift_threshold}")
+        if drift['max'] is None or drift['max'] > args.drift_threshold:
+            print(f"Retraining on {args.data}")
+            train_full(args, registry, report, {'method': 'retrain', 'parent': base_version, 'drift': drift},
+                       engine=model.engine)
+            return
+    if model.engine == 'boosting':
+        # Boosting iterations fit the residuals of the earlier ones; trees fitted separately cannot be added
+        print(f"Version {base_version} is a boosted model, retraining on {args.data}")
+        train_full(args, registry, report, {'method': 'retrain', 'parent': base_version, 'drift': drift},
+                   engine=model.engine)
+        return
+    
+    print(f"Adding {args.new_trees} trees per forest trained on {len(df)} new rows...")
+    with report.stage('prepare features'):
+        X, y_crop, y_yield, pipeline = prepare_features(df, model.features)
+    # A compacted version stays compacted: new trees are cut at its depth and stored like its own
+    compaction = model.compaction or {}
+    with report.stage('warm start'):
+        crop_forest, yield_forest, metrics = warm_start(model, X, y_crop, y_yield, args.new_trees, args.n_jobs,
+                                                        max_depth=compaction.get('maxDepth'))
+        if compaction.get('float32'):
+            crop_forest, yield_forest = to_float32(crop_forest), to_float32(yield_forest)
+    report.metrics.update(metrics)
+    
+    with report.stage('save'):
+        version, version_dir = registry.allocate()
+        metadata = {'modelVersion': version, **({'compaction': compaction} if compaction else {})}
+        save_forest_artifacts(crop_forest, yield_forest, pipeline, version_dir, metadata)
+        write_profile(version_dir, merge_profile(profile, df) if profile is not None else data_profile(df))
+        data = data_summary(df, [args.incremental])
+        base_data = base_entry.get('data', {})
+        data['totalRows'] = base_data.get('totalRows', base_data.get('rows', 0)) + len(df)
+        registry.register(version, {
+            'method': 'warm-start',
+            'parent': base_version,
+            'engine': model.engine,
+            'data': data,
+            'metrics': metrics,
+            'trees': {'crop': crop_forest.n_trees, 'yield': yield_forest.n_trees},
+            'drift': drift
+        })
+    _finish(report, args.report, version, version_dir)
+
+def main():
+    """Main training function."""
+    parser = argparse.ArgumentParser(description="Train the crop classifier and yield regressor")
+    parser.add_argument('--data', default='./data/training_data.csv', help='Training data (.csv or .parquet)')
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help='Rows read per chunk')
+    parser.add_argument('--model-dir', default='./models',
+                        help='Model registry; each run is registered as a new version under it')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='forest',
+                        help='RandomForest (forest) or HistGradientBoosting (boosting) models')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='Cores used for fitting (-1: all)')
+    parser.add_argument('--search', action='store_true', help='Pick hyperparameters by cross-validated search')
+    parser.add_argument('--trees', help='Search values for n_estimators (boosting: max_iter), e.g. 50,100,200')
+    parser.add_argument('--depth', help="Search values for max_depth, e.g. none,16")
+    parser.add_argument('--min-leaf', help='Search values for min_samples_leaf, e.g. 1,4')
+    parser.add_argument('--learning-rate', help='Search values for learning_rate (boosting), e.g. 0.1,0.05')
+    parser.add_argument('--cv', type=int, default=3, help='Cross-validation folds')
+    parser.add_argument('--max-latency-ms', type=float,
+                        help='Only select candidates whose single-row p50 scoring latency is within this')
+    parser.add_argument('--incremental', metavar='NEW_DATA',
+                        help='Update the served version with this new data instead of training from scratch')
+    parser.add_argument('--new-trees', type=int, default=20, help='Trees added per forest by an incremental update')
+    parser.add_argument('--drift-threshold', type=float, default=DEFAULT_DRIFT_THRESHOLD,
+                        help='PSI above which an incremental update retrains on --data instead')
+    parser.add_argument('--feature-cache', metavar='DIR',
+                        help='Cache of encoded training data (default: .feature_cache next to --data)')
+    parser.add_argument('--no-feature-cache', action='store_true', help='Always read and encode --data')
+    parser.add_argument('--report', help='Training report path (default: training_report.json in the version)')
+    args = parser.parse_args()
+    
+    registry = ModelRegistry(args.model_dir)
+    report = TrainingReport()
+    if args.incremental:
+        try:
+            train_incremental(args, registry, report)
+        except RegistryError as e:
+            print(f"{e}; run a full training first")
+            return
+    else:
+        train_full(args, registry, report)
     
     print("Training complete!")
 
 if __name__ == "__main__":
     main()
-
-
@@ -0,0 +1,219 @@
+"""
+Trained Model Artifacts
+Loads the crop classifier, yield regressor and feature pipeline written by
+train_model.save_models.
+
+Artifacts are memory-mapped forests described by a manifest (see
+app.models.artifacts); directories holding only the older pickles are
+still loaded, by unpickling.
+
+Usage (from ml-service/):
+    python -m app.models.trained_model convert models/   # pickles -> memory-mapped format
+    python -m app.models.trained_model verify models/
+"""
+import argparse
+import logging
+import os
+import pickle
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.models.artifacts import (
+    MANIFEST_FILE, VERIFY_MODES, CompiledForest, compile_estimator, load_forests, read_manifest,
+    save_forests, verify_files
+)
+from app.models.features import N_FEATURES, FeaturePipeline
+from app.models.registry import ModelRegistry, env_pinned_version, is_registry
+
+logger = logging.getLogger(__name__)
+
+# Pickled artifacts written before the memory-mapped format
+ARTIFACT_FILES = ('crop_classifier.pkl', 'yield_regressor.pkl', 'encoders.pkl')
+
+# Quantiles of the regressor's per-tree predictions that bound the yield range
+YIELD_QUANTILES = (0.1, 0.9)
+
+
+def resolve_model_dir(model_path: str) -> str:
+    """
+    MODEL_PATH may point at the artifact directory or at a file inside it.
+    For a model registry (see app.models.registry) this is the directory of
+    the version being served.
+    """
+    model_dir = model_path if os.path.isdir(model_path) else (os.path.dirname(model_path) or '.')
+    if is_registry(model_dir):
+        return ModelRegistry(model_dir).resolve(env_pinned_version())
+    return model_dir
+
+
+def pickles_exist(model_dir: str) -> bool:
+    return all(os.path.exists(os.path.join(model_dir, name)) for name in ARTIFACT_FILES)
+
+
+def artifacts_exist(model_dir: str) -> bool:
+    return os.path.exists(os.path.join(model_dir, MANIFEST_FILE)) or pickles_exist(model_dir)
+
+
+def save_forest_artifacts(crop_forest: CompiledForest, yield_forest: CompiledForest, pipeline: FeaturePipeline,
+                          model_dir: str, metadata: Optional[Dict] = None) -> Dict:
+    """Write compiled forests and their feature pipeline. Returns the manifest."""
+    import sklearn
+
+    return save_forests(model_dir, {'crop_classifier': crop_forest, 'yield_regressor': yield_forest}, {
+        'sklearnVersion': sklearn.__version__,
+        **(metadata or {}),
+        'features': pipeline.to_schema()
+    })
+
+
+def save_artifacts(crop_classifier, yield_regressor, pipeline: FeaturePipeline, model_dir: str,
+                   metadata: Optional[Dict] = None) -> Dict:
+    """
+    Write fitted sklearn forests and their feature pipeline in the
+    memory-mapped format. Returns the manifest.
+    """
+    return save_forest_artifacts(
+        compile_estimator(crop_classifier), compile_estimator(yield_regressor), pipeline, model_dir, metadata
+    )
+
+
+class TrainedModel:
+    """
+    Crop classifier and yield regressor with their feature pipeline.
+    The models are CompiledForests (or CompiledBoosting) over memory-mapped
+    arrays, or sklearn forests when loaded from pickles.
+    """
+
+    def __init__(self, crop_classifier, yield_regressor, features: FeaturePipeline, model_dir: str,
+                 artifact_format: str = 'mmap'):
+        self.crop_classifier = crop_classifier
+        self.yield_regressor = yield_regressor
+        self.model_dir = model_dir
+        self.artifact_format = artifact_format
+        self.model_version: Optional[int] = None
+        # Settings the forests were compacted with (see app.models.compaction)
+        self.compaction: Optional[Dict] = None
+        self.crops = [str(crop) for crop in crop_classifier.classes_]
+        self.features = features
+
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+
+    @classmethod
+    def load(cls, model_dir: str, verify: Optional[str] = None) -> Optional['TrainedModel']:
+        """
+        Load the artifacts from model_dir, or return None if there are none.
+        Memory-mapped artifacts are checked against their manifest first
+        (MODEL_VERIFY: 'size', the default, or 'checksum') and raise
+        ArtifactError when they do not match. Hashing every array would read
+        the whole model at each worker start; the registry checksums a
+        version once, when it is registered or pinned.
+        """
+        started = time.perf_counter()
+        if os.path.exists(os.path.join(model_dir, MANIFEST_FILE)):
+            forests, manifest = load_forests(model_dir, verify or os.getenv('MODEL_VERIFY', 'size'))
+            model = cls(
+                forests['crop_classifier'], forests['yield_regressor'],
+                FeaturePipeline.from_schema(manifest['features']), model_dir=model_dir
+            )
+            model.model_version = manifest.get('modelVersion')
+            model.compaction = manifest.get('compaction')
+        elif pickles_exist(model_dir):
+            loaded = []
+            for name in ARTIFACT_FILES:
+                with open(os.path.join(model_dir, name), 'rb') as f:
+                    loaded.append(pickle.load(f))
+            crop_classifier, yield_regressor, encoders = loaded
+            model = cls(crop_classifier, yield_regressor, FeaturePipeline.from_encoders(encoders),
+                        model_dir=model_dir, artifact_format='pickle')
+        else:
+            return None
+
+        model.load_seconds = time.perf_counter() - started
+        return model
+
+    @property
+    def engine(self) -> str:
+        """'forest' or 'boosting'."""
+        return getattr(self.crop_classifier, 'engine', 'forest')
+
+    def encode(self, features_list: List[Dict]) -> np.ndarray:
+        """
+        Build the model input matrix for a list of predictor feature dicts.
+        """
+        return self.features.transform(features_list)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """(rows x crops) probabilities, columns in self.crops order."""
+        return self.crop_classifier.predict_proba(X)
+
+    def predict_yield(self, X: np.ndarray) -> np.ndarray:
+        """
+        Expected yield per row. The regressor is trained without the crop
+        as an input, so this is the expected yield for the location.
+        """
+        return self.yield_regressor.predict(X)
+
+    @property
+    def yield_intervals(self) -> bool:
+        """
+        Whether yield ranges come from the spread of the regressor's trees:
+        memory-mapped forests. Boosting trees are not separate predictors.
+        """
+        return self.engine == 'forest' and isinstance(self.yield_regressor, CompiledForest)
+
+    def predict_yield_interval(self, X: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Expected yield per row and a (rows x 2) array of yield bounds: the
+        YIELD_QUANTILES of the individual trees' predictions. Bounds are None
+        when the model has no yield_intervals.
+        """
+        if not self.yield_intervals:
+            return self.predict_yield(X), None
+        return self.yield_regressor.predict_interval(X, YIELD_QUANTILES)
+
+    def warm_up(self, rows: int = 8):
+        """
+        Run a dummy batch through both models so the first real request
+        does not pay for lazy initialisation.
+        """
+        started = time.perf_counter()
+        X = np.zeros((rows, N_FEATURES), dtype=np.float32)
+        self.predict_proba(X)
+        self.predict_yield_interval(X)
+        self.warmup_seconds = time.perf_counter() - started
+
+
+def convert(model_dir: str) -> Dict:
+    """Rewrite the pickled artifacts in model_dir in the memory-mapped format."""
+    loaded = []
+    for name in ARTIFACT_FILES:
+        with open(os.path.join(model_dir, name), 'rb') as f:
+            loaded.append(pickle.load(f))
+    crop_classifier, yield_regressor, encoders = loaded
+    return save_artifacts(crop_classifier, yield_regressor, FeaturePipeline.from_encoders(encoders), model_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert or verify trained model artifacts")
+    parser.add_argument('command', choices=('convert', 'verify'))
+    parser.add_argument('model_dir')
+    parser.add_argument('--verify', choices=VERIFY_MODES, default='checksum')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        manifest = convert(args.model_dir)
+        size = sum(entry['bytes'] for entry in manifest['files'].values())
+        print(f"Wrote {len(manifest['files'])} arrays ({size / 2**20:.1f} MB) and {MANIFEST_FILE} to {args.model_dir}")
+    else:
+        manifest = read_manifest(args.model_dir)
+        verify_files(args.model_dir, manifest, args.verify)
+        FeaturePipeline.from_schema(manifest['features'])
+        print(f"{args.model_dir}: {len(manifest['files'])} files OK (format version {manifest['version']}, "
+              f"created {manifest['createdAt']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Training report and hyperparameter search.
+TrainingReport records wall time and peak memory per training stage along
+with model quality. search_forest cross-validates a grid of forest (or
+boosting) settings in parallel and measures the serving cost of every
+candidate: scoring latency through CompiledForest (the path the service
+uses) and artifact size, so a model can be picked on quality and cost
+together.
+"""
+import functools
+import itertools
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from sklearn.model_selection import GridSearchCV
+
+from app.memory import PeakMemory, format_bytes
+from app.models.artifacts import compile_estimator
+from app.models.trained_model import YIELD_QUANTILES
+
+# Default grid for --search
+DEFAULT_GRID = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [None, 16],
+    'min_samples_leaf': [1, 4]
+}
+DEFAULT_BOOSTING_GRID = {
+    'max_iter': [100, 200],
+    'max_depth': [None, 8],
+    'min_samples_leaf': [20],
+    'learning_rate': [0.1, 0.05]
+}
+DEFAULT_GRIDS = {'forest': DEFAULT_GRID, 'boosting': DEFAULT_BOOSTING_GRID}
+
+# Column headings of the candidate table
+_PARAM_LABELS = {'n_estimators': 'trees', 'max_iter': 'iters', 'max_depth': 'depth', 'min_samples_leaf': 'leaf',
+                 'learning_rate': 'rate'}
+
+# Rows per call for the batch latency figure
+LATENCY_BATCH_ROWS = 64
+
+
+class TrainingReport:
+    """Per-stage timings, metrics and search candidates of one training run."""
+
+    def __init__(self):
+        self.stages: List[Dict] = []
+        self.metrics: Dict[str, float] = {}
+        self.candidates: Dict[str, List[Dict]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        with PeakMemory() as memory:
+            yield
+        self.stages.append({
+            'stage': name,
+            'seconds': round(time.perf_counter() - started, 3),
+            'peakRssBytes': memory.peak_bytes,
+            'peakIncreaseBytes': memory.increase_bytes
+        })
+
+    def to_dict(self) -> Dict:
+        return {
+            'cpuCount': os.cpu_count(),
+            'stages': self.stages,
+            'metrics': self.metrics,
+            'candidates': self.candidates
+        }
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def print(self):
+        print(f"\n{'stage':<34} {'seconds':>9} {'peak RSS':>10} {'+RSS':>10}")
+        for stage in self.stages:
+            print(f"{stage['stage']:<34} {stage['seconds']:>9.2f} {format_bytes(stage['peakRssBytes']):>10} "
+                  f"{format_bytes(stage['peakIncreaseBytes']):>10}")
+        for name, candidates in self.candidates.items():
+            order = list(_PARAM_LABELS)
+            names = sorted(candidates[0]['params'],
+                           key=lambda param: order.index(param) if param in order else len(order))
+            print(f"\n{name} candidates")
+            print(' '.join(f"{_PARAM_LABELS.get(param, param):>5}" for param in names)
+                  + f" {'cv score':>15} {'holdout':>8} {'fit s':>7} {'p50 ms':>7} {'ms/row@64':>9} {'size':>9}")
+            for candidate in candidates:
+                params = candidate['params']
+                cv_score = ('-' if candidate['cvScore'] is None
+                            else f"{candidate['cvScore']:.4f}±{candidate['cvStd']:.4f}")
+                print(' '.join(f"{str(params[param]):>5}" for param in names)
+                      + f" {cv_score:>15} {candidate['holdoutScore']:>8.4f} "
+                      f"{candidate['fitSeconds']:>7.2f} {candidate['latency']['p50Ms']:>7.3f} "
+                      f"{candidate['latency']['batchMsPerRow']:>9.4f} {format_bytes(candidate['sizeBytes']):>9}"
+                      f"{'  <- selected' if candidate['selected'] else ''}")
+        if self.metrics:
+            print("\n" + ", ".join(f"{name}: {value:.4f}" for name, value in self.metrics.items()))
+
+
+def parse_grid(trees: Optional[str], depth: Optional[str], min_leaf: Optional[str], engine: str = 'forest',
+               learning_rate: Optional[str] = None) -> Dict[str, list]:
+    """
+    Grid from comma-separated CLI values ('none' for unlimited depth); unset
+    axes use the engine's DEFAULT_GRIDS entry. `trees` sets n_estimators for
+    forests and max_iter (boosting iterations) for boosting.
+    """
+    def values(text, default, convert):
+        return [convert(value.strip()) for value in text.split(',')] if text else default
+
+    default = DEFAULT_GRIDS[engine]
+    tree_param = 'n_estimators' if engine == 'forest' else 'max_iter'
+    grid = {
+        tree_param: values(trees, default[tree_param], int),
+        'max_depth': values(depth, default['max_depth'],
+                            lambda value: None if value.lower() == 'none' else int(value)),
+        'min_samples_leaf': values(min_leaf, default['min_samples_leaf'], int)
+    }
+    if engine == 'boosting':
+        grid['learning_rate'] = values(learning_rate, default['learning_rate'], float)
+    return grid
+
+
+def make_estimator(estimator_class, n_jobs: int, **params):
+    """An estimator with `params`, on `n_jobs` cores where it takes n_jobs (boosting uses OpenMP threads)."""
+    if 'n_jobs' in estimator_class().get_params():
+        params['n_jobs'] = n_jobs
+    return estimator_class(**params)
+
+
+def measure_latency(score: Callable[[np.ndarray], np.ndarray], X: np.ndarray, calls: int = 200) -> Dict[str, float]:
+    """Single-row latency percentiles and per-row cost in batches of `score`, e.g. a forest's predict."""
+    rows = X[:max(1, min(len(X), calls))]
+    score(rows[:1])
+
+    samples = []
+    for i in range(calls):
+        started = time.perf_counter()
+        score(rows[i % len(rows)][None, :])
+        samples.append(time.perf_counter() - started)
+
+    batch = X[:LATENCY_BATCH_ROWS]
+    repeats = max(1, calls // 20)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        score(batch)
+    batch_seconds = (time.perf_counter() - started) / repeats
+
+    return {
+        'p50Ms': round(float(np.percentile(samples, 50)) * 1000, 4),
+        'p95Ms': round(float(np.percentile(samples, 95)) * 1000, 4),
+        'batchMsPerRow': round(batch_seconds / len(batch) * 1000, 5)
+    }
+
+
+def evaluate(model, X_test, y_test) -> Dict:
+    """Holdout score, serving latency and artifact size of a fitted model."""
+    forest = compile_estimator(model)
+    if forest.kind == 'classifier':
+        score = forest.predict_proba
+    elif forest.engine == 'forest':
+        # The service also takes yield bounds from the trees' spread
+        score = functools.partial(forest.predict_interval, quantiles=YIELD_QUANTILES)
+    else:
+        score = forest.predict
+    return {
+        'holdoutScore': round(float(model.score(X_test, y_test)), 6),
+        'latency': measure_latency(score, X_test),
+        'sizeBytes': forest.nbytes,
+        'nodes': forest.n_nodes
+    }
+
+
+def search_forest(name: str, estimator_class, grid: Dict[str, Sequence], X_train, y_train, X_test, y_test,
+                  report: TrainingReport, cv: int = 3, n_jobs: int = -1, random_state: int = 42,
+                  max_latency_ms: Optional[float] = None):
+    """
+    Cross-validate every combination in `grid`, all folds of all candidates
+    in parallel, then refit each candidate on the training split to measure
+    its holdout score and serving cost. Returns the fitted model with the
+    best cross-validated score among those within `max_latency_ms` (p50,
+    one row), or the fastest one when none are.
+    """
+    with report.stage(f'{name} cross-validation'):
+        # One core per candidate fit; the candidates and folds run side by side
+        search = GridSearchCV(make_estimator(estimator_class, 1, random_state=random_state), grid, cv=cv,
+                              n_jobs=n_jobs, refit=False)
+        search.fit(X_train, y_train)
+
+    results = search.cv_results_
+    candidates = []
+    best_model, best_key = None, None
+    with report.stage(f'{name} candidate refits'):
+        for index, params in enumerate(results['params']):
+            started = time.perf_counter()
+            model = make_estimator(estimator_class, n_jobs, random_state=random_state, **params).fit(X_train, y_train)
+            candidate = {
+                'params': params,
+                'cvScore': round(float(results['mean_test_score'][index]), 6),
+                'cvStd': round(float(results['std_test_score'][index]), 6),
+                'fitSeconds': round(time.perf_counter() - started, 3),
+                **evaluate(model, X_test, y_test),
+                'selected': False
+            }
+            candidates.append(candidate)
+
+            # Within budget beats over budget, then higher CV score, then lower latency
+            within = max_latency_ms is None or candidate['latency']['p50Ms'] <= max_latency_ms
+            key = (within, candidate['cvScore'] if within else -candidate['latency']['p50Ms'],
+                   -candidate['latency']['p50Ms'])
+            if best_key is None or key > best_key:
+                best_model, best_key = model, key
+                for other in candidates:
+                    other['selected'] = other is candidate
+
+    if not best_key[0]:
+        print(f"No {name} candidate is within {max_latency_ms} ms, using the fastest one")
+    report.candidates[name] = candidates
+    return best_model
+
+
+def grid_size(grid: Dict[str, Sequence]) -> int:
+    return len(list(itertools.product(*grid.values())))
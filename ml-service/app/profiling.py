@@ -0,0 +1,220 @@
+"""
+On-demand profiling.
+Captures what a running worker is doing for the next N prediction requests
+or for a fixed time window, and reports cProfile statistics (pstats text)
+and collapsed stacks that flamegraph tools such as flamegraph.pl or
+speedscope turn into a flamegraph.
+
+The facility is off unless ADMIN_TOKEN is set, and nothing is installed on
+the request path while it is off.
+"""
+import asyncio
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+# Limits on a single capture
+MAX_CAPTURE_SECONDS = 300
+DEFAULT_WINDOW_SECONDS = 10
+DEFAULT_REQUEST_TIMEOUT_SECONDS = 60
+
+
+class ProfilerBusy(Exception):
+    """Raised when a capture is already running in this worker."""
+
+
+def short_path(filename: str) -> str:
+    """filename relative to the working directory or the sys.path entry it was imported from."""
+    for prefix in sorted({os.getcwd(), *sys.path}, key=len, reverse=True):
+        if prefix and filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1:]
+    return filename
+
+
+class _StackSampler(threading.Thread):
+    """
+    Samples the Python stack of every other thread in the process at a fixed
+    interval and counts identical stacks.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+        self._labels: Dict[object, str] = {}
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f'thread-{ident}'))
+                stack.reverse()
+                self.stacks[';'.join(stack)] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class ProfileCapture:
+    """
+    One capture. Prediction batches run through ``profile_call`` while it
+    is open are profiled with cProfile, one batch at a time so profiles
+    never overlap; the sampler covers every thread of the process.
+    """
+
+    def __init__(self, max_requests: Optional[int], seconds: float, interval_ms: float, use_cprofile: bool):
+        self.max_requests = max_requests
+        self.seconds = seconds
+        self.use_cprofile = use_cprofile
+        self.requests = 0
+        self.batches = 0
+        self.finished = asyncio.Event()
+        self.started = time.monotonic()
+        self.stopped: Optional[float] = None
+
+        self._profiles: List[cProfile.Profile] = []
+        self._profile_lock = threading.Lock()
+        self._closed = False
+        self._sampler = _StackSampler(interval_ms / 1000)
+        self._sampler.start()
+
+    def profile_call(self, fn: Callable, *args):
+        """Run fn(*args), profiled if the capture is still open. Safe from any thread."""
+        if not self.use_cprofile or self._closed:
+            return fn(*args)
+        with self._profile_lock:
+            if self._closed:
+                return fn(*args)
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                return fn(*args)
+            finally:
+                profile.disable()
+                self._profiles.append(profile)
+                self.batches += 1
+
+    def request_finished(self):
+        self.requests += 1
+        if self.max_requests is not None and self.requests >= self.max_requests:
+            self.finished.set()
+
+    def close(self):
+        with self._profile_lock:
+            self._closed = True
+        self._sampler.stop()
+        self.stopped = time.monotonic()
+
+    def pstats_text(self, sort: str = 'cumulative', limit: int = 50) -> Optional[str]:
+        if not self.use_cprofile:
+            return None
+        if not self._profiles:
+            return "No prediction batches ran during the capture.\n"
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profiles[0], stream=stream)
+        for profile in self._profiles[1:]:
+            stats.add(profile)
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def collapsed_text(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self._sampler.stacks.most_common())
+
+    def summary(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'maxRequests': self.max_requests,
+            'durationSeconds': round((self.stopped or time.monotonic()) - self.started, 3),
+            'profiledBatches': self.batches,
+            'samples': self._sampler.samples,
+            'intervalMs': round(self._sampler.interval * 1000, 3)
+        }
+
+
+class Profiler:
+    """
+    Per-worker entry point: authorizes admin calls, runs one capture at a
+    time and exposes the open capture to the executor and middleware.
+    """
+
+    def __init__(self, token: Optional[str] = None):
+        self.token = token if token is not None else os.getenv('ADMIN_TOKEN', '')
+        self.active: Optional[ProfileCapture] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token)
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return self.enabled and token is not None and hmac.compare_digest(token, self.token)
+
+    async def capture(self, max_requests: Optional[int] = None, seconds: Optional[float] = None,
+                      interval_ms: float = 5, use_cprofile: bool = True) -> ProfileCapture:
+        """
+        Profile until `max_requests` prediction requests have completed or
+        `seconds` have passed, whichever comes first. Without `max_requests`
+        this is a fixed window of `seconds`.
+        """
+        if self.active is not None:
+            raise ProfilerBusy("A profile capture is already running in this worker")
+        if seconds is None:
+            seconds = DEFAULT_WINDOW_SECONDS if max_requests is None else DEFAULT_REQUEST_TIMEOUT_SECONDS
+        seconds = min(seconds, MAX_CAPTURE_SECONDS)
+
+        capture = ProfileCapture(max_requests, seconds, interval_ms, use_cprofile)
+        self.active = capture
+        try:
+            await asyncio.wait_for(capture.finished.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.active = None
+            capture.close()
+        return capture
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware counting completed prediction requests towards the
+    open capture. Only installed when profiling is enabled.
+    """
+
+    def __init__(self, app, profiler: Profiler, path_prefix: str = '/predict'):
+        self.app = app
+        self.profiler = profiler
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        capture = self.profiler.active
+        if capture is None or scope['type'] != 'http' or not scope.get('path', '').startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            capture.request_finished()
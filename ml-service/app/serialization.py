@@ -0,0 +1,62 @@
+"""
+Response serialization.
+Encodes CropPredictor output straight to JSON bytes in the shape of
+PredictionResponse / BatchPredictionResponse, instead of validating it into
+the Pydantic models and serializing those again.
+
+orjson is used when installed; otherwise the standard library encoder.
+"""
+import json
+from typing import Dict, Optional, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+ENCODER = 'orjson' if orjson is not None else 'json'
+
+
+def json_default(value):
+    # NumPy scalars (e.g. float64 from a model) that slipped through as values
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(value) -> bytes:
+        """Compact UTF-8 JSON bytes."""
+        return orjson.dumps(value, default=json_default, option=_ORJSON_OPTIONS)
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=json_default)
+
+    def dumps(value) -> bytes:
+        """Compact UTF-8 JSON bytes."""
+        return _encoder.encode(value).encode('utf-8')
+
+
+def dump_predictions(prediction: Dict) -> bytes:
+    """A /predict response body (PredictionResponse) from a CropPredictor result."""
+    return dumps(prediction)
+
+
+def batch_response(results: Sequence[Tuple[Optional[Dict], Optional[str]]]) -> Dict:
+    """
+    The BatchPredictionResponse-shaped dict of (prediction, error) pairs,
+    one per item.
+    """
+    return {
+        'results': [{**prediction, 'error': error} if prediction is not None
+                    else {'recommendations': None, 'error': error} for prediction, error in results]
+    }
+
+
+def dump_batch(results: Sequence[Tuple[Optional[Dict], Optional[str]]]) -> bytes:
+    """
+    A /predict/batch response body (BatchPredictionResponse) from
+    (prediction, error) pairs, one per item.
+    """
+    return dumps(batch_response(results))
@@ -0,0 +1,129 @@
+"""
+Startup and readiness.
+Loads the model off the event loop when a worker starts, answers the /ready
+probe, and reports how long the worker took from importing the app to
+being ready and how much memory it holds once it is.
+
+Under gunicorn with preload_app (see gunicorn.conf.py) the model is loaded
+once in the parent process before the workers fork. The workers then share
+those pages copy-on-write and only mark themselves ready. With the process
+pool (PREDICT_EXECUTOR=process) the pool's workers load the model instead,
+and the server process never does.
+"""
+import asyncio
+import gc
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from app.memory import format_bytes, memory_breakdown, rss_bytes
+
+logger = logging.getLogger(__name__)
+
+
+class StartupFailed(Exception):
+    """Raised to requests waiting on a startup load that failed."""
+
+
+class Startup:
+    """Startup timeline and readiness of one worker process."""
+
+    def __init__(self):
+        self.imported = time.perf_counter()
+        self.import_pid = os.getpid()
+        self.preloaded = False
+        self.preload_seconds: Optional[float] = None
+        self.forked: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        # Engine the scoring workers ended up with, 'model' or 'rules'
+        self.engine: Optional[str] = None
+        # Why the startup load failed; the worker never becomes ready
+        self.error: Optional[str] = None
+        self.memory: Dict[str, int] = {}
+        self._loading: Optional[asyncio.Future] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def preload(self, executor):
+        """
+        Load and warm up the model in the parent process, before workers fork.
+        """
+        if executor.kind == 'process':
+            # Each worker's own process pool loads the model; the master has nothing to share
+            logger.info("Not preloading the model: it is loaded by the prediction process pools")
+            return
+        started = time.perf_counter()
+        executor.predictor.load_model()
+        self.preloaded = True
+        self.preload_seconds = time.perf_counter() - started
+        # Everything allocated so far outlives the workers. Freezing it keeps the
+        # garbage collector from writing to those objects, which would copy
+        # their pages into every worker.
+        gc.collect()
+        gc.freeze()
+        logger.info("Preloaded model in pid %d in %.3fs, RSS %s", os.getpid(), self.preload_seconds,
+                    format_bytes(rss_bytes()))
+
+    def after_fork(self):
+        self.forked = time.perf_counter()
+
+    def begin(self, executor):
+        """
+        Start loading the model on a background thread. /health answers
+        straight away; /ready reports 503 until the load has finished. If
+        the load fails, /ready and /health report the failure for good.
+        """
+        loop = asyncio.get_running_loop()
+        self._loading = asyncio.ensure_future(loop.run_in_executor(None, self._load, executor))
+
+    def _load(self, executor):
+        # A no-op when the parent process already loaded the model
+        try:
+            engine = executor.load()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            logger.exception("Worker %d failed to load the model", os.getpid())
+            return
+        self.engine = engine
+        ready_at = self.ready_at = time.perf_counter()
+        self.memory = memory_breakdown()
+        forked = (f", {ready_at - self.forked:.3f}s after fork" if self.forked is not None else "")
+        logger.info(
+            "Worker %d ready %.3fs after import%s (model %s), RSS %s, shared %s, private %s",
+            os.getpid(), ready_at - self.imported, forked,
+            'preloaded' if self.preloaded else 'loaded in worker',
+            format_bytes(self.memory.get('rssBytes', 0)), format_bytes(self.memory.get('sharedBytes', 0)),
+            format_bytes(self.memory.get('privateBytes', 0))
+        )
+
+    async def wait_ready(self):
+        """Wait for the startup load, if one is running. Raises StartupFailed if it failed."""
+        if self.ready_at is None and self._loading is not None:
+            await asyncio.shield(self._loading)
+        if self.error is not None:
+            raise StartupFailed(f"Model failed to load: {self.error}")
+
+    async def stop(self):
+        if self._loading is not None and not self._loading.done():
+            await asyncio.wait([self._loading])
+
+    def report(self) -> Dict:
+        return {
+            'pid': os.getpid(),
+            'ready': self.ready,
+            'engine': self.engine,
+            'error': self.error,
+            'preloaded': self.preloaded,
+            'preloadSeconds': round(self.preload_seconds, 4) if self.preload_seconds is not None else None,
+            'importToReadySeconds': round(self.ready_at - self.imported, 4) if self.ready else None,
+            'forkToReadySeconds': (round(self.ready_at - self.forked, 4)
+                                   if self.ready and self.forked is not None else None),
+            'memory': self.memory
+        }
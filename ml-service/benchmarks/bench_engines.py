@@ -0,0 +1,96 @@
+"""
+Training engine benchmark.
+Fits the RandomForest and HistGradientBoosting engines (train_model
+--engine) on the same split of the training data, with the settings
+train_model uses without --search, and compares them as served: fit time,
+artifact size, load time, single-row and batch latency of a full model
+call (crop probabilities and yield), crop accuracy and yield R².
+
+Usage (from ml-service/):
+    python -m benchmarks.bench_engines --data data/training_data.csv [--output engines.json]
+"""
+import argparse
+import json
+import tempfile
+import time
+from typing import Dict
+
+import numpy as np
+from sklearn.metrics import r2_score
+from sklearn.model_selection import train_test_split
+
+from app.memory import format_bytes
+from app.models.train_model import ENGINES, DEFAULT_CHUNK_ROWS, load_training_data, prepare_features
+from app.models.trained_model import TrainedModel, save_artifacts
+from app.models.tuning import make_estimator, measure_latency
+
+
+def bench_engine(engine: str, split, pipeline, n_jobs: int, calls: int) -> Dict:
+    X_train, X_test, y_crop_train, y_crop_test, y_yield_train, y_yield_test = split
+    classifier_class, regressor_class, settings = ENGINES[engine]
+
+    started = time.perf_counter()
+    classifier = make_estimator(classifier_class, n_jobs, random_state=42, **settings).fit(X_train, y_crop_train)
+    regressor = make_estimator(regressor_class, n_jobs, random_state=42, **settings).fit(X_train, y_yield_train)
+    fit_seconds = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        manifest = save_artifacts(classifier, regressor, pipeline, model_dir)
+        model = TrainedModel.load(model_dir)
+        model.warm_up()
+        crops = np.asarray(model.crops)
+        predicted = crops[model.predict_proba(X_test).argmax(axis=1)]
+        accuracy = float(np.mean(predicted == np.asarray(y_crop_test, dtype=str)))
+        r2 = float(r2_score(y_yield_test, model.predict_yield(X_test)))
+        latency = measure_latency(
+            lambda rows: (model.predict_proba(rows), model.predict_yield_interval(rows)), X_test, calls
+        )
+        trees = model.crop_classifier.n_trees + model.yield_regressor.n_trees
+        del model
+
+    return {
+        'engine': engine,
+        'fitSeconds': round(fit_seconds, 3),
+        'sizeBytes': sum(entry['bytes'] for entry in manifest['files'].values()),
+        'trees': trees,
+        'latency': latency,
+        'cropAccuracy': round(accuracy, 6),
+        'yieldR2': round(r2, 6)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data', default='./data/training_data.csv', help='Training data (.csv or .parquet)')
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES), default=['forest', 'boosting'])
+    parser.add_argument('--n-jobs', type=int, default=-1, help='Cores used for fitting forests (-1: all)')
+    parser.add_argument('--calls', type=int, default=200, help='Calls per latency measurement')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    df = load_training_data(args.data, args.chunk_rows)
+    if df is None:
+        return
+    X, y_crop, y_yield, pipeline = prepare_features(df)
+    # The split train_model evaluates on
+    split = train_test_split(X, y_crop, y_yield, test_size=0.2, random_state=42)
+
+    results = []
+    print(f"\n{'engine':<9} {'fit s':>7} {'size':>9} {'trees':>6} {'p50 ms':>7} {'p95 ms':>7} {'ms/row@64':>9} "
+          f"{'accuracy':>8} {'R²':>7}")
+    for engine in args.engines:
+        row = bench_engine(engine, split, pipeline, args.n_jobs, args.calls)
+        results.append(row)
+        print(f"{engine:<9} {row['fitSeconds']:>7.2f} {format_bytes(row['sizeBytes']):>9} {row['trees']:>6} "
+              f"{row['latency']['p50Ms']:>7.3f} {row['latency']['p95Ms']:>7.3f} "
+              f"{row['latency']['batchMsPerRow']:>9.4f} {row['cropAccuracy']:>8.4f} {row['yieldR2']:>7.4f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'benchmark': 'engines', 'rows': len(X), 'results': results}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
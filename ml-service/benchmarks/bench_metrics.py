@@ -0,0 +1,131 @@
+"""
+Metrics overhead benchmark.
+Measures what the /metrics instrumentation costs by timing the same work
+with it switched on and off:
+
+    predict   CropPredictor.predict_batch with and without stage timings
+    http      /predict through FastAPI's TestClient with metrics enabled and disabled
+
+Runs alternate between on and off so machine noise affects both equally,
+and the medians of the rounds are compared. Exits non-zero when the
+overhead is above --max-overhead.
+
+Usage (from ml-service/):
+    python -m benchmarks.bench_metrics [--rounds 7] [--max-overhead 0.05] [--output metrics.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict
+
+# Score every request on its own and skip the cache so each call does the full work
+os.environ.setdefault('BATCH_WINDOW_MS', '0')
+os.environ.setdefault('CACHE_MAX_ENTRIES', '0')
+os.environ.setdefault('PREDICTOR_MODE', 'rules')
+
+from app.metrics import StageTimings
+from app.models.predictor import CropPredictor
+from benchmarks.synthetic import make_features, to_request
+
+SEASONS = ('Kharif', 'Rabi', 'Zaid')
+
+
+def round_ms(fn: Callable[[int], object], calls: int) -> float:
+    """Mean milliseconds per call over one round of `calls` calls."""
+    started = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - started) / calls * 1000
+
+
+def compare_rounds(name: str, off: Callable[[int], object], on: Callable[[int], object],
+                   calls: int, rounds: int) -> Dict:
+    off_ms, on_ms = [], []
+    # Untimed warm-up of both variants
+    round_ms(off, min(calls, 50))
+    round_ms(on, min(calls, 50))
+    for _ in range(rounds):
+        off_ms.append(round_ms(off, calls))
+        on_ms.append(round_ms(on, calls))
+    off_median = statistics.median(off_ms)
+    on_median = statistics.median(on_ms)
+    return {
+        'benchmark': name,
+        'offMs': round(off_median, 5),
+        'onMs': round(on_median, 5),
+        'overheadMs': round(on_median - off_median, 5),
+        'overhead': round((on_median - off_median) / off_median, 4)
+    }
+
+
+def bench_predict(calls: int, rounds: int, batch_size: int) -> Dict:
+    predictor = CropPredictor(mode='rules')
+    features = make_features(calls * batch_size, seasons=SEASONS)
+
+    def batch(i):
+        return features[i * batch_size:(i + 1) * batch_size]
+
+    return compare_rounds(
+        f'predict_batch/size={batch_size}',
+        lambda i: predictor.predict_batch(batch(i)),
+        lambda i: predictor.predict_batch(batch(i), timings=StageTimings()),
+        calls, rounds
+    )
+
+
+def bench_http(calls: int, rounds: int) -> Dict:
+    from fastapi.testclient import TestClient
+    from app.main import app, metrics
+
+    bodies = [to_request(item) for item in make_features(calls, seasons=SEASONS)]
+
+    with TestClient(app) as client:
+        def post(i):
+            client.post('/predict', json=bodies[i]).raise_for_status()
+
+        def post_with(enabled: bool):
+            def call(i):
+                metrics.enabled = enabled
+                post(i)
+            return call
+
+        result = compare_rounds('http/predict', post_with(False), post_with(True), calls, rounds)
+        metrics.enabled = True
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Metrics instrumentation overhead")
+    parser.add_argument('--calls', type=int, default=500, help='Calls per round')
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--max-overhead', type=float, default=0.05,
+                        help='Fail when instrumentation adds more than this fraction (default: %(default)s)')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    results = [
+        bench_predict(args.calls, args.rounds, 1),
+        bench_predict(max(1, args.calls // 16), args.rounds, 64),
+        bench_http(args.calls, args.rounds)
+    ]
+
+    print(f"{'benchmark':<26} {'off ms':>9} {'on ms':>9} {'overhead':>9}")
+    for row in results:
+        print(f"{row['benchmark']:<26} {row['offMs']:>9.4f} {row['onMs']:>9.4f} {row['overhead']:>+8.1%}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'benchmark': 'metrics_overhead', 'results': results}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+    worst = max(row['overhead'] for row in results)
+    if worst > args.max_overhead:
+        print(f"Instrumentation overhead {worst:.1%} is above {args.max_overhead:.1%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Candidate pruning benchmark.
+Compares scoring every crop (CropTable.score) with scoring only the
+season's plausible candidates (CropTable.score_candidates) across
+catalog sizes and minimum scores.
+
+Usage:
+    python -m benchmarks.bench_pruning [--sizes 100 1000 5000 20000] [--output pruning.json]
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app.models.predictor import CropTable
+from benchmarks.synthetic import make_catalog, make_features
+
+
+def time_per_request(fn, requests: int) -> float:
+    """Mean milliseconds per call of fn(i) over `requests` calls."""
+    started = time.perf_counter()
+    for i in range(requests):
+        fn(i)
+    return (time.perf_counter() - started) / requests * 1000
+
+
+def bench_size(size: int, min_scores: List[float], requests: int) -> List[Dict]:
+    table = CropTable(make_catalog(size))
+    values, seasons = table.encode(make_features(requests))
+    results = []
+
+    full_ms = time_per_request(lambda i: table.score(values[i:i + 1], seasons[i:i + 1]), requests)
+
+    for min_score in min_scores:
+        thresholds = np.full(1, float(min_score))
+        scored = []
+
+        def pruned(i):
+            groups = table.score_candidates(values[i:i + 1], seasons[i:i + 1], thresholds)
+            scored.append(sum(len(crop_ids) for _, crop_ids, _, _ in groups))
+
+        pruned_ms = time_per_request(pruned, requests)
+        results.append({
+            'catalogSize': size,
+            'minScore': min_score,
+            'fullMs': round(full_ms, 4),
+            'prunedMs': round(pruned_ms, 4),
+            'speedup': round(full_ms / pruned_ms, 2) if pruned_ms else None,
+            'meanCropsScored': round(float(np.mean(scored)), 1),
+            'fractionScored': round(float(np.mean(scored)) / size, 4)
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000, 20000])
+    parser.add_argument('--min-scores', type=float, nargs='+', default=[30, 75, 90])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'crops':>7} {'min':>5} {'full ms':>9} {'pruned ms':>10} {'speedup':>8} {'scored':>8}")
+    for size in args.sizes:
+        for row in bench_size(size, args.min_scores, args.requests):
+            results.append(row)
+            print(f"{row['catalogSize']:>7} {row['minScore']:>5g} {row['fullMs']:>9.3f} "
+                  f"{row['prunedMs']:>10.3f} {row['speedup']:>7.2f}x {row['fractionScored']:>7.1%}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'benchmark': 'pruning', 'results': results}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
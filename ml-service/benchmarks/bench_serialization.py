@@ -0,0 +1,128 @@
+"""
+Response serialization benchmark.
+Compares the cost per response of:
+
+    fastapi_response_model   the original path: the endpoint returns a
+                             PredictionResponse and FastAPI's response_model
+                             handling dumps, re-validates and re-encodes it
+    pydantic_model_dump      PredictionResponse(...).model_dump_json()
+    direct_json              app.serialization with the standard library encoder
+    direct_orjson            app.serialization with orjson (when installed)
+
+on real predictor output, and checks that every path produces the same bytes.
+
+Usage (from ml-service/):
+    python -m benchmarks.bench_serialization [--calls 2000] [--output serialization.json]
+"""
+import argparse
+import json
+import time
+from typing import Callable, Dict, List
+
+from pydantic import TypeAdapter
+
+from app.main import BatchPredictionResponse, BatchPredictionResult, PredictionResponse
+from app.models.predictor import CropPredictor
+from app.serialization import json_default
+from benchmarks.synthetic import make_features
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SEASONS = ('Kharif', 'Rabi', 'Zaid')
+
+
+def fastapi_response_model(adapter: TypeAdapter, content) -> bytes:
+    """What FastAPI does with a returned model when response_model is set."""
+    prepared = content.model_dump(by_alias=True, exclude_unset=True)
+    value = adapter.validate_python(prepared)
+    data = adapter.dump_python(value, mode='json', by_alias=True, exclude_unset=True)
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def encoders(model_type, wrap: Callable, payload: Callable) -> Dict[str, Callable]:
+    adapter = TypeAdapter(model_type)
+    stdlib = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=json_default)
+    paths = {
+        'fastapi_response_model': lambda data: fastapi_response_model(adapter, wrap(data)),
+        'pydantic_model_dump': lambda data: wrap(data).model_dump_json(exclude_unset=True).encode('utf-8'),
+        'direct_json': lambda data: stdlib.encode(payload(data)).encode('utf-8')
+    }
+    if orjson is not None:
+        paths['direct_orjson'] = lambda data: orjson.dumps(payload(data), default=json_default,
+                                                           option=orjson.OPT_SERIALIZE_NUMPY)
+    return paths
+
+
+def bench(name: str, paths: Dict[str, Callable], inputs: List, calls: int) -> List[Dict]:
+    results = []
+    reference = [paths['fastapi_response_model'](data) for data in inputs]
+    for path, encode in paths.items():
+        identical = all(encode(data) == expected for data, expected in zip(inputs, reference))
+        for data in inputs[:50]:
+            encode(data)
+        started = time.perf_counter()
+        for i in range(calls):
+            encode(inputs[i % len(inputs)])
+        per_call = (time.perf_counter() - started) / calls
+        results.append({
+            'benchmark': name,
+            'path': path,
+            'usPerResponse': round(per_call * 1e6, 2),
+            'bytes': round(sum(len(body) for body in reference) / len(reference)),
+            'identical': identical
+        })
+    baseline = results[0]['usPerResponse']
+    for row in results:
+        row['speedup'] = round(baseline / row['usPerResponse'], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response serialization cost per request")
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    predictor = CropPredictor(mode='rules')
+    features = make_features(max(args.calls, args.batch_size), seasons=SEASONS)
+    predictions = predictor.predict_batch(features)
+
+    single = encoders(
+        PredictionResponse,
+        lambda prediction: PredictionResponse(**prediction),
+        lambda prediction: prediction
+    )
+    batches = [
+        [(prediction, None) for prediction in predictions[start:start + args.batch_size]]
+        for start in range(0, len(predictions) - args.batch_size + 1, args.batch_size)
+    ]
+    batch = encoders(
+        BatchPredictionResponse,
+        lambda items: BatchPredictionResponse(results=[
+            BatchPredictionResult(**prediction, error=error) for prediction, error in items
+        ]),
+        lambda items: {'results': [{**prediction, 'error': error} for prediction, error in items]}
+    )
+
+    results = bench('/predict', single, predictions, args.calls)
+    results += bench(f'/predict/batch size={args.batch_size}', batch, batches,
+                     max(1, args.calls // args.batch_size))
+
+    print(f"{'response':<28} {'path':<24} {'us/response':>12} {'speedup':>8} {'bytes':>8} {'same':>5}")
+    for row in results:
+        print(f"{row['benchmark']:<28} {row['path']:<24} {row['usPerResponse']:>12.2f} "
+              f"{row['speedup']:>7.2f}x {row['bytes']:>8} {str(row['identical']):>5}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'benchmark': 'serialization', 'results': results}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
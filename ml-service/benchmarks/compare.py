@@ -0,0 +1,109 @@
+"""
+Compare benchmark results against a stored baseline.
+
+Every numeric metric is compared by name. Metrics ending in ``Ms`` or
+``Bytes`` regress when they grow and metrics ending in ``PerSecond``
+regress when they shrink; anything else is informational.
+
+Usage:
+    python -m benchmarks.compare results.json baseline.json [--threshold 0.2]
+        [--metric-threshold p99Ms=0.5 ...]
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional
+
+DEFAULT_THRESHOLD = 0.2
+
+LOWER_IS_BETTER = ('Ms', 'Bytes')
+HIGHER_IS_BETTER = ('PerSecond',)
+
+
+def metric_direction(metric: str) -> Optional[int]:
+    """+1 if larger values are better, -1 if smaller ones are, None if not compared."""
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    return None
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD,
+            metric_thresholds: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """
+    Compare two results documents written by benchmarks.run.
+
+    Returns one row per metric present in both, with the relative change
+    (positive = worse) and whether it exceeds its threshold.
+    """
+    metric_thresholds = metric_thresholds or {}
+    rows = []
+    for name, metrics in current.get('results', {}).items():
+        base_metrics = baseline.get('results', {}).get(name)
+        if not base_metrics:
+            continue
+        for metric, value in metrics.items():
+            direction = metric_direction(metric)
+            base_value = base_metrics.get(metric)
+            if direction is None or not isinstance(value, (int, float)) or not isinstance(base_value, (int, float)):
+                continue
+            if base_value == 0:
+                change = 0.0 if value == 0 else float('inf')
+            else:
+                change = (value - base_value) / base_value * -direction
+            limit = metric_thresholds.get(metric, threshold)
+            rows.append({
+                'benchmark': name,
+                'metric': metric,
+                'baseline': base_value,
+                'current': value,
+                'change': change,
+                'threshold': limit,
+                'regressed': change > limit
+            })
+    return rows
+
+
+def print_report(rows: List[Dict]):
+    print(f"{'benchmark':<32} {'metric':<18} {'baseline':>12} {'current':>12} {'change':>8}")
+    for row in rows:
+        flag = '  REGRESSED' if row['regressed'] else ''
+        print(f"{row['benchmark']:<32} {row['metric']:<18} {row['baseline']:>12.4g} "
+              f"{row['current']:>12.4g} {row['change']:>+7.1%}{flag}")
+    regressions = sum(row['regressed'] for row in rows)
+    print(f"\n{len(rows)} metrics compared, {regressions} regressed")
+
+
+def parse_metric_thresholds(values: List[str]) -> Dict[str, float]:
+    thresholds = {}
+    for value in values or []:
+        metric, _, limit = value.partition('=')
+        if not metric or not limit:
+            raise ValueError(f"expected METRIC=THRESHOLD, got '{value}'")
+        thresholds[metric] = float(limit)
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare benchmark results against a baseline")
+    parser.add_argument('results', help='Results JSON from benchmarks.run')
+    parser.add_argument('baseline', help='Baseline results JSON')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed relative regression (default: %(default)s)')
+    parser.add_argument('--metric-threshold', action='append', metavar='METRIC=THRESHOLD',
+                        help='Override the threshold for one metric, e.g. p99Ms=0.5')
+    args = parser.parse_args()
+
+    with open(args.results) as f:
+        current = json.load(f)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    rows = compare(current, baseline, args.threshold, parse_metric_thresholds(args.metric_threshold))
+    print_report(rows)
+    sys.exit(1 if any(row['regressed'] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+ML service benchmark suite.
+Measures the prediction hot paths on synthetic crop catalogs and request
+features and writes the results as JSON:
+
+    suitability   CropPredictor._calculate_suitability_score, one crop per call
+    predict       CropPredictor.predict, one request per call
+    batch         CropPredictor.predict_batch throughput (model mode too with --model-path)
+    http          /predict and /predict/batch through FastAPI's TestClient
+    memory        tracemalloc peak and retained bytes per predict call
+
+Usage (from ml-service/):
+    python -m benchmarks.run [--suites predict batch] [--sizes 8 1000] [--output results.json]
+        [--baseline baseline.json --threshold 0.2]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.models.crop_catalog import DEFAULT_CATALOG_PATH
+from app.models.predictor import CropPredictor
+from app.models.trained_model import artifacts_exist, resolve_model_dir
+from benchmarks.compare import DEFAULT_THRESHOLD, compare, parse_metric_thresholds, print_report
+from benchmarks.synthetic import make_catalog, make_features, to_request, write_catalog
+
+SUITES = ('suitability', 'predict', 'batch', 'http', 'memory')
+
+
+def summarize(samples_ns: List[int]) -> Dict:
+    """Latency percentiles in milliseconds for per-call timings in nanoseconds."""
+    samples = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        'calls': len(samples),
+        'meanMs': round(float(samples.mean()), 5),
+        'p50Ms': round(float(p50), 5),
+        'p95Ms': round(float(p95), 5),
+        'p99Ms': round(float(p99), 5),
+        'callsPerSecond': round(len(samples) / (samples.sum() / 1000), 1)
+    }
+
+
+def time_calls(fn: Callable[[int], object], calls: int, warmup: int) -> Dict:
+    """Time fn(i) for i in range(calls) after `warmup` untimed calls."""
+    for i in range(warmup):
+        fn(i)
+    samples = []
+    clock = time.perf_counter_ns
+    for i in range(calls):
+        started = clock()
+        fn(i)
+        samples.append(clock() - started)
+    return summarize(samples)
+
+
+class Workload:
+    """Synthetic catalog written to disk plus request features sampled for it."""
+
+    def __init__(self, size: Optional[int], requests: int, workdir: str):
+        self.size = size
+        if size is None:
+            # The shipped knowledge base
+            self.path = DEFAULT_CATALOG_PATH
+            self.label = 'crops=default'
+            features = make_features(requests, seasons=('Kharif', 'Rabi', 'Zaid'))
+        else:
+            self.path = write_catalog(make_catalog(size), os.path.join(workdir, f'crops_{size}.json'))
+            self.label = f'crops={size}'
+            features = make_features(requests)
+        self.features = features
+
+    def predictor(self, mode: str = 'rules', model_path: Optional[str] = None) -> CropPredictor:
+        predictor = CropPredictor(model_path=model_path, mode=mode, crop_db_path=self.path)
+        predictor.load_model()
+        return predictor
+
+    def feature(self, i: int) -> Dict:
+        return self.features[i % len(self.features)]
+
+
+def bench_suitability(workload: Workload, args) -> Dict[str, Dict]:
+    predictor = workload.predictor()
+    crops = list(predictor.crops.values())
+    count = len(crops)
+
+    def call(i):
+        predictor._calculate_suitability_score(crops[i % count], workload.feature(i))
+
+    return {f'suitability/{workload.label}': time_calls(call, args.calls, args.warmup)}
+
+
+def bench_predict(workload: Workload, args) -> Dict[str, Dict]:
+    results = {}
+    modes = ['rules']
+    if args.model_path and artifacts_exist(resolve_model_dir(args.model_path)):
+        modes.append('model')
+    for mode in modes:
+        predictor = workload.predictor(mode, args.model_path)
+        results[f'predict/{mode}/{workload.label}'] = time_calls(
+            lambda i: predictor.predict(workload.feature(i)), args.calls, args.warmup
+        )
+    return results
+
+
+def bench_batch(workload: Workload, args) -> Dict[str, Dict]:
+    results = {}
+    # Rules results keep their original names; model mode is added when artifacts exist
+    modes = [('rules', '')]
+    if args.model_path and artifacts_exist(resolve_model_dir(args.model_path)):
+        modes.append(('model', 'model/'))
+    for mode, prefix in modes:
+        predictor = workload.predictor(mode, args.model_path)
+        for batch_size in args.batch_sizes:
+            batches = max(5, args.calls // batch_size)
+            features = [workload.feature(i) for i in range(batch_size * batches)]
+
+            def call(i):
+                predictor.predict_batch(features[i * batch_size:(i + 1) * batch_size])
+
+            summary = time_calls(call, batches, min(args.warmup, batches))
+            summary['batchSize'] = batch_size
+            summary['itemsPerSecond'] = round(summary['callsPerSecond'] * batch_size, 1)
+            results[f'batch/{prefix}{workload.label}/size={batch_size}'] = summary
+    return results
+
+
+def bench_memory(workload: Workload, args) -> Dict[str, Dict]:
+    predictor = workload.predictor()
+    calls = min(args.calls, 500)
+    for i in range(args.warmup):
+        predictor.predict(workload.feature(i))
+
+    gc.collect()
+    peaks = []
+    retained = []
+    tracemalloc.start()
+    try:
+        for i in range(calls):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            predictor.predict(workload.feature(i))
+            after, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(after - before)
+    finally:
+        tracemalloc.stop()
+
+    return {f'memory/{workload.label}': {
+        'calls': calls,
+        'meanPeakBytes': int(np.mean(peaks)),
+        'maxPeakBytes': int(np.max(peaks)),
+        'meanRetainedBytes': round(float(np.mean(retained)), 1)
+    }}
+
+
+def bench_http(args) -> Dict[str, Dict]:
+    """
+    /predict and /predict/batch through the full FastAPI stack in-process.
+    The result cache is off unless CACHE_MAX_ENTRIES is set, so every
+    request reaches the predictor.
+    """
+    os.environ.setdefault('CACHE_MAX_ENTRIES', '0')
+    os.environ.setdefault('PREDICTOR_MODE', 'rules')
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    features = make_features(max(args.calls, 1), seasons=('Kharif', 'Rabi', 'Zaid'))
+    bodies = [to_request(item) for item in features]
+    results = {}
+
+    with TestClient(app) as client:
+        def predict(i):
+            response = client.post('/predict', json=bodies[i % len(bodies)])
+            response.raise_for_status()
+
+        results['http/predict'] = time_calls(predict, args.calls, args.warmup)
+
+        batch_size = 100
+        batches = max(5, args.calls // batch_size)
+
+        def predict_batch(i):
+            chunk = [bodies[(i * batch_size + j) % len(bodies)] for j in range(batch_size)]
+            response = client.post('/predict/batch', json={'requests': chunk})
+            response.raise_for_status()
+
+        summary = time_calls(predict_batch, batches, min(args.warmup, batches))
+        summary['batchSize'] = batch_size
+        summary['itemsPerSecond'] = round(summary['callsPerSecond'] * batch_size, 1)
+        results[f'http/predict_batch/size={batch_size}'] = summary
+    return results
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpuCount': os.cpu_count()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ML service benchmark suite")
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=list(SUITES))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000],
+                        help='Synthetic catalog sizes, in addition to the shipped catalog')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 64, 256])
+    parser.add_argument('--calls', type=int, default=1000, help='Timed calls per benchmark')
+    parser.add_argument('--warmup', type=int, default=50, help='Untimed calls before timing')
+    parser.add_argument('--model-path', default=os.getenv('MODEL_PATH'),
+                        help='Also benchmark model mode when trained artifacts exist here')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument('--baseline', help='Compare against this results JSON and fail on regressions')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed relative regression against the baseline (default: %(default)s)')
+    parser.add_argument('--metric-threshold', action='append', metavar='METRIC=THRESHOLD',
+                        help='Override the threshold for one metric, e.g. p99Ms=0.5')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        workloads = [Workload(None, args.calls, workdir)]
+        workloads.extend(Workload(size, args.calls, workdir) for size in args.sizes)
+        benches = {'suitability': bench_suitability, 'predict': bench_predict,
+                   'batch': bench_batch, 'memory': bench_memory}
+
+        for suite in args.suites:
+            if suite == 'http':
+                results.update(bench_http(args))
+                continue
+            for workload in workloads:
+                results.update(benches[suite](workload, args))
+
+    for name, metrics in results.items():
+        shown = ', '.join(f'{metric}={value}' for metric, value in metrics.items() if metric != 'calls')
+        print(f"{name:<40} {shown}")
+
+    document = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(document, baseline, args.threshold, parse_metric_thresholds(args.metric_threshold))
+        print()
+        print_report(rows)
+        if any(row['regressed'] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Synthetic crop catalogs and request features for benchmarks.
+Ranges and feature distributions are centred on the shipped crop profiles
+so scores spread realistically across the 0-100 range.
+"""
+import json
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from app.models.crop_catalog import RANGE_KEYS, load_crop_catalog
+
+SEASONS = ('Kharif', 'Rabi', 'Zaid', 'Summer', 'Winter', 'Autumn')
+
+STATES = ('Gujarat', 'Maharashtra', 'Punjab', 'Karnataka', 'Bihar', 'Odisha')
+
+
+def make_catalog(size: int, seasons: Sequence[str] = SEASONS, seed: int = 0) -> Dict[str, Dict]:
+    """
+    Catalog of `size` crop/variety profiles derived from the shipped crops
+    by jittering their ranges and assigning one or two seasons.
+    """
+    rng = np.random.default_rng(seed)
+    base = list(load_crop_catalog().values())
+    crops = {}
+    for number in range(size):
+        template = base[number % len(base)]
+        profile = {}
+        for key in RANGE_KEYS:
+            low, high = template[key]
+            width = high - low
+            shift = rng.normal(0, width * 0.3)
+            scale = rng.uniform(0.6, 1.4)
+            new_low = low + shift
+            profile[key] = (round(new_low, 2), round(new_low + width * scale, 2))
+        count = 1 if rng.random() < 0.7 else 2
+        profile['season'] = list(rng.choice(seasons, size=count, replace=False))
+        profile['base_yield'] = round(float(template['base_yield'] * rng.uniform(0.7, 1.3)), 1)
+        crops[f"Variety {number}"] = profile
+    return crops
+
+
+def write_catalog(crops: Dict[str, Dict], path: str) -> str:
+    """Write a catalog in the JSON format read by CROP_DB_PATH."""
+    entries = []
+    for name, profile in crops.items():
+        entry = {'name': name, 'season': list(profile['season']), 'base_yield': profile['base_yield']}
+        entry.update((key, list(profile[key])) for key in RANGE_KEYS)
+        entries.append(entry)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'crops': entries}, f)
+    return path
+
+
+def make_features(count: int, seasons: Sequence[str] = SEASONS, seed: int = 1) -> List[Dict]:
+    """Predictor feature dicts sampled around typical district aggregates."""
+    rng = np.random.default_rng(seed)
+    features = []
+    for number in range(count):
+        features.append({
+            'state': str(rng.choice(STATES)),
+            'district': f"District {number % 600}",
+            'season': str(rng.choice(seasons)),
+            'soil_ph': round(float(rng.normal(6.6, 0.7)), 2),
+            'soil_organic_carbon': round(float(rng.uniform(0.2, 1.5)), 2),
+            'soil_nitrogen': round(float(rng.normal(130, 45)), 1),
+            'soil_phosphorus': round(float(rng.normal(28, 10)), 1),
+            'soil_potassium': round(float(rng.normal(180, 60)), 1),
+            'avg_temperature': round(float(rng.normal(25, 5)), 1),
+            'avg_rainfall': round(float(rng.lognormal(6.7, 0.5)), 1),
+            'avg_humidity': round(float(rng.uniform(30, 90)), 1)
+        })
+    return features
+
+
+def to_request(features: Dict) -> Dict:
+    """The /predict request body that produces the given features."""
+    return {
+        'state': features['state'],
+        'district': features['district'],
+        'season': features['season'],
+        'soil': {
+            'ph': features['soil_ph'],
+            'organicCarbon': features['soil_organic_carbon'],
+            'nitrogen': features['soil_nitrogen'],
+            'phosphorus': features['soil_phosphorus'],
+            'potassium': features['soil_potassium']
+        },
+        'weather': {
+            'avgTemperature': features['avg_temperature'],
+            'avgRainfall': features['avg_rainfall'],
+            'avgHumidity': features['avg_humidity']
+        }
+    }
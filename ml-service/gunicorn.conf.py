@@ -0,0 +1,30 @@
+"""
+Gunicorn settings for the preload-and-fork worker model:
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+The app, crop table and model artifacts are loaded once in the master
+process and inherited copy-on-write by the uvicorn workers forked from it,
+instead of every worker loading its own copy.
+"""
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+worker_class = 'uvicorn.workers.UvicornWorker'
+preload_app = os.getenv('PRELOAD_MODEL', 'true').lower() not in ('0', 'false', 'no')
+# Allow for model loading in workers when preloading is off
+timeout = int(os.getenv('WORKER_TIMEOUT', '120'))
+
+
+def when_ready(server):
+    # The app module has been imported in the master by now
+    if preload_app:
+        from app.main import executor, startup
+        startup.preload(executor)
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app.main import startup
+        startup.after_fork()
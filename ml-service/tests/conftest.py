@@ -0,0 +1,85 @@
+"""
+Shared fixtures: synthetic request features, training data and small
+fitted models.
+"""
+import os
+
+# The service is configured from the environment when app.main is imported
+os.environ.setdefault('PREDICTOR_MODE', 'rules')
+os.environ.setdefault('CROP_DB_RELOAD_INTERVAL', '0')
+
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from app.models.train_model import prepare_features, save_models
+from benchmarks.synthetic import make_features
+
+SEASONS = ('Kharif', 'Rabi', 'Zaid')
+# Quinoa is not in the rule engine's crop database
+CROPS = ('Rice', 'Wheat', 'Maize', 'Quinoa')
+
+
+@pytest.fixture
+def request_features() -> List[Dict]:
+    """Predictor feature dicts in the seasons of the shipped crop database."""
+    return make_features(50, seasons=SEASONS, seed=7)
+
+
+def training_frame(rows: int = 400, seed: int = 0) -> pd.DataFrame:
+    """A training frame in train_model's column layout, with learnable labels."""
+    features = make_features(rows, seasons=SEASONS, seed=seed)
+    df = pd.DataFrame({
+        'state': [f['state'] for f in features],
+        'district': [f['district'] for f in features],
+        'season': [f['season'] for f in features],
+        'soil_ph': [f['soil_ph'] for f in features],
+        'soil_oc': [f['soil_organic_carbon'] for f in features],
+        'soil_n': [f['soil_nitrogen'] for f in features],
+        'soil_p': [f['soil_phosphorus'] for f in features],
+        'soil_k': [f['soil_potassium'] for f in features],
+        'avg_temp': [f['avg_temperature'] for f in features],
+        'avg_rainfall': [f['avg_rainfall'] for f in features],
+        'avg_humidity': [f['avg_humidity'] for f in features]
+    })
+    crop = np.where(df['avg_rainfall'] > 900, 0, np.where(df['avg_temp'] > 25, 2, 1))
+    crop[df['season'] == 'Zaid'] = 3
+    df['crop'] = [CROPS[i] for i in crop]
+    df['yield'] = 2000 + 40 * df['avg_temp'] + 0.5 * df['avg_rainfall']
+    return df
+
+
+@pytest.fixture(scope='session')
+def training_data():
+    """(X, crop labels, yields, feature pipeline) as train_model prepares them."""
+    return prepare_features(training_frame())
+
+
+@pytest.fixture(scope='session')
+def forests(training_data):
+    X, y_crop, y_yield, _ = training_data
+    classifier = RandomForestClassifier(n_estimators=12, max_depth=6, random_state=0).fit(X, y_crop)
+    regressor = RandomForestRegressor(n_estimators=12, max_depth=6, random_state=0).fit(X, y_yield)
+    return classifier, regressor
+
+
+@pytest.fixture(scope='session')
+def model_dir(tmp_path_factory, training_data, forests):
+    """A directory of model artifacts the predictor can load."""
+    path = str(tmp_path_factory.mktemp('model'))
+    save_models(*forests, training_data[3], path)
+    return path
+
+
+def corrupt(model_dir: str):
+    """Flip a byte of one memory-mapped array, keeping its size."""
+    path = next(name for name in os.listdir(model_dir) if 'crop_classifier' in name and 'threshold' in name)
+    path = os.path.join(model_dir, path)
+    with open(path, 'rb') as f:
+        data = bytearray(f.read())
+    data[-1] ^= 0xFF
+    with open(path, 'wb') as f:
+        f.write(bytes(data))
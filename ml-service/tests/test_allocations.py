@@ -0,0 +1,155 @@
+"""The tracemalloc allocation debug mode."""
+import asyncio
+import tracemalloc
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import app.main
+from app.allocations import AllocationDebugger, AllocationDebugMiddleware, AllocationTracker, allocation_tracker
+from app.models.predictor import CropPredictor
+from benchmarks.synthetic import to_request
+
+
+def test_tracker_charges_allocations_to_stages():
+    tracker = AllocationTracker()
+    tracker.start()
+    kept = bytearray(200_000)
+    tracker.mark('build')
+    tracker.mark('idle')
+    report = tracker.finish()
+
+    assert not tracemalloc.is_tracing()
+    assert report['stages']['build']['netBytes'] >= 200_000
+    assert abs(report['stages']['idle']['netBytes']) < 10_000
+    assert report['peakBytes'] >= 200_000
+    assert any(site['sizeBytes'] >= 200_000 for site in report['topSites'])
+    del kept
+
+
+def test_predictor_stages_are_recorded_through_the_timing_hook(request_features):
+    tracker = AllocationTracker()
+    tracker.start()
+    CropPredictor(mode='rules').predict_batch(request_features[:5], timings=tracker)
+    report = tracker.finish()
+
+    assert {'scoring', 'yield', 'explanation'} <= set(report['stages'])
+    assert tracker.seconds['scoring'] > 0
+
+
+def test_tracing_started_elsewhere_is_left_running():
+    tracemalloc.start()
+    try:
+        tracker = AllocationTracker()
+        tracker.start()
+        tracker.finish()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_debugger_selects_requests_by_mode():
+    header = [(b'x-alloc-debug', b'1')]
+    assert AllocationDebugger(mode='always').wants({'headers': []})
+    assert AllocationDebugger(mode='header').wants({'headers': header})
+    assert not AllocationDebugger(mode='header').wants({'headers': [(b'x-alloc-debug', b'0')]})
+    assert not AllocationDebugger(mode='off').wants({'headers': header})
+    with pytest.raises(ValueError):
+        AllocationDebugger(mode='sometimes')
+
+
+def traced_app(debugger, authorize=lambda token: True):
+    app = FastAPI()
+
+    @app.post('/predict')
+    async def predict(request: Request):
+        tracker = allocation_tracker(request)
+        if tracker is not None:
+            tracker.mark('handler')
+        return {'traced': tracker is not None}
+
+    app.add_middleware(AllocationDebugMiddleware, debugger=debugger, authorize=authorize)
+    return app
+
+
+def test_middleware_records_a_report_per_traced_request():
+    debugger = AllocationDebugger(mode='header')
+    client = TestClient(traced_app(debugger))
+
+    assert client.post('/predict').json() == {'traced': False}
+    response = client.post('/predict', headers={'X-Alloc-Debug': '1'})
+    assert response.json() == {'traced': True}
+    assert response.headers['x-alloc-debug-id'] == '1'
+    assert 'handler=' in response.headers['x-alloc-debug-stages']
+    assert [report['id'] for report in debugger.find()] == [1]
+    assert debugger.find(1)[0]['path'] == '/predict'
+
+
+def test_middleware_requires_authorization():
+    debugger = AllocationDebugger(mode='always')
+    client = TestClient(traced_app(debugger, authorize=lambda token: token == 'secret'))
+
+    assert client.post('/predict').json() == {'traced': False}
+    assert client.post('/predict', headers={'X-Admin-Token': 'secret'}).json() == {'traced': True}
+    assert len(debugger.find()) == 1
+
+
+def test_traced_requests_run_alone():
+    debugger = AllocationDebugger(mode='header')
+    order = []
+
+    async def run():
+        release = asyncio.Event()
+
+        async def untraced(name, wait=False):
+            async with debugger.untraced():
+                order.append(f"{name} start")
+                if wait:
+                    await release.wait()
+                order.append(f"{name} end")
+
+        async def traced():
+            async with debugger.traced():
+                order.append('traced')
+
+        running = asyncio.ensure_future(untraced('early', wait=True))
+        await asyncio.sleep(0)
+        tracing = asyncio.ensure_future(traced())
+        await asyncio.sleep(0)
+        late = asyncio.ensure_future(untraced('late'))
+        await asyncio.sleep(0.01)
+        assert order == ['early start']
+        release.set()
+        await asyncio.gather(running, tracing, late)
+
+    asyncio.run(run())
+    assert order == ['early start', 'early end', 'traced', 'late start', 'late end']
+
+
+def test_reports_endpoint_needs_the_admin_token(monkeypatch):
+    monkeypatch.setattr(app.main.allocation_debugger, 'mode', 'header')
+    client = TestClient(app.main.app)
+    assert client.get('/debug/allocations').status_code == 404
+
+    monkeypatch.setattr(app.main.profiler, 'token', 'secret')
+    assert client.get('/debug/allocations').status_code == 403
+    response = client.get('/debug/allocations', headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 200
+    assert response.json() == {'mode': 'header', 'reports': []}
+
+
+@pytest.mark.parametrize('path', ['/predict', '/predict/batch'])
+def test_api_requests_report_the_response_stages(monkeypatch, request_features, path):
+    tracker = AllocationTracker()
+    monkeypatch.setattr(app.main, 'allocation_tracker', lambda request: tracker)
+    item = to_request(request_features[0])
+    payload = item if path == '/predict' else {'requests': [item, {'state': 'Punjab'}]}
+
+    with TestClient(app.main.app) as client:
+        tracker.start()
+        response = client.post(path, json=payload)
+        report = tracker.finish()
+
+    assert response.status_code == 200
+    assert list(report['stages'])[-2:] == ['response_model', 'serialization']
@@ -0,0 +1,77 @@
+"""HTTP endpoints."""
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from benchmarks.synthetic import to_request
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def test_predict(client, request_features):
+    response = client.post('/predict', json=to_request(request_features[0]))
+    assert response.status_code == 200
+    recommendations = response.json()['recommendations']
+    assert 0 < len(recommendations) <= 5
+    assert set(recommendations[0]) == {'cropName', 'suitabilityScore', 'yieldPrediction', 'explanation',
+                                       'environmentalFactors'}
+
+
+def test_predict_options(client, request_features):
+    body = {**to_request(request_features[0]), 'topK': 3, 'minScore': 0, 'fields': ['explanation']}
+    response = client.post('/predict', json=body)
+    assert response.status_code == 200
+    recommendations = response.json()['recommendations']
+    assert len(recommendations) == 3
+    assert set(recommendations[0]) == {'cropName', 'suitabilityScore', 'explanation'}
+
+    assert client.post('/predict', json={**body, 'topK': 0}).status_code == 422
+
+
+def test_non_finite_features_are_rejected(client, request_features):
+    body = to_request(request_features[0])
+    body['weather']['avgRainfall'] = float('nan')
+    response = client.post('/predict', content=json.dumps(body), headers={'Content-Type': 'application/json'})
+    assert response.status_code == 422
+    assert response.json()['detail'].startswith("Invalid features: Missing or invalid feature 'avg_rainfall'")
+
+
+def test_batch_reports_errors_per_item(client, request_features):
+    unscorable = to_request(request_features[2])
+    unscorable['soil']['ph'] = 'acidic'
+    requests = [
+        to_request(request_features[0]),
+        {'state': 'Gujarat', 'season': 'Kharif', 'soil': {}, 'weather': {}},
+        unscorable,
+        to_request(request_features[3])
+    ]
+    response = client.post('/predict/batch', json={'requests': requests})
+    assert response.status_code == 200
+    results = response.json()['results']
+
+    assert len(results) == 4
+    assert results[0]['error'] is None and results[0]['recommendations'] is not None
+    assert results[1] == {'recommendations': None, 'error': 'Invalid request: district: Field required'}
+    assert results[2]['recommendations'] is None
+    assert results[2]['error'] == "Invalid features: Missing or invalid feature 'soil_ph': 'acidic'"
+    assert results[3]['error'] is None
+
+    single = client.post('/predict', json=requests[3]).json()
+    assert results[3]['recommendations'] == single['recommendations']
+
+
+def test_empty_batch(client):
+    response = client.post('/predict/batch', json={'requests': []})
+    assert response.json() == {'results': []}
+
+
+def test_batch_size_is_limited(client, request_features, monkeypatch):
+    monkeypatch.setattr('app.main.MAX_BATCH_SIZE', 2)
+    response = client.post('/predict/batch', json={'requests': [to_request(f) for f in request_features[:3]]})
+    assert response.status_code == 413
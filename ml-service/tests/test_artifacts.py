@@ -0,0 +1,110 @@
+"""Memory-mapped forest and boosting artifacts against the sklearn estimators they were built from."""
+import os
+import pickle
+
+import numpy as np
+import pytest
+from sklearn.ensemble import HistGradientBoostingClassifier, HistGradientBoostingRegressor
+from sklearn.preprocessing import LabelEncoder
+
+from app.models.artifacts import ArtifactError, CompiledBoosting, CompiledForest, compile_estimator
+from app.models.features import CATEGORICAL_FEATURES
+from app.models.trained_model import ARTIFACT_FILES, TrainedModel, convert, save_artifacts
+from tests.conftest import corrupt
+
+
+def test_compiled_forest_classifier_matches_sklearn(training_data, forests):
+    X = np.asarray(training_data[0], dtype=np.float64)
+    classifier, _ = forests
+    compiled = CompiledForest.from_estimator(classifier)
+
+    assert list(compiled.classes_) == list(classifier.classes_)
+    np.testing.assert_array_equal(compiled.predict_proba(X), classifier.predict_proba(X))
+
+
+def test_compiled_forest_regressor_matches_sklearn(training_data, forests):
+    X = np.asarray(training_data[0], dtype=np.float64)
+    _, regressor = forests
+    compiled = CompiledForest.from_estimator(regressor)
+
+    np.testing.assert_array_equal(compiled.predict(X), regressor.predict(X))
+    per_tree = np.column_stack([tree.predict(X) for tree in regressor.estimators_])
+    np.testing.assert_array_equal(compiled.tree_predictions(X), per_tree)
+
+
+def test_predict_interval_mean_is_the_prediction(training_data, forests):
+    X = np.asarray(training_data[0], dtype=np.float64)
+    compiled = CompiledForest.from_estimator(forests[1])
+
+    mean, bounds = compiled.predict_interval(X, (0.1, 0.9))
+    np.testing.assert_array_equal(mean, compiled.predict(X))
+    assert (bounds[:, 0] <= mean).all() and (mean <= bounds[:, 1]).all()
+
+
+@pytest.mark.parametrize('classes', [2, 4])
+def test_compiled_boosting_classifier_matches_sklearn(training_data, classes):
+    X = np.asarray(training_data[0], dtype=np.float64)
+    y_crop = np.asarray(training_data[1])
+    y = y_crop if classes == 4 else (y_crop == y_crop[0])
+    estimator = HistGradientBoostingClassifier(max_iter=20, random_state=0).fit(X, y)
+    compiled = compile_estimator(estimator)
+
+    assert isinstance(compiled, CompiledBoosting)
+    np.testing.assert_allclose(compiled.predict_proba(X), estimator.predict_proba(X), rtol=1e-9, atol=1e-12)
+
+
+def test_compiled_boosting_regressor_matches_sklearn(training_data):
+    X = np.asarray(training_data[0], dtype=np.float64)
+    estimator = HistGradientBoostingRegressor(max_iter=20, random_state=0).fit(X, training_data[2])
+    compiled = compile_estimator(estimator)
+
+    np.testing.assert_allclose(compiled.predict(X), estimator.predict(X), rtol=1e-12)
+    with pytest.raises(ArtifactError):
+        compiled.predict_interval(X, (0.1, 0.9))
+
+
+def test_saved_artifacts_load_memory_mapped(model_dir, training_data, forests):
+    X = np.asarray(training_data[0], dtype=np.float64)
+    classifier, regressor = forests
+    model = TrainedModel.load(model_dir)
+
+    assert model.artifact_format == 'mmap'
+    assert isinstance(model.crop_classifier.value, np.memmap)
+    np.testing.assert_array_equal(model.predict_proba(X), classifier.predict_proba(X))
+    np.testing.assert_array_equal(model.predict_yield(X), regressor.predict(X))
+
+
+def test_corrupt_artifacts_are_rejected(tmp_path, training_data, forests):
+    save_artifacts(*forests, training_data[3], str(tmp_path))
+    corrupt(str(tmp_path))
+
+    with pytest.raises(ArtifactError):
+        TrainedModel.load(str(tmp_path), verify='checksum')
+    # Serving only checks sizes by default; the registry checksums versions
+    assert TrainedModel.load(str(tmp_path)) is not None
+
+    path = next(name for name in os.listdir(str(tmp_path)) if name.endswith('.npy'))
+    os.truncate(os.path.join(str(tmp_path), path), 8)
+    with pytest.raises(ArtifactError):
+        TrainedModel.load(str(tmp_path))
+
+
+def test_pickles_still_load_and_convert(tmp_path, training_data, forests):
+    X = np.asarray(training_data[0], dtype=np.float64)
+    pipeline = training_data[3]
+    encoders = {}
+    for _, feature, encoder_name in CATEGORICAL_FEATURES:
+        encoders[encoder_name] = LabelEncoder()
+        encoders[encoder_name].classes_ = np.array(pipeline.category_classes[feature], dtype=object)
+    for name, value in zip(ARTIFACT_FILES, (*forests, encoders)):
+        with open(tmp_path / name, 'wb') as f:
+            pickle.dump(value, f)
+
+    pickled = TrainedModel.load(str(tmp_path))
+    assert pickled.artifact_format == 'pickle'
+    assert pickled.features.category_classes == pipeline.category_classes
+
+    convert(str(tmp_path))
+    mapped = TrainedModel.load(str(tmp_path))
+    assert mapped.artifact_format == 'mmap'
+    np.testing.assert_array_equal(mapped.predict_proba(X), pickled.predict_proba(X))
@@ -0,0 +1,118 @@
+"""Micro-batching of concurrent /predict calls."""
+import asyncio
+
+import pytest
+
+from app.batching import MicroBatcher
+from app.models.predictor import PredictOptions
+
+
+class RecordingPredictor:
+    """predict_batch stand-in that records each batch and echoes its items."""
+
+    def __init__(self):
+        self.batches = []
+        self.options = []
+
+    async def __call__(self, features_list, options, timings):
+        self.batches.append(list(features_list))
+        self.options.append(list(options))
+        return [ValueError(f"bad item {item}") if item < 0 else [item] for item in features_list]
+
+
+def submit_all(batcher, items, spacing=0.0):
+    async def run():
+        async def one(position, item):
+            await asyncio.sleep(position * spacing)
+            return await batcher.submit(item)
+        return await asyncio.gather(*(one(position, item) for position, item in enumerate(items)),
+                                    return_exceptions=True)
+    return asyncio.run(run())
+
+
+def test_full_batches_flush_without_waiting_for_the_window():
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher(predictor, window_ms=10_000, max_batch_size=4)
+
+    results = submit_all(batcher, list(range(8)))
+
+    assert results == [[item] for item in range(8)]
+    assert predictor.batches == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert (batcher.size_flushes, batcher.window_flushes) == (2, 0)
+
+
+def test_partial_batch_flushes_when_the_window_ends():
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher(predictor, window_ms=20, max_batch_size=64)
+
+    results = submit_all(batcher, [1, 2, 3])
+
+    assert results == [[1], [2], [3]]
+    assert predictor.batches == [[1, 2, 3]]
+    assert (batcher.size_flushes, batcher.window_flushes) == (0, 1)
+    assert batcher.stats()['averageBatchSize'] == 3.0
+
+
+def test_requests_after_the_window_go_in_the_next_batch():
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher(predictor, window_ms=5, max_batch_size=64)
+
+    submit_all(batcher, [1, 2], spacing=0.05)
+
+    assert predictor.batches == [[1], [2]]
+
+
+def test_each_request_keeps_its_options():
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher(predictor, window_ms=20, max_batch_size=64)
+
+    async def run():
+        return await asyncio.gather(batcher.submit(1, PredictOptions(top_k=1)), batcher.submit(2))
+
+    assert asyncio.run(run()) == [[1], [2]]
+    assert predictor.options == [[PredictOptions(top_k=1), PredictOptions()]]
+
+
+def test_item_errors_only_fail_their_request():
+    batcher = MicroBatcher(RecordingPredictor(), window_ms=20, max_batch_size=64)
+
+    results = submit_all(batcher, [1, -1, 2])
+
+    assert results[0] == [1] and results[2] == [2]
+    assert isinstance(results[1], ValueError)
+
+
+def test_a_failing_batch_fails_every_waiting_request():
+    async def broken(features_list, options, timings):
+        raise RuntimeError("scoring failed")
+
+    batcher = MicroBatcher(broken, window_ms=20, max_batch_size=64)
+    results = submit_all(batcher, [1, 2])
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.parametrize('window_ms, max_batch_size', [(0, 64), (20, 1)])
+def test_disabled_batching_scores_each_request_alone(window_ms, max_batch_size):
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher(predictor, window_ms=window_ms, max_batch_size=max_batch_size)
+
+    assert not batcher.enabled
+    assert submit_all(batcher, [1, 2]) == [[1], [2]]
+    assert predictor.batches == [[1], [2]]
+    with pytest.raises(ValueError):
+        asyncio.run(batcher.submit(-1))
+
+
+def test_cancelled_requests_are_skipped():
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher(predictor, window_ms=20, max_batch_size=64)
+
+    async def run():
+        cancelled = asyncio.ensure_future(batcher.submit(1))
+        kept = asyncio.ensure_future(batcher.submit(2))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        return await kept
+
+    assert asyncio.run(run()) == [2]
+    assert predictor.batches == [[1, 2]]
@@ -0,0 +1,30 @@
+"""Regression checks in the benchmark comparison."""
+import pytest
+
+from benchmarks.compare import compare
+
+
+def results(**metrics):
+    return {'results': {'predict/rules': metrics}}
+
+
+def test_regressions_follow_each_metric_direction():
+    rows = compare(results(p99Ms=1.3, itemsPerSecond=700, peakBytes=100, calls=10),
+                   results(p99Ms=1.0, itemsPerSecond=1000, peakBytes=100, calls=5))
+
+    changes = {row['metric']: row for row in rows}
+    # Counts are not compared
+    assert set(changes) == {'p99Ms', 'itemsPerSecond', 'peakBytes'}
+    assert changes['p99Ms']['change'] == pytest.approx(0.3) and changes['p99Ms']['regressed']
+    assert changes['itemsPerSecond']['change'] == pytest.approx(0.3) and changes['itemsPerSecond']['regressed']
+    assert not changes['peakBytes']['regressed']
+
+
+def test_improvements_and_per_metric_thresholds_pass():
+    rows = compare(results(p50Ms=0.5, p99Ms=1.4), results(p50Ms=1.0, p99Ms=1.0),
+                   metric_thresholds={'p99Ms': 0.5})
+    assert not any(row['regressed'] for row in rows)
+
+
+def test_benchmarks_missing_from_the_baseline_are_skipped():
+    assert compare(results(p99Ms=1.0), {'results': {}}) == []
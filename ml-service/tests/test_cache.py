@@ -0,0 +1,71 @@
+"""The prediction result cache."""
+from app.cache import PredictionCache
+from app.models.predictor import CropPredictor, PredictOptions
+
+
+class Generation:
+    def __init__(self):
+        self.value = 0
+
+    def __call__(self) -> int:
+        return self.value
+
+
+def test_bumping_the_generation_invalidates_entries(request_features):
+    generation = Generation()
+    cache = PredictionCache(generation=generation, max_entries=10, ttl_seconds=60)
+    key = cache.key(request_features[0])
+    cache.put(key, ['result'])
+    assert cache.get(key) == ['result']
+
+    generation.value += 1
+    assert cache.get(key) is None
+    assert cache.invalidations == 1
+    # Keys built after the bump carry the new generation
+    assert cache.key(request_features[0]) != key
+
+
+def test_reloading_the_model_invalidates_entries(model_dir, request_features):
+    predictor = CropPredictor(model_path=model_dir, mode='model')
+    predictor.load_model()
+    cache = PredictionCache(generation=lambda: predictor.generation, max_entries=10, ttl_seconds=60)
+    key = cache.key(request_features[0])
+    cache.put(key, ['result'])
+
+    predictor.reload_model()
+    assert cache.get(key) is None
+
+
+def test_keys_round_values(request_features):
+    cache = PredictionCache(max_entries=10, ttl_seconds=60, precision=2)
+    features = request_features[0]
+    assert cache.key(features) == cache.key(dict(features, soil_ph=features['soil_ph'] + 1e-4))
+    assert cache.key(features) != cache.key(dict(features, soil_ph=features['soil_ph'] + 0.1))
+    assert cache.key(features) != cache.key(dict(features, district='Elsewhere'))
+    assert cache.key(features) != cache.key(features, PredictOptions(top_k=3))
+
+
+def test_uncacheable_features_have_no_key(request_features):
+    cache = PredictionCache(max_entries=10, ttl_seconds=60)
+    assert cache.key(dict(request_features[0], soil_ph='acidic')) is None
+    assert cache.get(None) is None
+
+
+def test_entries_expire_and_the_oldest_is_evicted(request_features):
+    cache = PredictionCache(max_entries=2, ttl_seconds=60)
+    keys = [cache.key(features) for features in request_features[:3]]
+    for key in keys:
+        cache.put(key, [key])
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) == [keys[2]]
+    assert cache.evictions == 1
+
+    expired = PredictionCache(max_entries=2, ttl_seconds=1e-9)
+    expired.put(keys[1], ['result'])
+    assert expired.get(keys[1]) is None
+    assert expired.expirations == 1
+
+
+def test_disabled_cache_has_no_keys(request_features):
+    cache = PredictionCache(max_entries=0)
+    assert cache.key(request_features[0]) is None
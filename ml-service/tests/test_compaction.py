@@ -0,0 +1,98 @@
+"""Depth caps, tree selection and float32 storage of compacted forests."""
+import numpy as np
+import pytest
+
+from app.models.artifacts import LEAF, CompiledForest
+from app.models.compaction import choose, compact, select_trees, subset
+
+
+def depths(forest):
+    """Depth of every tree."""
+    result = []
+    for root in forest.roots:
+        frontier, depth = [int(root)], -1
+        while frontier:
+            depth += 1
+            frontier = [int(child) for node in frontier if forest.children_left[node] != LEAF
+                        for child in (forest.children_left[node], forest.children_right[node])]
+        result.append(depth)
+    return result
+
+
+@pytest.fixture(scope='module')
+def compiled(forests):
+    return tuple(CompiledForest.from_estimator(forest) for forest in forests)
+
+
+@pytest.fixture(scope='module')
+def rows(training_data):
+    return np.asarray(training_data[0], dtype=np.float64)
+
+
+def test_depth_cap_turns_deep_nodes_into_leaves(compiled, rows):
+    _, regressor = compiled
+    assert max(depths(regressor)) > 3
+
+    capped = compact(regressor, max_depth=3)
+    assert max(depths(capped)) == 3
+    assert capped.n_nodes < regressor.n_nodes
+    # A cap at the full depth changes nothing
+    np.testing.assert_array_equal(compact(regressor, max_depth=max(depths(regressor))).predict(rows),
+                                  regressor.predict(rows))
+    # A cap of 0 leaves each tree's root, which holds the mean of its training rows
+    np.testing.assert_allclose(compact(regressor, max_depth=0).predict(rows[:3]),
+                               np.full(3, np.asarray(regressor.value)[regressor.roots].mean()))
+
+
+def test_selected_trees_predict_their_mean(compiled, rows):
+    _, regressor = compiled
+    trees = [1, 4, 7]
+    per_tree = np.stack([subset(regressor, [tree]).predict(rows) for tree in trees])
+    np.testing.assert_allclose(subset(regressor, trees).predict(rows), per_tree.mean(axis=0))
+
+
+@pytest.mark.parametrize('which', [0, 1])
+def test_selection_starts_from_the_best_single_tree(compiled, rows, training_data, which):
+    forest = compiled[which]
+    y = training_data[1 + which]
+    selected = select_trees(forest, 4, rows, y)
+
+    assert len(set(selected)) == 4 and selected == sorted(selected)
+    assert select_trees(forest, forest.n_trees, rows, y) == list(range(forest.n_trees))
+
+    def error(trees):
+        if forest.kind == 'classifier':
+            probabilities = subset(forest, trees).predict_proba(rows)
+            column = {name: index for index, name in enumerate(forest.classes_)}
+            truth = probabilities[np.arange(len(rows)), [column[str(label)] for label in y]]
+            return np.mean((truth - 1) ** 2)
+        return np.mean((subset(forest, trees).predict(rows) - y) ** 2)
+
+    best_single = min(range(forest.n_trees), key=lambda tree: error([tree]))
+    assert best_single in selected
+    assert error(selected) <= np.mean([error([tree]) for tree in range(forest.n_trees)])
+
+
+def test_tree_selection_needs_held_out_rows(compiled):
+    with pytest.raises(ValueError):
+        compact(compiled[1], trees=3)
+
+
+def test_float32_keeps_every_split(compiled, rows):
+    classifier, _ = compiled
+    small = compact(classifier, float32=True)
+
+    assert small.threshold.dtype == np.float32 and small.feature.dtype == np.int16
+    assert (small.threshold.astype(np.float64) <= classifier.threshold).all()
+    np.testing.assert_array_equal(small.apply(rows), classifier.apply(rows))
+    np.testing.assert_allclose(small.predict_proba(rows), classifier.predict_proba(rows), atol=1e-6)
+
+
+def test_choose_the_smallest_setting_within_the_loss_budget():
+    def result(size, loss, p50=1.0):
+        return {'sizeBytes': size, 'loss': {'cropAccuracy': loss, 'yieldR2': 0.0}, 'latency': {'p50Ms': p50}}
+
+    results = [result(100, 0.0), result(40, 0.005), result(20, 0.05), result(30, 0.0, p50=9.0)]
+    assert choose(results, max_loss=0.01) is results[3]
+    assert choose(results, max_loss=0.01, max_latency_ms=2.0) is results[1]
+    assert choose(results, max_loss=-1) is results[0]
@@ -0,0 +1,89 @@
+"""Loading, validating and hot-reloading the crop catalog."""
+import csv
+import json
+import time
+
+import pytest
+
+from app.models.crop_catalog import DEFAULT_CATALOG_PATH, RANGE_KEYS, load_crop_catalog
+from app.models.predictor import CropPredictor
+
+
+def write_json(path, crops):
+    path.write_text(json.dumps({'crops': crops}))
+    return str(path)
+
+
+def shipped_entries():
+    with open(DEFAULT_CATALOG_PATH, encoding='utf-8') as f:
+        return json.load(f)['crops']
+
+
+def test_csv_matches_json(tmp_path):
+    entries = shipped_entries()
+    path = tmp_path / 'crops.csv'
+    columns = ['name', 'season'] + [f"{key[:-len('_range')]}_{end}" for key in RANGE_KEYS
+                                     for end in ('min', 'max')] + ['base_yield']
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for entry in entries:
+            row = {'name': entry['name'], 'season': ';'.join(entry['season']), 'base_yield': entry['base_yield']}
+            for key in RANGE_KEYS:
+                prefix = key[:-len('_range')]
+                row[f'{prefix}_min'], row[f'{prefix}_max'] = entry[key]
+            writer.writerow(row)
+
+    assert load_crop_catalog(str(path)) == load_crop_catalog(DEFAULT_CATALOG_PATH)
+
+
+def test_invalid_entries_are_all_reported(tmp_path):
+    entries = shipped_entries()
+    entries[0] = dict(entries[0], ph_range=[7, 5])
+    entries[1] = dict(entries[1], base_yield=-1)
+    entries.append(dict(entries[2]))
+
+    with pytest.raises(ValueError) as error:
+        load_crop_catalog(write_json(tmp_path / 'crops.json', entries))
+    message = str(error.value)
+    assert "invalid 'ph_range'" in message
+    assert "invalid 'base_yield'" in message
+    assert 'duplicate name' in message
+
+
+def test_reload_swaps_the_table_and_bumps_the_generation(tmp_path):
+    entries = shipped_entries()
+    path = write_json(tmp_path / 'crops.json', entries)
+    predictor = CropPredictor(mode='rules', crop_db_path=path)
+
+    write_json(tmp_path / 'crops.json', entries[:3])
+    assert predictor.reload_crop_database()
+    assert len(predictor.table) == 3
+    assert predictor.generation == 1
+
+
+def test_invalid_file_keeps_the_current_table(tmp_path):
+    path = write_json(tmp_path / 'crops.json', shipped_entries())
+    predictor = CropPredictor(mode='rules', crop_db_path=path)
+    table = predictor.table
+
+    (tmp_path / 'crops.json').write_text('{"crops": [')
+    assert not predictor.reload_crop_database()
+    assert predictor.table is table
+    assert predictor.generation == 0
+
+
+def test_watcher_reloads_changed_files(tmp_path):
+    entries = shipped_entries()
+    path = write_json(tmp_path / 'crops.json', entries)
+    predictor = CropPredictor(mode='rules', crop_db_path=path)
+    predictor.start_watching(interval=0.01)
+    try:
+        write_json(tmp_path / 'crops.json', entries[:2])
+        deadline = time.monotonic() + 5
+        while predictor.generation == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        predictor.stop_watching()
+
+    assert len(predictor.table) == 2
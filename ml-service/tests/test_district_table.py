@@ -0,0 +1,90 @@
+"""Precomputed district x season table and table-mode serving."""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.models.district_table import SOIL_DEFAULTS, WEATHER_DEFAULTS, DistrictTable, build_table, district_features
+from app.models.predictor import CropPredictor, PredictOptions
+from app.models.trained_model import TrainedModel
+
+from tests.conftest import SEASONS
+
+
+def district_records(features_list):
+    """Stored district records whose aggregates are the given features."""
+    records = {}
+    for features in features_list:
+        records[(features['state'], features['district'])] = {
+            'state': features['state'],
+            'district': features['district'],
+            'soilData': {name: {'mean': features[feature]} for feature, name, _ in SOIL_DEFAULTS},
+            'weatherData': {name: {'mean': features[feature]} for feature, name, _ in WEATHER_DEFAULTS}
+        }
+    return list(records.values())
+
+
+@pytest.fixture
+def table_dir(tmp_path, model_dir, request_features, monkeypatch):
+    path = str(tmp_path / 'district_table')
+    build_table(TrainedModel.load(model_dir), district_records(request_features), SEASONS, n_jobs=1).save(path)
+    monkeypatch.setenv('DISTRICT_TABLE_PATH', path)
+    return path
+
+
+def test_district_features_use_backend_defaults():
+    features = district_features({'state': 'S', 'district': 'D', 'soilData': {'ph': {'mean': 7.1}}}, 'Rabi')
+
+    assert features['soil_ph'] == 7.1
+    assert features['soil_nitrogen'] == 120
+    assert features['avg_rainfall'] == 800
+    assert (features['state'], features['district'], features['season']) == ('S', 'D', 'Rabi')
+
+
+def test_table_matches_live_scoring(model_dir, table_dir):
+    model = TrainedModel.load(model_dir)
+    table = DistrictTable.load(table_dir)
+
+    assert table.matches(model)
+    np.testing.assert_array_equal(table.probabilities, model.predict_proba(table.X))
+    np.testing.assert_array_equal(table.yields, model.predict_yield(table.X))
+
+
+def test_table_mode_answers_equal_model_mode(model_dir, table_dir, request_features):
+    features_list = [district_features(record, season) for record in district_records(request_features)
+                     for season in SEASONS]
+    changed = dict(features_list[0], soil_ph=features_list[0]['soil_ph'] + 1)
+    unknown = dict(features_list[1], district='Nowhere')
+    features_list += [changed, unknown]
+    options = [PredictOptions(fields=('explanation',))] * len(features_list)
+
+    live = CropPredictor(model_path=model_dir, mode='model')
+    table = CropPredictor(model_path=model_dir, mode='table')
+    assert table.load_model() is not None and table.district_table is not None
+
+    assert table.predict_batch(features_list, options) == live.predict_batch(features_list, options)
+    counts = table.stats()['districtTable']
+    assert (counts['hits'], counts['misses']) == (len(features_list) - 2, 2)
+
+
+def test_table_counters_add_up_across_threads(model_dir, table_dir, request_features):
+    features_list = [district_features(record, season) for record in district_records(request_features)
+                     for season in SEASONS]
+    predictor = CropPredictor(model_path=model_dir, mode='table')
+    predictor.load_model()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(predictor.predict, features_list * 2))
+    counts = predictor.stats()['districtTable']
+    assert (counts['hits'], counts['misses']) == (len(features_list) * 2, 0)
+
+
+def test_table_for_another_model_is_ignored(tmp_path, model_dir, table_dir, monkeypatch):
+    table = DistrictTable.load(table_dir)
+    table.meta['modelSignature'] = 'other'
+    stale = str(tmp_path / 'stale')
+    table.save(stale)
+    monkeypatch.setenv('DISTRICT_TABLE_PATH', stale)
+
+    predictor = CropPredictor(model_path=model_dir, mode='table')
+    assert predictor.load_model() is not None
+    assert predictor.district_table is None
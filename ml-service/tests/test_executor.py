@@ -0,0 +1,51 @@
+"""The prediction executor's thread and process pools."""
+import asyncio
+
+import pytest
+
+from app.executor import ExecutorSaturated, PredictionExecutor
+from app.models.predictor import CropPredictor, PredictOptions
+
+
+@pytest.mark.parametrize('kind', ['thread', 'process'])
+def test_pools_score_like_the_predictor(kind, model_dir, request_features):
+    executor = PredictionExecutor(CropPredictor(model_path=model_dir, mode='model'), kind=kind,
+                                  workers=1, max_queue=1)
+    try:
+        results = asyncio.run(executor.run(request_features[:5], [PredictOptions()] * 5))
+    finally:
+        executor.shutdown()
+
+    expected = CropPredictor(model_path=model_dir, mode='model').predict_batch(request_features[:5])
+    assert results == expected
+    assert (executor.completed, executor.failed) == (1, 0)
+
+
+def test_process_pool_loads_the_model_in_its_workers(model_dir):
+    predictor = CropPredictor(model_path=model_dir, mode='model')
+    executor = PredictionExecutor(predictor, kind='process', workers=1, max_queue=1)
+    try:
+        assert executor.load() == 'model'
+    finally:
+        executor.shutdown()
+    assert predictor.model is None
+
+    thread_executor = PredictionExecutor(predictor, kind='thread', workers=1, max_queue=1)
+    try:
+        assert thread_executor.load() == 'model'
+    finally:
+        thread_executor.shutdown()
+    assert predictor.model is not None
+
+
+def test_full_queue_is_rejected(request_features):
+    executor = PredictionExecutor(CropPredictor(mode='rules'), kind='thread', workers=1, max_queue=0)
+    executor.in_flight = 1
+    with pytest.raises(ExecutorSaturated):
+        asyncio.run(executor.run(request_features[:1], [PredictOptions()]))
+    assert executor.rejected == 1
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        PredictionExecutor(CropPredictor(mode='rules'), kind='fiber')
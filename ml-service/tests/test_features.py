@@ -0,0 +1,60 @@
+"""The feature pipeline shared by training and serving."""
+import numpy as np
+import pytest
+
+from app.models.artifacts import ArtifactError
+from app.models.features import N_FEATURES, UNKNOWN_CATEGORY, FeaturePipeline, NUMERIC_FEATURES
+from tests.conftest import training_frame
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return training_frame()
+
+
+def test_request_and_frame_encodings_agree(frame, training_data):
+    X, _, _, pipeline = training_data
+    features_list = [
+        {**{feature: row[column] for column, feature in NUMERIC_FEATURES},
+         'state': row['state'], 'district': row['district'], 'season': row['season']}
+        for _, row in frame.iterrows()
+    ]
+    assert X.shape == (len(frame), N_FEATURES)
+    np.testing.assert_array_equal(pipeline.transform(features_list), X)
+
+
+def test_categorical_frame_columns_encode_like_strings(frame, training_data):
+    X, _, _, pipeline = training_data
+    categorical = frame.astype({'state': 'category', 'district': 'category', 'season': 'category'})
+    np.testing.assert_array_equal(pipeline.transform_frame(categorical), X)
+
+
+def test_unknown_categories_get_the_unknown_code(training_data, request_features):
+    pipeline = training_data[3]
+    features = dict(request_features[0], state='Atlantis', district='Nowhere')
+    X = pipeline.transform([features])
+    assert X[0, len(NUMERIC_FEATURES)] == UNKNOWN_CATEGORY
+    assert X[0, len(NUMERIC_FEATURES) + 1] == UNKNOWN_CATEGORY
+
+
+def test_refit_on_a_base_keeps_known_codes(training_data):
+    pipeline = training_data[3]
+    newer = training_frame(rows=50, seed=3)
+    newer.loc[0, 'district'] = 'A New District'
+    refit = FeaturePipeline.fit(newer, base=pipeline)
+
+    for feature, classes in pipeline.category_classes.items():
+        assert refit.category_classes[feature][:len(classes)] == classes
+    assert refit.category_classes['district'][-1] == 'A New District'
+
+
+def test_schema_round_trip(training_data):
+    pipeline = training_data[3]
+    restored = FeaturePipeline.from_schema(pipeline.to_schema())
+    assert restored.category_classes == pipeline.category_classes
+
+
+def test_schema_of_another_pipeline_version_is_rejected(training_data):
+    schema = dict(training_data[3].to_schema(), version=99)
+    with pytest.raises(ArtifactError):
+        FeaturePipeline.from_schema(schema)
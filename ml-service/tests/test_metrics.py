@@ -0,0 +1,57 @@
+"""Prometheus metrics of the prediction endpoints."""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.metrics import ServiceMetrics, StageTimings
+from benchmarks.synthetic import to_request
+
+
+def test_batch_timings_count_once_per_request():
+    metrics = ServiceMetrics(enabled=True)
+    timings = StageTimings()
+    timings.add('scoring', 0.002)
+    timings.scored(8)
+    metrics.observe_timings('/predict', timings, 3)
+
+    rendered = metrics.render()
+    assert 'ml_predict_stage_duration_seconds_count{endpoint="/predict",stage="scoring"} 3' in rendered
+    assert 'ml_predict_stage_duration_seconds_sum{endpoint="/predict",stage="scoring"} 0.006' in rendered
+    assert 'ml_crops_scored_count 1' in rendered
+
+
+def test_error_statuses_are_counted_separately():
+    metrics = ServiceMetrics(enabled=True)
+    metrics.observe_request('/predict', 200, 0.01)
+    metrics.observe_request('/predict', 422, 0.01)
+
+    rendered = metrics.render()
+    assert 'ml_requests_total{endpoint="/predict",status="200"} 1.0' in rendered
+    assert 'ml_request_errors_total{endpoint="/predict",status="422"} 1.0' in rendered
+    assert 'ml_request_errors_total{endpoint="/predict",status="200"}' not in rendered
+
+
+def test_callbacks_are_read_at_render_time():
+    metrics = ServiceMetrics(enabled=True)
+    value = [1]
+    metrics.add_callback('ml_things_total', 'Things.', 'counter', lambda: value[0])
+    value[0] = 4
+    assert '# TYPE ml_things_total counter\nml_things_total 4.0' in metrics.render()
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def test_endpoint_exports_prediction_stages(client, request_features):
+    assert client.post('/predict', json=to_request(request_features[0])).status_code == 200
+    client.get('/no-such-path')
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    for stage in ('parse', 'features', 'scoring', 'serialization'):
+        assert f'ml_predict_stage_duration_seconds_count{{endpoint="/predict",stage="{stage}"}}' in response.text
+    assert 'ml_requests_total{endpoint="other",status="404"}' in response.text
@@ -0,0 +1,144 @@
+"""CropPredictor in rules and model mode."""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.models.predictor import CropPredictor, InvalidFeatures, PredictOptions
+
+
+@pytest.fixture(scope='module')
+def predictor():
+    return CropPredictor(mode='rules')
+
+
+@pytest.fixture(scope='module')
+def model_predictor(model_dir):
+    predictor = CropPredictor(model_path=model_dir, mode='model')
+    assert predictor.load_model() is not None
+    return predictor
+
+
+def test_batch_matches_single_predictions(predictor, request_features):
+    assert predictor.predict_batch(request_features) == [predictor.predict(f) for f in request_features]
+
+
+def test_top_k_and_min_score(predictor, request_features):
+    recommendations = predictor.predict(request_features[0], PredictOptions(top_k=2, min_score=0))['recommendations']
+    assert len(recommendations) == 2
+    assert recommendations[0]['suitabilityScore'] >= recommendations[1]['suitabilityScore']
+
+    strict = predictor.predict(request_features[0], PredictOptions(min_score=100))['recommendations']
+    assert all(recommendation['suitabilityScore'] >= 100 for recommendation in strict)
+
+
+def test_fields_select_the_optional_output(model_predictor, request_features):
+    prediction = model_predictor.predict(request_features[0], PredictOptions(fields=('explanation',)))
+    assert set(prediction) == {'recommendations'}
+    assert prediction['recommendations']
+    assert all(set(recommendation) == {'cropName', 'suitabilityScore', 'explanation'}
+               for recommendation in prediction['recommendations'])
+
+
+def test_rule_yields_are_per_crop(predictor, request_features):
+    prediction = predictor.predict(request_features[0], PredictOptions(min_score=0))
+    assert set(prediction) == {'recommendations'}
+    for recommendation in prediction['recommendations']:
+        assert set(recommendation['yieldPrediction']) == {'min', 'max', 'expected'}
+
+
+def test_batch_options_apply_per_item(predictor, request_features):
+    options = [PredictOptions(top_k=1, min_score=0), PredictOptions(top_k=3, min_score=0)]
+    results = predictor.predict_batch(request_features[:2], options)
+    assert [len(result['recommendations']) for result in results] == [1, 3]
+
+
+@pytest.mark.parametrize('value', [None, 'acidic', True, float('nan'), float('inf')])
+def test_one_bad_item_does_not_fail_the_batch(predictor, request_features, value):
+    features_list = [request_features[0], dict(request_features[1], soil_ph=value), request_features[2]]
+    results = predictor.predict_batch(features_list)
+
+    assert isinstance(results[1], InvalidFeatures)
+    assert results[0] == predictor.predict(request_features[0])
+    assert results[2] == predictor.predict(request_features[2])
+    with pytest.raises(ValueError):
+        predictor.predict(features_list[1])
+
+
+@pytest.mark.parametrize('value', [float('nan'), float('-inf')])
+def test_model_rejects_non_finite_features(model_predictor, request_features, value):
+    results = model_predictor.predict_batch([dict(request_features[0], avg_rainfall=value), request_features[1]])
+
+    assert isinstance(results[0], InvalidFeatures)
+    assert results[1] == model_predictor.predict(request_features[1])
+
+
+def test_model_ranks_crops_by_probability(model_predictor, forests, request_features):
+    classifier, regressor = forests
+    model = model_predictor.model
+    for features in request_features[:10]:
+        X = model.encode([features])
+        probabilities = classifier.predict_proba(X)[0]
+        prediction = model_predictor.predict(features)
+        recommendations = prediction['recommendations']
+
+        expected = sorted(((round(p * 100, 1), str(c)) for c, p in zip(classifier.classes_, probabilities) if p > 0),
+                          key=lambda item: -item[0])
+        assert [r['suitabilityScore'] for r in recommendations] == [score for score, _ in expected][:5]
+        # The regressor's yield belongs to the location, so it is returned once rather than per crop
+        assert all('yieldPrediction' not in recommendation for recommendation in recommendations)
+        assert prediction['locationYield']['expected'] == round(float(regressor.predict(X)[0]), 2)
+
+
+def test_model_crops_outside_the_rule_table_get_a_generic_explanation(model_predictor, request_features):
+    for features in request_features:
+        for recommendation in model_predictor.predict(features)['recommendations']:
+            if recommendation['cropName'] == 'Quinoa':
+                assert recommendation['environmentalFactors'] == {}
+                assert 'model confidence' in recommendation['explanation']
+                return
+    pytest.fail("No request recommended Quinoa")
+
+
+def test_unseen_categories_are_encoded_as_unknown(model_predictor, request_features):
+    features = dict(request_features[0], state='Atlantis', district='Nowhere')
+    X = model_predictor.model.encode([features])
+    assert (X[0, -3:-1] == -1).all()
+    assert model_predictor.predict(features)['recommendations']
+
+
+def test_reload_swaps_one_immutable_snapshot(model_dir):
+    predictor = CropPredictor(model_path=model_dir, mode='model')
+    predictor.load_model()
+    before = predictor.state
+    predictor.reload_model()
+    after = predictor.state
+
+    assert after is not before and after.model is not before.model
+    assert after.table is before.table
+    assert after.generation == before.generation + 1
+    with pytest.raises(AttributeError):
+        after.model = None
+
+
+def test_missing_artifacts_fall_back_to_rules(tmp_path, request_features):
+    predictor = CropPredictor(model_path=str(tmp_path), mode='model')
+    assert predictor.load_model() is None
+    assert predictor.predict(request_features[0]) == CropPredictor(mode='rules').predict(request_features[0])
+    assert predictor.stats()['activeEngine'] == 'rules'
+
+
+def test_latency_is_counted_per_mode(model_dir, request_features):
+    predictor = CropPredictor(model_path=model_dir, mode='model')
+    predictor.predict_batch(request_features[:4])
+    predictor.predict(request_features[0])
+    latency = predictor.stats()['latency']
+    assert (latency['model']['calls'], latency['model']['items']) == (2, 5)
+    assert latency['rules']['calls'] == 0
+
+
+def test_latency_counts_every_call_across_threads(request_features):
+    predictor = CropPredictor(mode='rules')
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(predictor.predict, request_features * 4))
+    latency = predictor.stats()['latency']['rules']
+    assert (latency['calls'], latency['items']) == (len(request_features) * 4, len(request_features) * 4)
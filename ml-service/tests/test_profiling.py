@@ -0,0 +1,80 @@
+"""On-demand profiling captures."""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from app.executor import PredictionExecutor
+from app.models.predictor import CropPredictor, PredictOptions
+from app.profiling import Profiler, ProfilerBusy
+
+
+def test_capture_profiles_batches_until_enough_requests(request_features):
+    profiler = Profiler(token='secret')
+    executor = PredictionExecutor(CropPredictor(mode='rules'), kind='thread', workers=1, profiler=profiler)
+
+    async def run():
+        capture_task = asyncio.ensure_future(profiler.capture(max_requests=2, seconds=30))
+        await asyncio.sleep(0)
+        with pytest.raises(ProfilerBusy):
+            await profiler.capture(seconds=1)
+        for features in request_features[:2]:
+            await executor.run([features], [PredictOptions()])
+            profiler.active.request_finished()
+        return await capture_task
+
+    try:
+        capture = asyncio.run(run())
+    finally:
+        executor.shutdown()
+
+    assert profiler.active is None
+    summary = capture.summary()
+    assert (summary['requests'], summary['profiledBatches']) == (2, 2)
+    assert summary['durationSeconds'] < 30
+    assert 'predict_batch' in capture.pstats_text()
+
+
+def test_window_without_requests_reports_no_batches():
+    capture = asyncio.run(Profiler(token='secret').capture(seconds=0.05, interval_ms=1))
+    assert capture.summary()['requests'] == 0
+    assert capture.pstats_text() == "No prediction batches ran during the capture.\n"
+    assert capture.summary()['samples'] > 0
+
+
+def test_tokens_are_compared_exactly():
+    profiler = Profiler(token='secret')
+    assert profiler.authorized('secret')
+    assert not profiler.authorized('Secret')
+    assert not profiler.authorized(None)
+    assert not Profiler(token='').authorized('')
+
+
+@pytest.fixture
+def client():
+    with TestClient(app.main.app) as client:
+        yield client
+
+
+def test_endpoint_is_hidden_without_a_token(client):
+    assert not app.main.profiler.enabled
+    assert client.post('/admin/profile', json={'seconds': 0.05}).status_code == 404
+
+
+def test_endpoint_requires_the_token(client, monkeypatch):
+    monkeypatch.setattr(app.main.profiler, 'token', 'secret')
+
+    assert client.post('/admin/profile', json={'seconds': 0.05}).status_code == 403
+    response = client.post('/admin/profile', json={'seconds': 0.05, 'intervalMs': 1},
+                           headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 200
+    assert {'worker', 'requests', 'profiledBatches', 'samples', 'pstats', 'collapsed'} <= set(response.json())
+
+
+def test_endpoint_refuses_the_process_pool(client, monkeypatch):
+    monkeypatch.setattr(app.main.profiler, 'token', 'secret')
+    monkeypatch.setattr(app.main.executor, 'kind', 'process')
+
+    response = client.post('/admin/profile', json={'seconds': 0.05}, headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 409
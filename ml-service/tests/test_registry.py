@@ -0,0 +1,161 @@
+"""The versioned model registry, drift measurement and warm-start retraining."""
+import argparse
+
+import numpy as np
+import pytest
+
+from app.models.artifacts import CompiledForest
+from app.models.incremental import data_profile, measure_drift, population_stability, warm_start
+from app.models.predictor import CropPredictor
+from app.models.registry import ModelRegistry, RegistryError, env_pinned_version
+from app.models.train_model import (
+    DEFAULT_CHUNK_ROWS, load_training_data, prepare_features, train_full, train_incremental
+)
+from app.models.trained_model import TrainedModel, resolve_model_dir, save_artifacts
+from app.models.tuning import TrainingReport
+from tests.conftest import corrupt, training_frame
+
+
+def frame(rows, seed):
+    """training_frame with districts drawn from a fixed set, so samples of any size share one mix."""
+    df = training_frame(rows=rows, seed=seed)
+    df['district'] = [f"District {number}" for number in np.random.default_rng(seed).integers(0, 20, rows)]
+    return df
+
+
+def registered(root, count):
+    registry = ModelRegistry(str(root))
+    for _ in range(count):
+        version, _ = registry.allocate()
+        registry.register(version, {'method': 'full'})
+    return registry
+
+
+def test_versions_pin_and_roll_back(tmp_path, monkeypatch):
+    registry = registered(tmp_path, 3)
+    assert registry.active_version() == 3
+    assert resolve_model_dir(str(tmp_path)) == registry.version_dir(3)
+
+    assert registry.rollback() == 2
+    assert registry.active_version() == 2
+    registry.pin(None)
+    assert registry.active_version() == 3
+
+    monkeypatch.setenv('MODEL_VERSION', 'v1')
+    assert resolve_model_dir(str(tmp_path)) == registry.version_dir(1)
+    with pytest.raises(RegistryError):
+        registry.pin(7)
+
+
+
+@pytest.mark.parametrize('pinned', ['latest', 'v', '9'])
+def test_unresolvable_version_falls_back_to_rules(tmp_path, monkeypatch, pinned):
+    registered(tmp_path, 1)
+    monkeypatch.setenv('MODEL_VERSION', pinned)
+    if not pinned[-1].isdigit():
+        with pytest.raises(RegistryError):
+            env_pinned_version()
+
+    predictor = CropPredictor(model_path=str(tmp_path), mode='model')
+    assert predictor.load_model() is None
+
+def test_registry_checksums_versions_before_serving_them(tmp_path, training_data, forests):
+    registry = registered(tmp_path, 1)
+    version, version_dir = registry.allocate()
+    save_artifacts(*forests, training_data[3], version_dir)
+    registry.register(version, {'method': 'full'})
+    registry.pin(1)
+
+    corrupt(version_dir)
+    with pytest.raises(RegistryError, match='failed verification'):
+        registry.pin(version)
+    with pytest.raises(RegistryError, match='failed verification'):
+        registry.register(version, {'method': 'full'})
+    assert registry.active_version() == 1
+
+def test_failed_runs_do_not_reuse_version_numbers(tmp_path):
+    registry = registered(tmp_path, 1)
+    registry.allocate()
+    assert registry.allocate()[0] == 3
+    assert registry.active_version() == 1
+
+
+def test_population_stability():
+    assert population_stability([10, 20, 30], [1, 2, 3]) == pytest.approx(0.0)
+    assert population_stability([50, 50, 0], [0, 50, 50]) > 1
+
+
+def test_drift_is_measured_per_season():
+    profile = data_profile(frame(3000, seed=0))
+
+    similar = measure_drift(profile, frame(1500, seed=1))
+    assert similar['max'] < 0.2 and similar['unseenSeasons'] == []
+
+    # Only Kharif data, so it is compared with Kharif history alone
+    kharif = frame(3000, seed=2)
+    assert measure_drift(profile, kharif[kharif['season'] == 'Kharif'])['max'] < 0.2
+
+    shifted = frame(1500, seed=3)
+    shifted['avg_rainfall'] += 2000
+    drift = measure_drift(profile, shifted)
+    assert drift['max'] > 0.2 and drift['feature'] == 'avg_rainfall'
+
+    unseen = frame(50, seed=4).assign(season='Winter')
+    assert measure_drift(profile, unseen)['max'] is None
+
+
+def test_combined_forests_average_all_trees(training_data, forests):
+    X = np.asarray(training_data[0], dtype=np.float64)
+    _, regressor = forests
+    first = CompiledForest.from_estimator(regressor)
+    combined = first.combine(first)
+
+    assert combined.n_trees == 2 * first.n_trees
+    np.testing.assert_allclose(combined.predict(X), first.predict(X))
+
+
+def test_warm_start_adds_trees(model_dir, training_data):
+    X, y_crop, y_yield, _ = training_data
+    model = TrainedModel.load(model_dir)
+    crop_forest, yield_forest, metrics = warm_start(model, X, y_crop, y_yield, new_trees=4, n_jobs=1)
+
+    assert crop_forest.n_trees == model.crop_classifier.n_trees + 4
+    assert yield_forest.n_trees == model.yield_regressor.n_trees + 4
+    assert list(crop_forest.classes_[:len(model.crops)]) == model.crops
+    assert {'cropAccuracy', 'yieldR2', 'baseCropAccuracy', 'baseYieldR2'} <= set(metrics)
+
+
+def training_args(tmp_path, data, incremental=None):
+    return argparse.Namespace(
+        data=data, chunk_rows=DEFAULT_CHUNK_ROWS, model_dir=str(tmp_path / 'models'), n_jobs=1, search=False,
+        trees=None, depth=None, min_leaf=None, cv=2, max_latency_ms=None, incremental=incremental,
+        new_trees=5, drift_threshold=0.2, feature_cache=None, no_feature_cache=True, report=None,
+        engine='forest', learning_rate=None
+    )
+
+
+def test_incremental_updates_warm_start_or_retrain(tmp_path):
+    data = tmp_path / 'training.csv'
+    frame(1500, seed=0).to_csv(data, index=False)
+    similar = tmp_path / 'similar.csv'
+    frame(1500, seed=1).to_csv(similar, index=False)
+    shifted = tmp_path / 'shifted.csv'
+    frame(300, seed=2).assign(avg_temp=45.0).to_csv(shifted, index=False)
+
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    train_full(training_args(tmp_path, str(data)), registry, TrainingReport())
+    train_incremental(training_args(tmp_path, str(data), str(similar)), registry, TrainingReport())
+    train_incremental(training_args(tmp_path, str(data), str(shifted)), registry, TrainingReport())
+
+    versions = registry.versions()
+    assert [(entry['version'], entry['method'], entry['parent']) for entry in versions] == [
+        (1, 'full', None), (2, 'warm-start', 1), (3, 'retrain', 2)
+    ]
+    assert versions[1]['trees']['crop'] == versions[0]['trees']['crop'] + 5
+    assert versions[1]['data']['totalRows'] == 3000
+    assert versions[2]['drift']['feature'] == 'avg_temp'
+
+    # New data keeps the served model's category codes
+    model = TrainedModel.load(registry.version_dir(2))
+    X, _, _, _ = prepare_features(load_training_data(str(similar)), model.features)
+    assert np.isfinite(model.predict_proba(X)).all()
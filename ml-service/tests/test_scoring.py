@@ -0,0 +1,91 @@
+"""The vectorized rule engine against its scalar reference."""
+import numpy as np
+import pytest
+
+from app.models.predictor import PRUNE_MIN_CROPS, CropPredictor, CropTable, IntervalIndex
+from benchmarks.synthetic import make_catalog, make_features
+
+
+@pytest.fixture(scope='module')
+def predictor():
+    return CropPredictor()
+
+
+def assert_matches_scalar(predictor, table, features_list):
+    values, seasons = table.encode(features_list)
+    scores, in_range = table.score(values, seasons)
+    for row, features in enumerate(features_list):
+        for crop_id, crop_data in enumerate(table.profiles):
+            expected = predictor._calculate_suitability_score(crop_data, features)
+            assert scores[row, crop_id] == pytest.approx(expected, abs=1e-9)
+            for column, key in enumerate(('ph_range', 'temp_range', 'rainfall_range',
+                                          'nitrogen_range', 'phosphorus_range', 'potassium_range')):
+                low, high = crop_data[key]
+                assert in_range[row, crop_id, column] == (low <= values[row, column] <= high)
+
+
+def test_table_score_matches_scalar_score(predictor, request_features):
+    assert_matches_scalar(predictor, predictor.table, request_features)
+
+
+def test_table_score_matches_scalar_score_on_a_large_catalog(predictor):
+    assert_matches_scalar(predictor, CropTable(make_catalog(300)), make_features(40))
+
+
+@pytest.mark.parametrize('min_score', [0.0, 30.0, 60.0, 90.0])
+def test_pruned_candidates_keep_every_qualifying_crop(min_score):
+    table = CropTable(make_catalog(300))
+    features_list = make_features(60)
+    values, seasons = table.encode(features_list)
+    full, _ = table.score(values, seasons)
+
+    groups = table.score_candidates(values, seasons, np.full(len(features_list), min_score))
+    seen = set()
+    for rows, crop_ids, scores, _ in groups:
+        for group_row, row in enumerate(rows):
+            seen.add(int(row))
+            qualifying = set(np.flatnonzero(full[row] >= min_score))
+            kept = {int(crop_ids[i]) for i in np.flatnonzero(scores[group_row] >= min_score)}
+            assert kept == qualifying
+            np.testing.assert_allclose(scores[group_row], full[row, crop_ids])
+    assert seen == set(range(len(features_list)))
+
+
+def test_interval_index_finds_the_ranges_outside_each_value():
+    rng = np.random.default_rng(0)
+    low = rng.uniform(0, 10, 50).round(1)
+    high = low + rng.uniform(0, 5, 50).round(1)
+    xs = np.concatenate([rng.uniform(-1, 16, 30), low[:5], high[:5]])
+
+    expected = (low > xs[:, np.newaxis]) | (high < xs[:, np.newaxis])
+    np.testing.assert_array_equal(IntervalIndex(low, high).outside(xs), expected)
+
+
+def test_small_catalogs_are_scored_whole(predictor, request_features):
+    table = predictor.table
+    assert len(table) < PRUNE_MIN_CROPS
+    values, seasons = table.encode(request_features)
+
+    groups = table.score_candidates(values, seasons, np.full(len(request_features), 90.0))
+    assert len(groups) == 1
+    rows, crop_ids, scores, _ = groups[0]
+    np.testing.assert_array_equal(rows, np.arange(len(request_features)))
+    np.testing.assert_array_equal(scores, table.score(values, seasons)[0])
+    assert list(crop_ids) == list(range(len(table)))
+
+
+def test_predictions_rank_by_the_scalar_score(predictor, request_features):
+    for features in request_features:
+        recommendations = predictor.predict(features)['recommendations']
+        scores = [predictor._calculate_suitability_score(crop_data, features)
+                  for crop_data in predictor.table.profiles]
+        expected = sorted((round(score, 1) for score in scores if score >= 30), reverse=True)[:5]
+        assert [recommendation['suitabilityScore'] for recommendation in recommendations] == expected
+
+
+def test_unknown_season_scores_zero(predictor, request_features):
+    features = dict(request_features[0], season='Monsoon')
+    values, seasons = predictor.table.encode([features])
+    scores, _ = predictor.table.score(values, seasons)
+    assert not scores.any()
+    assert predictor.predict(features)['recommendations'] == []
@@ -0,0 +1,36 @@
+"""Direct response encoding against the Pydantic response models."""
+import pytest
+
+from app.main import BatchPredictionResponse, PredictionResponse
+from app.models.predictor import CropPredictor, PredictOptions
+from app.serialization import dump_batch, dump_predictions
+
+
+@pytest.fixture(scope='module', params=['rules', 'model'])
+def predictor(request, model_dir):
+    return CropPredictor(model_path=model_dir, mode=request.param)
+
+
+@pytest.mark.parametrize('options', [PredictOptions(), PredictOptions(top_k=10, min_score=0),
+                                     PredictOptions(fields=('explanation',)), PredictOptions(fields=())])
+def test_predictions_match_the_response_model(predictor, request_features, options):
+    for prediction in predictor.predict_batch(request_features[:20], options):
+        expected = PredictionResponse(**prediction).model_dump_json(exclude_unset=True)
+        assert dump_predictions(prediction) == expected.encode()
+
+
+def test_batches_match_the_response_model(predictor, request_features):
+    predictions = predictor.predict_batch([request_features[0], dict(request_features[1], soil_ph='acidic')])
+    results = [(predictions[0], None), (None, f"Prediction error: {predictions[1]}"),
+               (None, "Invalid request: district: Field required"), ({'recommendations': []}, None)]
+
+    expected = BatchPredictionResponse(results=[
+        {**(prediction or {'recommendations': None}), 'error': error} for prediction, error in results
+    ]).model_dump_json(exclude_unset=True)
+    assert dump_batch(results) == expected.encode()
+
+
+def test_non_ascii_text_is_written_as_utf8():
+    prediction = {'recommendations': [{'cropName': 'Jowar (ज्वार)', 'suitabilityScore': 71.5, 'explanation': 'Süß'}]}
+    expected = PredictionResponse(**prediction).model_dump_json(exclude_unset=True)
+    assert dump_predictions(prediction) == expected.encode()
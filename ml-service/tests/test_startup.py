@@ -0,0 +1,91 @@
+"""Worker startup and the /ready probe."""
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from benchmarks.synthetic import make_features, to_request
+from app.startup import Startup, StartupFailed
+
+
+class BlockingExecutor:
+    """PredictionExecutor.load stand-in that waits until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.loads = 0
+
+    def load(self):
+        assert self.release.wait(5)
+        self.loads += 1
+        return 'rules'
+
+
+class FailingExecutor:
+    def load(self):
+        raise RuntimeError('artifacts missing')
+
+
+def test_ready_only_after_the_load_finishes():
+    executor = BlockingExecutor()
+    startup = Startup()
+
+    async def run():
+        startup.begin(executor)
+        await asyncio.sleep(0.01)
+        assert not startup.ready
+        executor.release.set()
+        await startup.wait_ready()
+
+    asyncio.run(run())
+    assert startup.ready and executor.loads == 1
+    assert startup.engine == 'rules'
+    report = startup.report()
+    assert report['importToReadySeconds'] >= 0
+    assert report['forkToReadySeconds'] is None
+
+
+def test_failed_load_is_reported_to_waiting_requests():
+    startup = Startup()
+
+    async def run():
+        startup.begin(FailingExecutor())
+        with pytest.raises(StartupFailed, match='artifacts missing'):
+            await startup.wait_ready()
+
+    asyncio.run(run())
+    assert startup.failed and not startup.ready
+
+
+@pytest.fixture
+def client():
+    with TestClient(app.main.app) as client:
+        yield client
+
+
+def test_ready_endpoint(client, monkeypatch):
+    assert client.get('/health').json() == {'status': 'healthy'}
+    assert client.get('/ready').json() == {'status': 'ready', 'engine': 'rules'}
+    assert client.get('/stats').json()['startup']['ready']
+
+    monkeypatch.setattr(app.main.startup, 'ready_at', None)
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+    assert client.get('/health').status_code == 200
+
+
+def test_failed_startup_keeps_the_worker_unready(client, monkeypatch):
+    body = to_request(make_features(1)[0])
+    assert client.post('/predict', json=body).status_code == 200
+    monkeypatch.setattr(app.main.startup, 'error', 'RuntimeError: artifacts missing')
+
+    for path in ('/ready', '/health'):
+        response = client.get(path)
+        assert response.status_code == 503
+        assert response.json() == {'status': 'failed', 'error': 'RuntimeError: artifacts missing'}
+    response = client.post('/predict', json=body)
+    assert response.status_code == 503
+    assert 'artifacts missing' in response.json()['detail']
@@ -0,0 +1,122 @@
+"""Loading and preparing training data."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from app.models.feature_cache import FeatureCache
+from app.models.train_model import TRAINING_DTYPES, load_features, load_training_data, prepare_features
+from app.models.tuning import DEFAULT_GRID, TrainingReport, parse_grid, search_forest
+from tests.conftest import training_frame
+
+
+def write(df, path):
+    if path.suffix == '.parquet':
+        pytest.importorskip('pyarrow')
+        df.to_parquet(path)
+    else:
+        df.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize('extension', ['.csv', '.parquet'])
+def test_chunks_load_with_compact_dtypes(tmp_path, extension):
+    df = training_frame(rows=250)
+    df['notes'] = 'not a training column'
+    loaded = load_training_data(write(df, tmp_path / f'training{extension}'), chunk_rows=37)
+
+    assert list(loaded.columns) == list(TRAINING_DTYPES)
+    assert {column: str(dtype) for column, dtype in loaded.dtypes.items()} == TRAINING_DTYPES
+    for column in ('state', 'district', 'season', 'crop'):
+        assert loaded[column].cat.categories.is_monotonic_increasing
+        assert list(loaded[column].astype(str)) == list(df[column])
+    np.testing.assert_array_equal(loaded['soil_ph'].to_numpy(), df['soil_ph'].to_numpy(dtype=np.float32))
+    np.testing.assert_array_equal(loaded['yield'].to_numpy(), df['yield'].to_numpy())
+
+
+def test_category_codes_match_label_encoding(tmp_path):
+    df = training_frame(rows=250)
+    X, y_crop, y_yield, pipeline = prepare_features(load_training_data(write(df, tmp_path / 'training.csv')))
+
+    assert X.dtype == np.float32
+    for column, position in (('state', -3), ('district', -2), ('season', -1)):
+        encoder = LabelEncoder().fit(df[column])
+        assert pipeline.category_classes[column] == list(encoder.classes_)
+        np.testing.assert_array_equal(X[:, position], encoder.transform(df[column]))
+    assert list(y_crop) == list(df['crop'])
+
+
+def test_empty_files_load_as_none(tmp_path):
+    path = tmp_path / 'training.csv'
+    pd.DataFrame(columns=list(TRAINING_DTYPES)).to_csv(path, index=False)
+    assert load_training_data(str(path)) is None
+    assert load_training_data(str(tmp_path / 'missing.csv')) is None
+
+
+def test_grid_from_cli_values():
+    assert parse_grid('10,20', 'none,8', None) == {
+        'n_estimators': [10, 20], 'max_depth': [None, 8], 'min_samples_leaf': DEFAULT_GRID['min_samples_leaf']
+    }
+
+
+@pytest.mark.parametrize('max_latency_ms', [None, 0.0])
+def test_search_selects_one_candidate(training_data, max_latency_ms):
+    X, y_crop, _, _ = training_data
+    grid = {'n_estimators': [2, 8], 'max_depth': [2, 6], 'min_samples_leaf': [1]}
+    report = TrainingReport()
+    model = search_forest('crop classifier', RandomForestClassifier, grid, X[:300], y_crop[:300],
+                          X[300:], y_crop[300:], report, cv=2, n_jobs=1, max_latency_ms=max_latency_ms)
+
+    candidates = report.candidates['crop classifier']
+    assert len(candidates) == 4
+    selected = [candidate for candidate in candidates if candidate['selected']]
+    assert len(selected) == 1
+    assert {key: model.get_params()[key] for key in grid} == selected[0]['params']
+    if max_latency_ms is None:
+        assert selected[0]['cvScore'] == max(candidate['cvScore'] for candidate in candidates)
+    else:
+        # Nothing fits a zero budget, so the fastest candidate is used
+        assert selected[0]['latency']['p50Ms'] == min(candidate['latency']['p50Ms'] for candidate in candidates)
+    assert [stage['stage'] for stage in report.stages] == ['crop classifier cross-validation',
+                                                           'crop classifier candidate refits']
+
+
+def test_feature_cache_hits_return_the_encoded_data(tmp_path):
+    data = write(training_frame(rows=250), tmp_path / 'training.csv')
+    cache_dir = str(tmp_path / 'cache')
+
+    first_report, second_report = TrainingReport(), TrainingReport()
+    stored = load_features(data, 100, cache_dir, first_report)
+    cached = load_features(data, 100, cache_dir, second_report)
+
+    assert 'load' in [stage['stage'] for stage in first_report.stages]
+    assert 'load' not in [stage['stage'] for stage in second_report.stages]
+    assert isinstance(cached.X, np.memmap)
+    np.testing.assert_array_equal(cached.X, stored.X)
+    np.testing.assert_array_equal(cached.y_yield, stored.y_yield)
+    assert list(cached.y_crop) == list(stored.y_crop)
+    assert cached.pipeline.category_classes == stored.pipeline.category_classes
+    assert cached.profile == stored.profile
+    assert cached.summary == stored.summary
+
+
+def test_feature_cache_keys_change_with_the_data_and_loader(tmp_path):
+    cache = FeatureCache(str(tmp_path / 'cache'))
+    data = write(training_frame(rows=50), tmp_path / 'training.csv')
+    key = cache.key(data, {'dtypes': TRAINING_DTYPES})
+
+    assert cache.key(data, {'dtypes': TRAINING_DTYPES}) == key
+    assert cache.key(data, {'dtypes': dict(TRAINING_DTYPES, soil_ph='float64')}) != key
+    write(training_frame(rows=50, seed=1), tmp_path / 'training.csv')
+    assert cache.key(data, {'dtypes': TRAINING_DTYPES}) != key
+    assert cache.load(key) is None
+
+
+def test_feature_cache_keeps_the_most_recent_entries(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    for seed in range(3):
+        data = write(training_frame(rows=50, seed=seed), tmp_path / f'training{seed}.csv')
+        load_features(data, 100, cache_dir, TrainingReport())
+    FeatureCache(cache_dir, max_entries=2).prune()
+    assert len(list((tmp_path / 'cache').iterdir())) == 2